@@ -12,9 +12,14 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 from app.database import Base
+import app.models  # noqa: F401 - регистрирует модели в Base.metadata
 
 config = context.config
 
+# DATABASE_URL из окружения важнее значения в alembic.ini
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -26,6 +31,16 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 
 target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names):
+    """Поисковый индекс (FTS5-таблицы, notes_tsv) ведется вручную, не автогенерацией"""
+    if type_ == "table":
+        return not name.startswith("mood_entries_fts")
+    if type_ in ("column", "index"):
+        return "notes_tsv" not in name
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -48,6 +63,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -71,7 +87,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_name=include_name
         )
 
         with context.begin_transaction():
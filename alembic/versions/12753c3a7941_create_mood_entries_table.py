@@ -21,12 +21,23 @@ depends_on: Union[str, Sequence[str], None] = None
 def upgrade() -> None:
     """Upgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    pass
+    op.create_table(
+        'mood_entries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('mood_type', sa.String(), nullable=False),
+        sa.Column('mood_score', sa.Integer(), nullable=False),
+        sa.Column('notes', sa.String(length=500), nullable=True),
+        sa.Column('date', sa.Date(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mood_entries_id'), 'mood_entries', ['id'], unique=False)
     # ### end Alembic commands ###
 
 
 def downgrade() -> None:
     """Downgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    pass
+    op.drop_index(op.f('ix_mood_entries_id'), table_name='mood_entries')
+    op.drop_table('mood_entries')
     # ### end Alembic commands ###
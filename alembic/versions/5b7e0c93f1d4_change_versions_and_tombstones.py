@@ -0,0 +1,49 @@
+"""Change versions and tombstones for delta sync
+
+Revision ID: 5b7e0c93f1d4
+Revises: a41c7e9d2b63
+Create Date: 2026-10-18 18:21:47.113904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e0c93f1d4'
+down_revision: Union[str, Sequence[str], None] = 'a41c7e9d2b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Существующие записи получают версию 0: их отдает только полная синхронизация
+    op.add_column('mood_entries', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_mood_entries_user_version', 'mood_entries', ['user_id', 'version', 'id'], unique=False)
+    op.create_table(
+        'mood_tombstones',
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('entry_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'version', 'entry_id')
+    )
+    op.create_table(
+        'mood_sync_state',
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('compacted_version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('mood_sync_state')
+    op.drop_table('mood_tombstones')
+    op.drop_index('ix_mood_entries_user_version', table_name='mood_entries')
+    # Без batch-режима: пересоздание таблицы в SQLite потеряло бы триггеры поиска
+    op.drop_column('mood_entries', 'version')
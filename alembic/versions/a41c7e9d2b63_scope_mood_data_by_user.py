@@ -0,0 +1,76 @@
+"""Scope mood data by user
+
+Revision ID: a41c7e9d2b63
+Revises: dde6f098ad90
+Create Date: 2026-10-18 16:05:12.408113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e9d2b63'
+down_revision: Union[str, Sequence[str], None] = 'dde6f098ad90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Существующие записи принадлежат пользователю по умолчанию
+    op.add_column('mood_entries', sa.Column('user_id', sa.String(length=64), server_default='default', nullable=False))
+    op.drop_index('ix_mood_entries_created_at', table_name='mood_entries')
+    op.drop_index('ix_mood_entries_date_created_at', table_name='mood_entries')
+    op.drop_index('ix_mood_entries_mood_type_created_at', table_name='mood_entries')
+    op.create_index('ix_mood_entries_user_created_at', 'mood_entries', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_mood_entries_user_date_created_at', 'mood_entries', ['user_id', 'date', 'created_at'], unique=False)
+    op.create_index('ix_mood_entries_user_mood_type_created_at', 'mood_entries', ['user_id', 'mood_type', 'created_at'], unique=False)
+
+    # Первичный ключ агрегатов меняется - таблица пересоздается и заполняется заново
+    op.drop_table('mood_daily_rollup')
+    op.create_table(
+        'mood_daily_rollup',
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('mood_type', sa.String(), nullable=False),
+        sa.Column('mood_score', sa.Integer(), nullable=False),
+        sa.Column('entries_count', sa.Integer(), nullable=False),
+        sa.Column('score_sum', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'day', 'mood_type', 'mood_score')
+    )
+    op.execute(
+        "INSERT INTO mood_daily_rollup (user_id, day, mood_type, mood_score, entries_count, score_sum) "
+        "SELECT user_id, date, mood_type, mood_score, COUNT(id), SUM(mood_score) FROM mood_entries "
+        "WHERE date IS NOT NULL GROUP BY user_id, date, mood_type, mood_score"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('mood_daily_rollup')
+    op.create_table(
+        'mood_daily_rollup',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('mood_type', sa.String(), nullable=False),
+        sa.Column('mood_score', sa.Integer(), nullable=False),
+        sa.Column('entries_count', sa.Integer(), nullable=False),
+        sa.Column('score_sum', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'mood_type', 'mood_score')
+    )
+    op.execute(
+        "INSERT INTO mood_daily_rollup (day, mood_type, mood_score, entries_count, score_sum) "
+        "SELECT date, mood_type, mood_score, COUNT(id), SUM(mood_score) FROM mood_entries "
+        "WHERE date IS NOT NULL GROUP BY date, mood_type, mood_score"
+    )
+
+    op.drop_index('ix_mood_entries_user_mood_type_created_at', table_name='mood_entries')
+    op.drop_index('ix_mood_entries_user_date_created_at', table_name='mood_entries')
+    op.drop_index('ix_mood_entries_user_created_at', table_name='mood_entries')
+    op.create_index('ix_mood_entries_mood_type_created_at', 'mood_entries', ['mood_type', 'created_at'], unique=False)
+    op.create_index('ix_mood_entries_date_created_at', 'mood_entries', ['date', 'created_at'], unique=False)
+    op.create_index('ix_mood_entries_created_at', 'mood_entries', ['created_at'], unique=False)
+    # Без batch-режима: пересоздание таблицы в SQLite потеряло бы триггеры поиска
+    op.drop_column('mood_entries', 'user_id')
@@ -0,0 +1,62 @@
+"""Monotonic mood entry ids (SQLite AUTOINCREMENT)
+
+Revision ID: c6e1a9f4d372
+Revises: 5b7e0c93f1d4
+Create Date: 2026-10-18 21:40:06.318524
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e1a9f4d372'
+down_revision: Union[str, Sequence[str], None] = '5b7e0c93f1d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Пересоздание таблицы удаляет триггеры поиска - создаем их заново
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS mood_entries_fts_ai AFTER INSERT ON mood_entries BEGIN "
+    "INSERT INTO mood_entries_fts(rowid, notes) VALUES (new.id, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS mood_entries_fts_ad AFTER DELETE ON mood_entries BEGIN "
+    "INSERT INTO mood_entries_fts(mood_entries_fts, rowid, notes) VALUES ('delete', old.id, old.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS mood_entries_fts_au AFTER UPDATE OF notes ON mood_entries BEGIN "
+    "INSERT INTO mood_entries_fts(mood_entries_fts, rowid, notes) VALUES ('delete', old.id, old.notes); "
+    "INSERT INTO mood_entries_fts(rowid, notes) VALUES (new.id, new.notes); END",
+]
+
+
+def _recreate(autoincrement: bool) -> None:
+    with op.batch_alter_table('mood_entries', recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+    for statement in SQLITE_TRIGGERS:
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # PostgreSQL: id из последовательности и так не переиспользуются
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # Без AUTOINCREMENT SQLite отдает освободившийся максимальный rowid заново,
+    # и id перенесенной в архив (или удаленной) записи достается новой
+    _recreate(autoincrement=True)
+    # Счетчик начинается не ниже id, уже известных клиентам по надгробиям
+    op.execute(
+        "UPDATE sqlite_sequence SET seq = max(seq, (SELECT coalesce(max(entry_id), 0) FROM mood_tombstones)) "
+        "WHERE name = 'mood_entries'"
+    )
+    op.execute(
+        "INSERT INTO sqlite_sequence(name, seq) SELECT 'mood_entries', (SELECT coalesce(max(entry_id), 0) FROM mood_tombstones) "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'mood_entries')"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _recreate(autoincrement=False)
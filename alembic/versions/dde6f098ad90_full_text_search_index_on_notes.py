@@ -0,0 +1,66 @@
+"""Full-text search index on notes
+
+Revision ID: dde6f098ad90
+Revises: 8d27e4b1c5f0
+Create Date: 2026-10-18 10:13:32.737256
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dde6f098ad90'
+down_revision: Union[str, Sequence[str], None] = '8d27e4b1c5f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# SQLite: внешняя FTS5-таблица + триггеры синхронизации
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS mood_entries_fts USING fts5("
+    "notes, content='mood_entries', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS mood_entries_fts_ai AFTER INSERT ON mood_entries BEGIN "
+    "INSERT INTO mood_entries_fts(rowid, notes) VALUES (new.id, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS mood_entries_fts_ad AFTER DELETE ON mood_entries BEGIN "
+    "INSERT INTO mood_entries_fts(mood_entries_fts, rowid, notes) VALUES ('delete', old.id, old.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS mood_entries_fts_au AFTER UPDATE OF notes ON mood_entries BEGIN "
+    "INSERT INTO mood_entries_fts(mood_entries_fts, rowid, notes) VALUES ('delete', old.id, old.notes); "
+    "INSERT INTO mood_entries_fts(rowid, notes) VALUES (new.id, new.notes); END",
+    # Бэкфилл индекса по уже существующим записям
+    "INSERT INTO mood_entries_fts(mood_entries_fts) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS mood_entries_fts_ai",
+    "DROP TRIGGER IF EXISTS mood_entries_fts_ad",
+    "DROP TRIGGER IF EXISTS mood_entries_fts_au",
+    "DROP TABLE IF EXISTS mood_entries_fts",
+]
+
+# PostgreSQL: генерируемая tsvector-колонка (заполняется сама) + GIN-индекс
+POSTGRES_UPGRADE = [
+    "ALTER TABLE mood_entries ADD COLUMN IF NOT EXISTS notes_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(notes, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_mood_entries_notes_tsv ON mood_entries USING GIN (notes_tsv)",
+]
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_mood_entries_notes_tsv",
+    "ALTER TABLE mood_entries DROP COLUMN IF EXISTS notes_tsv",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    statements = {"sqlite": SQLITE_UPGRADE, "postgresql": POSTGRES_UPGRADE}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    statements = {"sqlite": SQLITE_DOWNGRADE, "postgresql": POSTGRES_DOWNGRADE}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)
@@ -0,0 +1,260 @@
+# app/admission.py - допуск тяжелых запросов и бюджеты запросов к БД
+#
+# У каждого класса запросов (statistics, analytics, export, ...) свой лимит
+# одновременных запросов и ограниченная очередь ожидания. Лишнее отклоняется
+# сразу: очередь полна - 429, слот не освободился за ADMISSION_MAX_WAIT_MS -
+# 503 (оба с Retry-After). Ожидание идет в event loop, а не в потоке пула,
+# поэтому дешевые CRUD-запросы не стоят за тяжелыми.
+#
+# Допущенный запрос получает таймаут SQL своего класса (PostgreSQL -
+# statement_timeout, SQLite - progress handler) и бюджет строк
+# QUERY_ROW_BUDGET: если ответ потребовал бы прочитать больше строк записей,
+# CRUD отдает только агрегаты и помечает ответ полем degraded.
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.database import _env_bool, _env_int, sqlite_dbapi_connection
+from app.metrics import REGISTRY
+from app.tenancy import get_async_user_db, get_async_user_read_db, get_user_db, get_user_read_db
+
+ADMISSION = _env_bool("ADMISSION", True)
+ADMISSION_QUEUE_SIZE = _env_int("ADMISSION_QUEUE_SIZE", 16)
+ADMISSION_MAX_WAIT_MS = _env_int("ADMISSION_MAX_WAIT_MS", 5000)
+# Сколько строк записей может прочитать один запрос, прежде чем ответ
+# деградирует до агрегатов (0 - без ограничения)
+QUERY_ROW_BUDGET = _env_int("QUERY_ROW_BUDGET", 100000) or None
+# Как часто SQLite вызывает проверку таймаута (в инструкциях VM)
+SQLITE_PROGRESS_STEPS = 10000
+# Ключ в Session.info: таймаут SQL допущенного запроса, мс
+STATEMENT_TIMEOUT_KEY = "statement_timeout_ms"
+
+
+def _parse_limits(value: str) -> Dict[str, int]:
+    """"analytics=4,export=2" -> {"analytics": 4, "export": 2}"""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {name.strip(): int(number) for name, number in pairs}
+
+
+# Одновременных запросов на класс (классы без лимита не ограничиваются)
+ADMISSION_LIMITS = _parse_limits(os.getenv(
+    "ADMISSION_LIMITS", "analytics=4,statistics=8,calendar=8,heatmap=8,search=8,export=2,bulk=2"
+))
+# Таймаут SQL на класс, мс (0 или нет в списке - без таймаута)
+STATEMENT_TIMEOUTS_MS = _parse_limits(os.getenv(
+    "STATEMENT_TIMEOUTS_MS", "analytics=30000,statistics=10000,calendar=10000,heatmap=10000,search=5000"
+))
+
+IN_FLIGHT = REGISTRY.gauge("mood_flow_admission_in_flight", "Допущенные запросы в работе", ("request_class",))
+QUEUED = REGISTRY.gauge("mood_flow_admission_queued", "Запросы в очереди за слотом", ("request_class",))
+WAIT = REGISTRY.histogram("mood_flow_admission_wait_seconds", "Ожидание слота в очереди", ("request_class",))
+REJECTED = REGISTRY.counter(
+    "mood_flow_admission_rejected_total",
+    "Отклоненные запросы: queue_full (429), wait_timeout и statement_timeout (503)",
+    ("request_class", "reason")
+)
+DEGRADED = REGISTRY.counter("mood_flow_row_budget_degraded_total", "Ответы без части данных из-за QUERY_ROW_BUDGET", ("part",))
+
+
+def over_row_budget(rows: int, row_budget: Optional[int], part: str) -> bool:
+    """Превышает ли чтение rows строк бюджет (и учесть деградацию в метриках)"""
+    if row_budget is None or rows <= row_budget: return False
+    DEGRADED.inc(part=part)
+    return True
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Не больше limit запросов одновременно и не больше queue_size в очереди
+
+    Ожидающие - futures своих event loop в FIFO; освободившийся слот
+    передается первому из них, поэтому счетчики защищены обычным локом.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int = ADMISSION_QUEUE_SIZE, max_wait: float = ADMISSION_MAX_WAIT_MS / 1000):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        with self._lock:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                IN_FLIGHT.set(self.in_flight, request_class=self.name)
+                return
+            if len(self._waiters) >= self.queue_size:
+                REJECTED.inc(request_class=self.name, reason="queue_full")
+                raise AdmissionRejected(429, "queue_full", 1)
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+            QUEUED.set(len(self._waiters), request_class=self.name)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            if self._withdraw(waiter):
+                REJECTED.inc(request_class=self.name, reason="wait_timeout")
+                raise AdmissionRejected(503, "wait_timeout", max(1, math.ceil(self.max_wait)))
+            # Слот успели передать одновременно с таймаутом - он наш
+        except BaseException:
+            # Клиент ушел из очереди: слот, если его уже передали, отдаем дальше
+            if not self._withdraw(waiter):
+                self.release()
+            raise
+        finally:
+            WAIT.observe(time.perf_counter() - started, request_class=self.name)
+
+    def _withdraw(self, waiter) -> bool:
+        """Убрать ожидающего из очереди; False - слот ему уже передан"""
+        with self._lock:
+            for item in self._waiters:
+                if item[1] is waiter:
+                    self._waiters.remove(item)
+                    QUEUED.set(len(self._waiters), request_class=self.name)
+                    return True
+        return False
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                QUEUED.set(len(self._waiters), request_class=self.name)
+                if waiter.done(): continue
+                # Слот переходит ожидающему, in_flight не меняется
+                try:
+                    loop.call_soon_threadsafe(_grant, waiter)
+                    return
+                except RuntimeError:
+                    continue  # event loop ожидающего закрыт
+            self.in_flight -= 1
+            IN_FLIGHT.set(self.in_flight, request_class=self.name)
+
+
+def _grant(waiter) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdmissionController:
+    """Гейты по классам запросов (создаются из ADMISSION_LIMITS)"""
+
+    def __init__(self, enabled: bool = ADMISSION, limits: Optional[Dict[str, int]] = None):
+        self.enabled = enabled
+        limits = ADMISSION_LIMITS if limits is None else limits
+        self.gates = {name: AdmissionGate(name, limit) for name, limit in limits.items() if limit > 0}
+
+    def gate(self, request_class: str) -> Optional[AdmissionGate]:
+        return self.gates.get(request_class) if self.enabled else None
+
+
+admission = AdmissionController()
+
+
+def admission_slot(request_class: str):
+    """Зависимость: слот класса запросов на все время запроса (включая поток ответа)"""
+    async def dependency():
+        gate = admission.gate(request_class)
+        if gate is None:
+            yield
+            return
+        try:
+            await gate.acquire()
+        except AdmissionRejected as exc:
+            raise HTTPException(
+                exc.status_code,
+                detail=f"Too many {request_class} requests ({exc.reason}), retry later",
+                headers={"Retry-After": str(exc.retry_after)}
+            )
+        try:
+            yield
+        finally:
+            gate.release()
+    return dependency
+
+
+def _is_statement_timeout(exc: OperationalError) -> bool:
+    # SQLite: interrupted (progress handler); PostgreSQL: query_canceled (57014)
+    return "interrupted" in str(exc.orig) or getattr(exc.orig, "pgcode", None) == "57014"
+
+
+def _statement_timeout_error(request_class: str) -> HTTPException:
+    REJECTED.inc(request_class=request_class, reason="statement_timeout")
+    return HTTPException(503, detail=f"{request_class} query exceeded its time budget", headers={"Retry-After": "1"})
+
+
+def set_statement_timeout(connection: Connection, timeout_ms: int) -> None:
+    """Таймаут SQL до конца транзакции (PostgreSQL) или до возврата соединения в пул (SQLite)"""
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+    elif dialect == "sqlite":
+        deadline = time.monotonic() + timeout_ms / 1000
+        # Снимается при возврате соединения в пул (make_engine)
+        sqlite_dbapi_connection(connection.connection.dbapi_connection).set_progress_handler(
+            lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS
+        )
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    # Таймаут ставится, только когда сессия действительно пошла в базу:
+    # ответ из кэша соединение не занимает
+    timeout_ms = session.info.get(STATEMENT_TIMEOUT_KEY)
+    if timeout_ms: set_statement_timeout(connection, timeout_ms)
+
+
+def admit(request_class: str, primary: bool = False):
+    """
+    Зависимость синхронного эндпоинта: слот класса + таймаут SQL его сессии
+
+    primary - эндпоинт читает основную базу (get_user_db, кэшируемые ответы),
+    иначе сессию с репликой. Прерванный по таймауту запрос превращается в 503.
+    """
+    timeout_ms = STATEMENT_TIMEOUTS_MS.get(request_class, 0)
+
+    def dependency(db: Session = Depends(get_user_db if primary else get_user_read_db), _slot: None = Depends(admission_slot(request_class))):
+        if timeout_ms: db.info[STATEMENT_TIMEOUT_KEY] = timeout_ms
+        try:
+            yield
+        except OperationalError as exc:
+            if _is_statement_timeout(exc): raise _statement_timeout_error(request_class)
+            raise
+    return dependency
+
+
+def admit_async(request_class: str, primary: bool = False):
+    """То же, что admit, для эндпоинтов на AsyncSession"""
+    timeout_ms = STATEMENT_TIMEOUTS_MS.get(request_class, 0)
+
+    async def dependency(db=Depends(get_async_user_db if primary else get_async_user_read_db), _slot: None = Depends(admission_slot(request_class))):
+        if timeout_ms: db.info[STATEMENT_TIMEOUT_KEY] = timeout_ms
+        try:
+            yield
+        except OperationalError as exc:
+            if _is_statement_timeout(exc): raise _statement_timeout_error(request_class)
+            raise
+    return dependency
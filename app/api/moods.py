@@ -1,74 +1,433 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import date
+from typing import AsyncIterator, Iterator, List, Literal, Optional, Tuple
+from datetime import date, datetime, timedelta
+import asyncio
+import csv
+import io
+import json
+import os
 
-from app.database import get_db
+from app.admission import QUERY_ROW_BUDGET, admission_slot, admit
+from app.archive import ArchivedReadOnly
+from app.cache import cached_json_response
+from app.events import EVENTS_HEARTBEAT_S, event_hub, format_event
+from app.group_commit import GROUP_COMMIT, group_committer
+from app.crud import analytics as crud_analytics
 from app.crud import mood as crud_mood
-from app.schemas.mood import MoodCreate, MoodUpdate, MoodResponse
+from app.crud import search as crud_search
+from app.crud import sync as crud_sync
+from app.tenancy import get_user_db, get_user_id, get_user_read_db, session_for
+from app.schemas.mood import MoodCreate, MoodBulkItem, MoodUpdate, MoodResponse, MoodSearchResult, MoodBulkFilter, MoodBulkRetag, MoodBulkMutationResult, MoodBulkResult, MoodChanges
 
 router = APIRouter(prefix="/moods", tags=["moods"])
 
 @router.post("/", response_model=MoodResponse, status_code=status.HTTP_201_CREATED)
-def create_mood(mood: MoodCreate, db: Session = Depends(get_db)):
-    return crud_mood.create_mood_entry(db=db, mood=mood)
+async def create_mood(mood: MoodCreate, user_id: str = Depends(get_user_id), db: Session = Depends(get_user_db)):
+    # GROUP_COMMIT: запись уходит в общую транзакцию с соседними запросами
+    if GROUP_COMMIT: return await asyncio.wrap_future(group_committer.submit(mood, user_id))
+    return await run_in_threadpool(crud_mood.create_mood_entry, db, mood, user_id)
+
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(16 * 1024 * 1024)))
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+async def _read_body_capped(request: Request) -> AsyncIterator[bytes]:
+    """Тело запроса по кускам; 413, как только прочитано больше BULK_MAX_BYTES"""
+    too_large = HTTPException(413, detail=f"Request body too large (max {BULK_MAX_BYTES} bytes)")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > BULK_MAX_BYTES: raise too_large
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > BULK_MAX_BYTES: raise too_large
+        yield chunk
+
+async def _bulk_items(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Пары (индекс, разобранный JSON) из JSON-массива или NDJSON
+
+    NDJSON разбирается построчно по мере чтения потока; битая строка
+    приходит как ValueError. JSON-массив читается целиком (в пределах
+    BULK_MAX_BYTES).
+    """
+    if request.headers.get("content-type", "").split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES:
+        index, buffer = 0, b""
+        async for chunk in _read_body_capped(request):
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                if not line.strip(): continue
+                try:
+                    yield index, json.loads(line)
+                except ValueError as exc:
+                    yield index, ValueError(f"Invalid JSON: {exc}")
+                index += 1
+        if buffer.strip():
+            try:
+                yield index, json.loads(buffer)
+            except ValueError as exc:
+                yield index, ValueError(f"Invalid JSON: {exc}")
+        return
+
+    try:
+        items = json.loads(b"".join([chunk async for chunk in _read_body_capped(request)]))
+    except ValueError as exc:
+        raise HTTPException(400, detail=f"Invalid JSON: {exc}")
+    if not isinstance(items, list):
+        raise HTTPException(400, detail="Expected a JSON array of entries")
+    for index, raw in enumerate(items):
+        yield index, raw
+
+@router.post("/bulk", response_model=MoodBulkResult, dependencies=[Depends(admission_slot("bulk"))], openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": MoodBulkItem.model_json_schema()}},
+            "application/x-ndjson": {"schema": MoodBulkItem.model_json_schema()},
+        },
+    }
+})
+async def create_moods_bulk(request: Request, user_id: str = Depends(get_user_id), db: Session = Depends(get_user_db)):
+    """
+    Массовый импорт записей (JSON-массив или NDJSON) с явной датой у каждой записи
+    
+    Корректные записи вставляются одной транзакцией чанками по мере чтения
+    (NDJSON не буферизуется целиком), некорректные возвращаются в errors с
+    индексом и не мешают остальным. Больше BULK_MAX_ITEMS записей или
+    BULK_MAX_BYTES байт - 413, уже вставленное откатывается.
+    """
+    bulk = crud_mood.MoodBulkInsert(db, user_id=user_id)
+    errors = []
+    try:
+        async for index, raw in _bulk_items(request):
+            if index >= BULK_MAX_ITEMS:
+                raise HTTPException(413, detail=f"Too many entries (max {BULK_MAX_ITEMS})")
+            if isinstance(raw, ValueError):
+                errors.append({"index": index, "errors": [str(raw)]})
+                continue
+            try:
+                bulk.add(index, MoodBulkItem.model_validate(raw))
+            except ValidationError as exc:
+                errors.append({"index": index, "errors": exc.errors(include_url=False, include_context=False)})
+                continue
+            if bulk.full: await run_in_threadpool(bulk.flush)
+        inserted, db_errors = await run_in_threadpool(bulk.finish)
+    except Exception:
+        await run_in_threadpool(bulk.abort)
+        raise
+    errors = sorted(errors + db_errors, key=lambda error: error["index"])
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
+
+@router.post("/bulk/delete", response_model=MoodBulkMutationResult, dependencies=[Depends(admission_slot("bulk"))])
+def delete_moods_bulk(mood_filter: MoodBulkFilter, user_id: str = Depends(get_user_id), db: Session = Depends(get_user_db)):
+    """Удалить все записи за период и/или с типом настроения (одним запросом); 409 - фильтр задевает архив"""
+    try:
+        return {"affected": crud_mood.delete_mood_entries(db, mood_filter.start_date, mood_filter.end_date, mood_filter.mood_type, user_id)}
+    except ArchivedReadOnly as exc:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=str(exc))
+
+@router.post("/bulk/retag", response_model=MoodBulkMutationResult, dependencies=[Depends(admission_slot("bulk"))])
+def retag_moods_bulk(retag: MoodBulkRetag, user_id: str = Depends(get_user_id), db: Session = Depends(get_user_db)):
+    """Сменить тип настроения у всех записей по фильтру (одним запросом); 409 - фильтр задевает архив"""
+    try:
+        return {"affected": crud_mood.retag_mood_entries(db, retag.new_mood_type, retag.start_date, retag.end_date, retag.mood_type, user_id)}
+    except ArchivedReadOnly as exc:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=str(exc))
 
 @router.get("/", response_model=List[MoodResponse])
 def read_moods(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     date_filter: Optional[date] = Query(None),
     mood_type: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor (вместо skip)"),
+    user_id: str = Depends(get_user_id),
+    db: Session = Depends(get_user_read_db)
 ):
-    return crud_mood.get_mood_entries(db=db, skip=skip, limit=limit, date_filter=date_filter, mood_type_filter=mood_type)
+    try:
+        entries, next_cursor = crud_mood.get_mood_entries_page(db=db, skip=skip, limit=limit, date_filter=date_filter, mood_type_filter=mood_type, cursor=cursor, user_id=user_id)
+    except ValueError:
+        raise HTTPException(400, detail="Invalid cursor")
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return entries
+
+EXPORT_COLUMNS = ["id", "date", "created_at", "mood_type", "mood_score", "notes"]
+
+def _export_lines(export_format: str, start_date: Optional[date], end_date: Optional[date], mood_type: Optional[str], user_id: str) -> Iterator[str]:
+    """Строки экспорта; сессия живет столько же, сколько поток ответа"""
+    db = session_for(user_id, read=True)
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == "csv":
+            writer.writerow(EXPORT_COLUMNS)
+        for row in crud_mood.iter_mood_entries(db, start_date, end_date, mood_type, user_id=user_id):
+            record = dict(zip(EXPORT_COLUMNS, row))
+            if export_format == "csv":
+                writer.writerow(record.values())
+            else:
+                buffer.write(json.dumps(jsonable_encoder(record), ensure_ascii=False) + "\n")
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        db.close()
+
+# Слот держится, пока идет поток ответа
+@router.get("/export", dependencies=[Depends(admission_slot("export"))])
+def export_moods(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Формат: ndjson или csv"),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    mood_type: Optional[str] = Query(None),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Выгрузить всю историю настроений потоком (NDJSON или CSV)
+    
+    Записи читаются серверным курсором и отдаются по мере чтения,
+    так что первые байты приходят до окончания запроса к базе.
+    """
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_lines(format, start_date, end_date, mood_type, user_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="mood_flow_export.{format}"'}
+    )
+
+@router.get("/search", response_model=List[MoodSearchResult], dependencies=[Depends(admit("search"))])
+def search_moods(
+    q: str = Query(..., min_length=1, max_length=200, description="Слова для поиска в заметках"),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    min_score: Optional[int] = Query(None, ge=1, le=5),
+    max_score: Optional[int] = Query(None, ge=1, le=5),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    user_id: str = Depends(get_user_id),
+    db: Session = Depends(get_user_read_db)
+):
+    """
+    Полнотекстовый поиск по заметкам
+    
+    Находит записи, в заметках которых есть все слова запроса (по началу
+    слова), самые релевантные - первыми. Операторы в запросе не поддерживаются.
+    """
+    results = crud_search.search_mood_entries(db, q, start_date, end_date, min_score, max_score, skip=skip, limit=limit, user_id=user_id)
+    return [
+        MoodSearchResult(**MoodResponse.model_validate(entry).model_dump(), rank=rank)
+        for entry, rank in results
+    ]
+
+@router.get("/changes", response_model=MoodChanges)
+def read_changes(
+    since: int = Query(0, ge=0, description="Версия из прошлого ответа (0 - полная синхронизация)"),
+    after_id: Optional[int] = Query(None, description="after_id из прошлого ответа при has_more"),
+    limit: int = Query(500, ge=1, le=crud_sync.CHANGES_MAX_LIMIT),
+    user_id: str = Depends(get_user_id),
+    db: Session = Depends(get_user_read_db)
+):
+    """
+    Дельта-синхронизация: записи, измененные после курсора, и id удаленных
+
+    Клиент сохраняет since/after_id ответа и повторяет запрос, пока
+    has_more=true. 410 - надгробия после since уже сжаты: нужно начать
+    заново с since=0.
+    """
+    try:
+        return crud_sync.get_changes(db, since, after_id, limit, user_id=user_id)
+    except crud_sync.ChangesGone as exc:
+        raise HTTPException(status.HTTP_410_GONE, detail=f"{exc}; resync with since=0")
+
+@router.get("/events", response_class=StreamingResponse)
+async def mood_events(user_id: str = Depends(get_user_id)):
+    """
+    Поток Server-Sent Events с изменениями записей пользователя
+
+    mood - запись создана/изменена/удалена, с новыми итогами ее дня;
+    reload - массовая операция, данные периода нужно перечитать;
+    resync - клиент не успевал читать события и будет отключен.
+    """
+    if not event_hub.enabled: raise HTTPException(404, detail="Events are disabled")
+
+    async def stream():
+        subscriber = event_hub.subscribe(user_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(subscriber.queue.get(), EVENTS_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    # Комментарий-пинг держит соединение через прокси
+                    yield ": ping\n\n"
+                    continue
+                yield format_event(event, data)
+                if subscriber.dropped and subscriber.queue.empty(): return
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 @router.get("/{mood_id}", response_model=MoodResponse)
-def read_mood(mood_id: int, db: Session = Depends(get_db)):
-    db_mood = crud_mood.get_mood_entry_by_id(db=db, mood_id=mood_id)
+def read_mood(mood_id: int, user_id: str = Depends(get_user_id), db: Session = Depends(get_user_read_db)):
+    db_mood = crud_mood.get_mood_entry_by_id(db=db, mood_id=mood_id, user_id=user_id)
     if not db_mood: raise HTTPException(404, detail="Not found")
     return db_mood
 
 @router.put("/{mood_id}", response_model=MoodResponse)
-def update_mood(mood_id: int, mood_update: MoodUpdate, db: Session = Depends(get_db)):
-    db_mood = crud_mood.update_mood_entry(db=db, mood_id=mood_id, mood_update=mood_update)
+def update_mood(mood_id: int, mood_update: MoodUpdate, user_id: str = Depends(get_user_id), db: Session = Depends(get_user_db)):
+    try:
+        db_mood = crud_mood.update_mood_entry(db=db, mood_id=mood_id, mood_update=mood_update, user_id=user_id)
+    except ArchivedReadOnly as exc:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=str(exc))
     if not db_mood: raise HTTPException(404, detail="Not found")
     return db_mood
 
 @router.delete("/{mood_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_mood(mood_id: int, db: Session = Depends(get_db)):
-    if not crud_mood.delete_mood_entry(db=db, mood_id=mood_id):
-        raise HTTPException(404, detail="Not found")
+def delete_mood(mood_id: int, user_id: str = Depends(get_user_id), db: Session = Depends(get_user_db)):
+    try:
+        deleted = crud_mood.delete_mood_entry(db=db, mood_id=mood_id, user_id=user_id)
+    except ArchivedReadOnly as exc:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=str(exc))
+    if not deleted: raise HTTPException(404, detail="Not found")
     
 # В app/api/moods.py добавить:
-@router.get("/statistics/", response_model=dict)
+@router.get("/statistics/", response_model=dict, dependencies=[Depends(admit("statistics", primary=True))])
 def get_statistics(
+    request: Request,
     start_date: date = Query(..., description="Начальная дата (YYYY-MM-DD)"),
     end_date: date = Query(..., description="Конечная дата (YYYY-MM-DD)"),
-    db: Session = Depends(get_db)
+    include_entries: bool = Query(False, description="Вернуть записи периода (entries_data)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: str = Depends(get_user_id),
+    db: Session = Depends(get_user_db)
 ):
     """
     Получить статистику настроений за период
     
     - **start_date**: Начало периода
     - **end_date**: Конец периода
+    - **include_entries**: добавить постраничный список записей (skip/limit)
+    
+    Ответ кэшируется до первой записи в этом периоде и отдается с ETag.
     """
-    return crud_mood.get_mood_statistics(db, start_date, end_date)
+    key = ("statistics", user_id, start_date, end_date, include_entries, skip, limit)
+    return cached_json_response(
+        request, key, start_date, end_date,
+        lambda: crud_mood.get_mood_statistics(db, start_date, end_date, include_entries=include_entries, skip=skip, limit=limit, user_id=user_id, row_budget=QUERY_ROW_BUDGET),
+        user_id=user_id
+    )
 
 
 
 # Добавим новый эндпоинт после статистики
 
-@router.get("/calendar/", response_model=dict)
+@router.get("/calendar/", response_model=dict, dependencies=[Depends(admit("calendar", primary=True))])
 def get_mood_calendar(
+    request: Request,
     year: int = Query(None, description="Год (например, 2023)"),
-    month: int = Query(None, description="Месяц (1-12)"),
-    db: Session = Depends(get_db)
+    month: int = Query(None, ge=1, le=12, description="Месяц (1-12)"),
+    include_entries: bool = Query(True, description="Встроить записи каждого дня"),
+    compact: bool = Query(False, description="Компактный ответ: только дни с данными, колонками, без записей"),
+    user_id: str = Depends(get_user_id),
+    db: Session = Depends(get_user_db)
 ):
     """
     Получить данные для календаря настроений (доски)
     
     Возвращает структуру для визуализации Heatmap.
     Каждый день содержит оценку, тип настроения и цвет.
+    С compact=true - только дни с данными (смещения, средние, число записей,
+    индексы цветов); подробности дня - /moods/calendar/day/{day}.
+    Ответ кэшируется до первой записи в этом месяце и отдается с ETag.
+    """
+    now = datetime.now()
+    target_year = year or now.year
+    target_month = month or now.month
+    start_date, end_date = crud_mood.get_month_bounds(target_year, target_month)
+    if compact:
+        return cached_json_response(
+            request, ("calendar_compact", user_id, target_year, target_month), start_date, end_date - timedelta(days=1),
+            lambda: crud_mood.get_mood_calendar_compact(db, target_year, target_month, user_id=user_id),
+            user_id=user_id
+        )
+    key = ("calendar", user_id, target_year, target_month, include_entries)
+    return cached_json_response(
+        request, key, start_date, end_date - timedelta(days=1),
+        lambda: crud_mood.get_mood_calendar_data(db, target_year, target_month, include_entries=include_entries, user_id=user_id, row_budget=QUERY_ROW_BUDGET),
+        user_id=user_id
+    )
+
+@router.get("/calendar/day/{day}", response_model=dict, dependencies=[Depends(admit("calendar", primary=True))])
+def get_mood_calendar_day(request: Request, day: date, user_id: str = Depends(get_user_id), db: Session = Depends(get_user_db)):
+    """Подробности дня календаря: распределение оценок, типы и записи"""
+    return cached_json_response(
+        request, ("calendar_day", user_id, day), day, day,
+        lambda: crud_mood.get_mood_day_details(db, day, user_id=user_id, row_budget=QUERY_ROW_BUDGET),
+        user_id=user_id
+    )
+
+@router.get("/heatmap/", response_model=dict, dependencies=[Depends(admit("heatmap", primary=True))])
+def get_mood_heatmap(
+    request: Request,
+    start_date: Optional[date] = Query(None, description="Начальная дата (по умолчанию - год назад)"),
+    end_date: Optional[date] = Query(None, description="Конечная дата (по умолчанию - сегодня)"),
+    user_id: str = Depends(get_user_id),
+    db: Session = Depends(get_user_db)
+):
+    """
+    Тепловая карта настроений за период (год и больше одним запросом)
+
+    Ответ колоночный: массивы scores/counts/colors по дням от start_date,
+    цвета - индексы в palette. Записи не встраиваются.
+    """
+    end_date = end_date or datetime.now().date()
+    start_date = start_date or end_date - timedelta(days=364)
+    if start_date > end_date:
+        raise HTTPException(400, detail="start_date must not be after end_date")
+    if (end_date - start_date).days + 1 > crud_mood.HEATMAP_MAX_DAYS:
+        raise HTTPException(400, detail=f"Range is limited to {crud_mood.HEATMAP_MAX_DAYS} days")
+    key = ("heatmap", user_id, start_date, end_date)
+    return cached_json_response(
+        request, key, start_date, end_date,
+        lambda: crud_mood.get_mood_heatmap(db, start_date, end_date, user_id=user_id),
+        user_id=user_id
+    )
+
+@router.get("/analytics/", response_model=dict, dependencies=[Depends(admit("analytics", primary=True))])
+def get_mood_analytics(
+    request: Request,
+    start_date: Optional[date] = Query(None, description="Начальная дата (по умолчанию - 10 лет назад)"),
+    end_date: Optional[date] = Query(None, description="Конечная дата (по умолчанию - сегодня)"),
+    user_id: str = Depends(get_user_id),
+    db: Session = Depends(get_user_db)
+):
+    """
+    Аналитика настроения за период
+
+    Скользящие средние (7/30/90 дней), профили по дням недели и часам,
+    типы настроения, серии дней подряд и линейный тренд средней оценки.
     """
-    return crud_mood.get_mood_calendar_data(db, year, month)
\ No newline at end of file
+    end_date = end_date or datetime.now().date()
+    start_date = start_date or end_date - timedelta(days=3652)
+    if start_date > end_date:
+        raise HTTPException(400, detail="start_date must not be after end_date")
+    if (end_date - start_date).days + 1 > crud_analytics.ANALYTICS_MAX_DAYS:
+        raise HTTPException(400, detail=f"Range is limited to {crud_analytics.ANALYTICS_MAX_DAYS} days")
+    key = ("analytics", user_id, start_date, end_date)
+    return cached_json_response(
+        request, key, start_date, end_date,
+        lambda: crud_analytics.get_mood_analytics(db, start_date, end_date, user_id=user_id, row_budget=QUERY_ROW_BUDGET),
+        user_id=user_id
+    )
@@ -0,0 +1,113 @@
+# app/api/moods_async.py - async def версии основных эндпоинтов (DB_MODE=async)
+#
+# Подключаются в app/main.py перед синхронным роутером и заменяют его
+# маршруты с теми же путями; остальные (bulk, export) остаются синхронными.
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import asyncio
+
+from app.admission import QUERY_ROW_BUDGET, admit_async
+from app.archive import ArchivedReadOnly
+from app.cache import cached_json_response_async
+from app.group_commit import GROUP_COMMIT, group_committer
+from app.crud import mood as crud_mood
+from app.crud import mood_async as crud_mood_async
+from app.tenancy import get_async_user_db, get_async_user_read_db, get_user_id
+from app.schemas.mood import MoodCreate, MoodUpdate, MoodResponse
+
+router = APIRouter(prefix="/moods", tags=["moods"])
+
+@router.post("/", response_model=MoodResponse, status_code=status.HTTP_201_CREATED)
+async def create_mood(mood: MoodCreate, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_async_user_db)):
+    if GROUP_COMMIT: return await asyncio.wrap_future(group_committer.submit(mood, user_id))
+    return await crud_mood_async.create_mood_entry(db=db, mood=mood, user_id=user_id)
+
+@router.get("/", response_model=List[MoodResponse])
+async def read_moods(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    date_filter: Optional[date] = Query(None),
+    mood_type: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor (вместо skip)"),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_async_user_read_db)
+):
+    try:
+        entries, next_cursor = await crud_mood_async.get_mood_entries_page(db=db, skip=skip, limit=limit, date_filter=date_filter, mood_type_filter=mood_type, cursor=cursor, user_id=user_id)
+    except ValueError:
+        raise HTTPException(400, detail="Invalid cursor")
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return entries
+
+@router.get("/{mood_id}", response_model=MoodResponse)
+async def read_mood(mood_id: int, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_async_user_read_db)):
+    db_mood = await crud_mood_async.get_mood_entry_by_id(db=db, mood_id=mood_id, user_id=user_id)
+    if not db_mood: raise HTTPException(404, detail="Not found")
+    return db_mood
+
+@router.put("/{mood_id}", response_model=MoodResponse)
+async def update_mood(mood_id: int, mood_update: MoodUpdate, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_async_user_db)):
+    try:
+        db_mood = await crud_mood_async.update_mood_entry(db=db, mood_id=mood_id, mood_update=mood_update, user_id=user_id)
+    except ArchivedReadOnly as exc:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=str(exc))
+    if not db_mood: raise HTTPException(404, detail="Not found")
+    return db_mood
+
+@router.delete("/{mood_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_mood(mood_id: int, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_async_user_db)):
+    try:
+        deleted = await crud_mood_async.delete_mood_entry(db=db, mood_id=mood_id, user_id=user_id)
+    except ArchivedReadOnly as exc:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=str(exc))
+    if not deleted: raise HTTPException(404, detail="Not found")
+
+@router.get("/statistics/", response_model=dict, dependencies=[Depends(admit_async("statistics", primary=True))])
+async def get_statistics(
+    request: Request,
+    start_date: date = Query(..., description="Начальная дата (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Конечная дата (YYYY-MM-DD)"),
+    include_entries: bool = Query(False, description="Вернуть записи периода (entries_data)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_async_user_db)
+):
+    """Статистика настроений за период (async-версия)"""
+    key = ("statistics", user_id, start_date, end_date, include_entries, skip, limit)
+    return await cached_json_response_async(
+        request, key, start_date, end_date,
+        lambda: crud_mood_async.get_mood_statistics(db, start_date, end_date, include_entries=include_entries, skip=skip, limit=limit, user_id=user_id, row_budget=QUERY_ROW_BUDGET),
+        user_id=user_id
+    )
+
+@router.get("/calendar/", response_model=dict, dependencies=[Depends(admit_async("calendar", primary=True))])
+async def get_mood_calendar(
+    request: Request,
+    year: int = Query(None, description="Год (например, 2023)"),
+    month: int = Query(None, ge=1, le=12, description="Месяц (1-12)"),
+    include_entries: bool = Query(True, description="Встроить записи каждого дня"),
+    compact: bool = Query(False, description="Компактный ответ: только дни с данными, колонками, без записей"),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_async_user_db)
+):
+    """Данные для календаря настроений (async-версия)"""
+    now = datetime.now()
+    target_year = year or now.year
+    target_month = month or now.month
+    start_date, end_date = crud_mood.get_month_bounds(target_year, target_month)
+    if compact:
+        return await cached_json_response_async(
+            request, ("calendar_compact", user_id, target_year, target_month), start_date, end_date - timedelta(days=1),
+            lambda: crud_mood_async.get_mood_calendar_compact(db, target_year, target_month, user_id=user_id),
+            user_id=user_id
+        )
+    key = ("calendar", user_id, target_year, target_month, include_entries)
+    return await cached_json_response_async(
+        request, key, start_date, end_date - timedelta(days=1),
+        lambda: crud_mood_async.get_mood_calendar_data(db, target_year, target_month, include_entries=include_entries, user_id=user_id, row_budget=QUERY_ROW_BUDGET),
+        user_id=user_id
+    )
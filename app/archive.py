@@ -0,0 +1,446 @@
+# app/archive.py - архив закрытых месяцев в колоночных сегментах
+#
+# Старые месяцы почти не меняются, а в mood_entries раздувают индексы и
+# каждый диапазонный запрос. python manage.py archive переносит их в файлы
+# ARCHIVE_DIR/<user_id>/<YYYY-MM>.seg: колонки id, день, created_at, оценка
+# и код типа лежат непрерывными массивами (читаются через mmap), рядом -
+# готовые агрегаты по дням. Заметки - в отдельном файле
+# <YYYY-MM>.<метка>.notes, сегмент хранит смещения в нем.
+#
+# Агрегаты архивных дней берутся из сегментов, а не из mood_daily_rollup:
+# CRUD складывает архив и живую таблицу (в архивный месяц можно дописать
+# записи импортом - их следующий запуск archive перенесет в тот же сегмент).
+#
+# Архивные записи только читаются: список, запись по id, дельта-синхронизация
+# и поиск по заметкам отдают их вместе с живыми, а PUT/DELETE и массовые операции, задевающие архивные месяцы,
+# получают ArchivedReadOnly (в API - 409).
+#
+# Формат сегмента: MAGIC, длина заголовка (uint32 LE), заголовок JSON,
+# затем колонки, выровненные по 8 байт. Файл заменяется целиком
+# (os.replace), так что читатели видят либо старый, либо новый сегмент.
+import heapq
+import itertools
+import json
+import mmap
+import os
+import secrets
+import struct
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.metrics import REGISTRY
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+
+MAGIC = b"MFSEG1\n"
+FORMAT_VERSION = 1
+# created_at = NULL
+NO_TIMESTAMP = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1)
+
+ROW_COLUMNS = {
+    "id": "<i8",
+    "day": "<i4",          # date.toordinal()
+    "created_at": "<i8",   # микросекунды от 1970-01-01 (наивное время, как в базе)
+    "score": "i1",
+    "type": "<i2",         # индекс в header["types"]
+    "notes_start": "<i8",  # смещение в файле заметок
+    "notes_len": "<i4",    # -1 - notes = NULL
+    "version": "<i8",      # версия изменения (в сегментах без колонки - 0)
+}
+DAILY_COLUMNS = {
+    "daily_day": "<i4",
+    "daily_type": "<i2",
+    "daily_score": "i1",
+    "daily_count": "<i4",
+}
+
+SEGMENTS_OPEN = REGISTRY.gauge("mood_flow_archive_segments_open", "Открытые (mmap) сегменты архива")
+
+
+class ArchivedReadOnly(Exception):
+    """Изменение затронуло бы записи архивного месяца"""
+
+
+class ArchivedEntry(NamedTuple):
+    """Запись из архива (первые поля и их порядок - как у строк экспорта)"""
+    id: int
+    date: date
+    created_at: Optional[datetime]
+    mood_type: str
+    mood_score: int
+    notes: Optional[str]
+    version: int = 0
+
+
+class RollupRow(NamedTuple):
+    """Агрегат архивного дня (поля - как у MoodDailyRollup)"""
+    day: date
+    mood_type: str
+    mood_score: int
+    entries_count: int
+    score_sum: int
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def order_key(order: str):
+    """Ключ сортировки записей (архивных и строк из базы) по колонке order"""
+    if order == "created_at":
+        # NULL - первыми, как в ORDER BY created_at у SQLite
+        return lambda entry: entry.created_at or datetime.min
+    return lambda entry: getattr(entry, order)
+
+
+def _timestamp(value: Optional[datetime]) -> int:
+    if value is None: return NO_TIMESTAMP
+    return (value.replace(tzinfo=None) - _EPOCH) // timedelta(microseconds=1)
+
+
+def _datetime(value: int) -> Optional[datetime]:
+    if value == NO_TIMESTAMP: return None
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+class Segment:
+    """Один месяц одного пользователя, открытый через mmap (только чтение)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a mood archive segment")
+        (header_size,) = struct.unpack_from("<I", self._map, len(MAGIC))
+        self.header = json.loads(self._map[len(MAGIC) + 4:len(MAGIC) + 4 + header_size])
+        self.month = date.fromisoformat(self.header["month"] + "-01")
+        self.rows = self.header["rows"]
+        self.types = self.header["types"]
+
+        buffer = np.frombuffer(self._map, dtype=np.uint8)
+        self.columns = {
+            name: buffer[offset:offset + count * np.dtype(dtype).itemsize].view(dtype)
+            for name, (dtype, offset, count) in self.header["columns"].items()
+        }
+        notes_path = os.path.join(os.path.dirname(path), self.header["notes"])
+        with open(notes_path, "rb") as file:
+            self._notes = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b""
+
+    def _bounds(self, column: str, start: Optional[date], end: Optional[date]) -> slice:
+        # Колонки дней отсортированы - границы периода двоичным поиском
+        days = self.columns[column]
+        low = int(np.searchsorted(days, start.toordinal(), "left")) if start else 0
+        high = int(np.searchsorted(days, end.toordinal(), "right")) if end else len(days)
+        return slice(low, high)
+
+    def rows_between(self, start: Optional[date] = None, end: Optional[date] = None) -> slice:
+        """Строки периода (строки отсортированы по дню и id)"""
+        return self._bounds("day", start, end)
+
+    def rollup(self, start: Optional[date] = None, end: Optional[date] = None) -> List[RollupRow]:
+        """Агрегаты дней периода по возрастанию дня"""
+        window = self._bounds("daily_day", start, end)
+        columns = [self.columns[name][window].tolist() for name in DAILY_COLUMNS]
+        return [
+            RollupRow(date.fromordinal(day), self.types[type_code], score, count, count * score)
+            for day, type_code, score, count in zip(*columns)
+        ]
+
+    def entry(self, index: int) -> ArchivedEntry:
+        columns = self.columns
+        notes_len = int(columns["notes_len"][index])
+        notes = None
+        if notes_len >= 0:
+            notes_start = int(columns["notes_start"][index])
+            notes = bytes(self._notes[notes_start:notes_start + notes_len]).decode("utf-8")
+        return ArchivedEntry(
+            int(columns["id"][index]),
+            date.fromordinal(int(columns["day"][index])),
+            _datetime(columns["created_at"][index]),
+            self.types[columns["type"][index]],
+            int(columns["score"][index]),
+            notes,
+            int(columns["version"][index]) if "version" in columns else 0
+        )
+
+    def _indexes(self, rows: slice, mood_type: Optional[str]) -> np.ndarray:
+        indexes = np.arange(*rows.indices(self.rows))
+        if mood_type is None: return indexes
+        if mood_type not in self.types: return indexes[:0]
+        return indexes[self.columns["type"][indexes] == self.types.index(mood_type)]
+
+    def entries(self, rows: slice = slice(None), mood_type: Optional[str] = None, order: Optional[str] = None) -> Iterator[ArchivedEntry]:
+        """
+        Записи среза rows: по дню и id или в порядке order ("id", "created_at")
+
+        Фильтр по типу и сортировка - по массивам; в объекты превращаются
+        только отданные строки.
+        """
+        indexes = self._indexes(rows, mood_type)
+        if order is not None:
+            indexes = indexes[np.argsort(self.columns[order][indexes], kind="stable")]
+        for index in indexes.tolist():
+            yield self.entry(index)
+
+    def newest(self, rows: slice, mood_type: Optional[str], before: Optional[Tuple[datetime, int]], limit: int) -> List[ArchivedEntry]:
+        """Не больше limit записей среза по убыванию (created_at, id), строго раньше before"""
+        indexes = self._indexes(rows, mood_type)
+        created_at, ids = self.columns["created_at"][indexes], self.columns["id"][indexes]
+        if before is not None:
+            timestamp, mood_id = _timestamp(before[0]), before[1]
+            keep = (created_at < timestamp) | ((created_at == timestamp) & (ids < mood_id))
+            indexes, created_at, ids = indexes[keep], created_at[keep], ids[keep]
+        newest = np.lexsort((ids, created_at))[::-1][:limit]
+        return [self.entry(index) for index in indexes[newest].tolist()]
+
+    def changed_after(self, since: int, after_id: Optional[int], current: int, limit: int) -> List[ArchivedEntry]:
+        """
+        Не больше limit записей с (version, id) после курсора и version <= current,
+        по возрастанию (version, id); since=0 без after_id - все записи
+        """
+        versions = self.columns.get("version", np.zeros(self.rows, dtype=np.int64))
+        ids = self.columns["id"]
+        keep = versions <= current
+        if since or after_id is not None:
+            keep &= (versions > since) if after_id is None else (versions > since) | ((versions == since) & (ids > after_id))
+        indexes = np.flatnonzero(keep)
+        first = np.lexsort((ids[indexes], versions[indexes]))[:limit]
+        return [self.entry(index) for index in indexes[first].tolist()]
+
+    def find(self, mood_id: int) -> Optional[ArchivedEntry]:
+        hits = np.flatnonzero(self.columns["id"] == mood_id)
+        return self.entry(int(hits[0])) if len(hits) else None
+
+    def close(self) -> None:
+        """Закрыть mmap (только если массивы сегмента больше нигде не используются)"""
+        self.columns = {}
+        self._map.close()
+        if isinstance(self._notes, mmap.mmap): self._notes.close()
+
+
+def write_segment(directory: str, month: date, entries: Sequence) -> str:
+    """
+    Записать сегмент месяца из записей (id, date, created_at, mood_type, mood_score, notes)
+
+    Сначала файл заметок с новой меткой, затем сегмент через временный
+    файл и os.replace; заметки прошлой версии сегмента удаляются после.
+    Возвращает путь сегмента.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = month.strftime("%Y-%m")
+    entries = sorted(entries, key=lambda entry: (entry.date, entry.id))
+    types = sorted({entry.mood_type for entry in entries})
+    type_codes = {mood_type: code for code, mood_type in enumerate(types)}
+
+    notes_name = f"{name}.{secrets.token_hex(4)}.notes"
+    notes_start, notes_len = [], []
+    with open(os.path.join(directory, notes_name), "wb") as notes_file:
+        position = 0
+        for entry in entries:
+            data = entry.notes.encode("utf-8") if entry.notes is not None else b""
+            notes_start.append(position)
+            notes_len.append(len(data) if entry.notes is not None else -1)
+            notes_file.write(data)
+            position += len(data)
+        notes_file.flush()
+        os.fsync(notes_file.fileno())
+
+    arrays = {
+        "id": [entry.id for entry in entries],
+        "day": [entry.date.toordinal() for entry in entries],
+        "created_at": [_timestamp(entry.created_at) for entry in entries],
+        "score": [entry.mood_score for entry in entries],
+        "type": [type_codes[entry.mood_type] for entry in entries],
+        "notes_start": notes_start,
+        "notes_len": notes_len,
+        "version": [entry.version for entry in entries],
+    }
+    arrays = {name: np.array(values, dtype=ROW_COLUMNS[name]) for name, values in arrays.items()}
+    # Агрегаты по (день, тип, оценка) - как строки mood_daily_rollup
+    keys, counts = np.unique(
+        np.stack([arrays["day"].astype(np.int64), arrays["type"], arrays["score"]]), axis=1, return_counts=True
+    ) if entries else (np.empty((3, 0), dtype=np.int64), np.empty(0, dtype=np.int64))
+    arrays.update({
+        "daily_day": keys[0].astype(DAILY_COLUMNS["daily_day"]),
+        "daily_type": keys[1].astype(DAILY_COLUMNS["daily_type"]),
+        "daily_score": keys[2].astype(DAILY_COLUMNS["daily_score"]),
+        "daily_count": counts.astype(DAILY_COLUMNS["daily_count"]),
+    })
+
+    header = {
+        "format": FORMAT_VERSION,
+        "month": name,
+        "rows": len(entries),
+        "types": types,
+        "notes": notes_name,
+        "columns": {},
+    }
+    # Смещения колонок зависят от длины заголовка: считаем с запасом
+    # под сами смещения, затем выравниваем
+    layout_start = len(MAGIC) + 4 + len(json.dumps(header)) + 64 * len(arrays) + 64
+    offset = -(-layout_start // 8) * 8
+    for column, array in arrays.items():
+        header["columns"][column] = [array.dtype.str, offset, len(array)]
+        offset += -(-array.nbytes // 8) * 8
+    header_bytes = json.dumps(header).encode("utf-8")
+    if len(MAGIC) + 4 + len(header_bytes) > header["columns"]["id"][1]:
+        raise ValueError("Segment header does not fit before the columns")
+
+    path = os.path.join(directory, f"{name}.seg")
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for column, array in arrays.items():
+            file.seek(header["columns"][column][1])
+            file.write(array.tobytes())
+        file.truncate(offset)
+        file.flush()
+        os.fsync(file.fileno())
+    previous_notes = _notes_name(path)
+    os.replace(temporary, path)
+    if previous_notes and previous_notes != notes_name:
+        # Открытые у читателей заметки (mmap) остаются доступны и после удаления
+        os.remove(os.path.join(directory, previous_notes))
+    return path
+
+
+def _notes_name(path: str) -> Optional[str]:
+    try:
+        segment = Segment(path)
+    except FileNotFoundError:
+        return None
+    try:
+        return segment.header["notes"]
+    finally:
+        segment.close()
+
+
+def read_segment_entries(path: str) -> List[ArchivedEntry]:
+    """Все записи сегмента (для его перезаписи)"""
+    segment = Segment(path)
+    try:
+        return list(segment.entries())
+    finally:
+        segment.close()
+
+
+class ArchiveStore:
+    """
+    Сегменты пользователей, открытые по требованию
+
+    Список сегментов пользователя перечитывается, только когда меняется
+    mtime его каталога (archive пишет сегменты через os.replace),
+    поэтому запрос без архива стоит один stat(). Замененные сегменты не
+    закрываются явно: их массивы могут еще читаться в других потоках,
+    mmap закроется вместе с последней ссылкой.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self._users: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def user_directory(self, user_id: str) -> str:
+        from app.tenancy import validate_user_id
+        return os.path.join(self.directory, validate_user_id(user_id))
+
+    def segments(self, user_id: str, start: Optional[date] = None, end: Optional[date] = None) -> List[Segment]:
+        """Сегменты пользователя, пересекающие [start, end], по возрастанию месяца"""
+        directory = self.user_directory(user_id)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, self._load(directory, cached[1] if cached else {}))
+                self._users[user_id] = cached
+                SEGMENTS_OPEN.set(sum(len(months) for _, months in self._users.values()))
+            months = cached[1]
+        return [
+            segment for month, (_, segment) in sorted(months.items())
+            if (start is None or next_month(month) > start) and (end is None or month <= end)
+        ]
+
+    def _load(self, directory: str, previous: Dict[date, tuple]) -> Dict[date, tuple]:
+        # Неизмененные файлы (тот же inode) переиспользуются
+        months = {}
+        for name in os.listdir(directory):
+            if not name.endswith(".seg"): continue
+            path = os.path.join(directory, name)
+            inode = os.stat(path).st_ino
+            month = date.fromisoformat(name[:-len(".seg")] + "-01")
+            old = previous.get(month)
+            months[month] = old if old and old[0] == inode else (inode, Segment(path))
+        return months
+
+    def rollup(self, user_id: str, start: date, end: date) -> List[RollupRow]:
+        """Агрегаты архивных дней периода по возрастанию дня"""
+        return [row for segment in self.segments(user_id, start, end) for row in segment.rollup(start, end)]
+
+    def entries(self, user_id: str, start: Optional[date] = None, end: Optional[date] = None, mood_type: Optional[str] = None, order: Optional[str] = None) -> Iterator[ArchivedEntry]:
+        """
+        Архивные записи периода по дню и id или по order (id, created_at)
+
+        Записи читаются лениво; месяцы с order сливаются heapq.merge, чтобы
+        их можно было так же слить с выборкой из базы (ключ - order_key).
+        """
+        streams = [
+            segment.entries(segment.rows_between(start, end), mood_type, order)
+            for segment in self.segments(user_id, start, end)
+        ]
+        if order is None: return itertools.chain.from_iterable(streams)
+        return heapq.merge(*streams, key=order_key(order))
+
+    def newest(self, user_id: str, day: Optional[date], mood_type: Optional[str], before: Optional[Tuple[datetime, int]], limit: int) -> List[ArchivedEntry]:
+        """Не больше limit архивных записей (за день day) по убыванию (created_at, id), строго раньше before"""
+        found = [
+            entry for segment in self.segments(user_id, day, day)
+            for entry in segment.newest(segment.rows_between(day, day), mood_type, before, limit)
+        ]
+        found.sort(key=lambda entry: (_timestamp(entry.created_at), entry.id), reverse=True)
+        return found[:limit]
+
+    def changed_after(self, user_id: str, since: int, after_id: Optional[int], current: int, limit: int) -> List[ArchivedEntry]:
+        """Не больше limit архивных записей после курсора синхронизации, по возрастанию (version, id)"""
+        found = [entry for segment in self.segments(user_id) for entry in segment.changed_after(since, after_id, current, limit)]
+        found.sort(key=lambda entry: (entry.version, entry.id))
+        return found[:limit]
+
+    def find(self, user_id: str, mood_id: int) -> Optional[ArchivedEntry]:
+        """Архивная запись по id (None, если ее нет в архиве)"""
+        for segment in self.segments(user_id):
+            entry = segment.find(mood_id)
+            if entry is not None: return entry
+        return None
+
+    def hour_totals(self, user_id: str, start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+        """(число записей, сумма оценок) по часу created_at - массивы на 24 часа"""
+        counts = np.zeros(24, dtype=np.int64)
+        sums = np.zeros(24, dtype=np.int64)
+        for segment in self.segments(user_id, start, end):
+            rows = segment.rows_between(start, end)
+            created_at = segment.columns["created_at"][rows]
+            known = created_at != NO_TIMESTAMP
+            hours = (created_at[known] // 3_600_000_000) % 24
+            counts += np.bincount(hours, minlength=24)
+            sums += np.bincount(hours, weights=segment.columns["score"][rows][known], minlength=24).astype(np.int64)
+        return counts, sums
+
+    def reset(self) -> None:
+        with self._lock:
+            self._users = {}
+            SEGMENTS_OPEN.set(0)
+
+
+archive_store = ArchiveStore()
@@ -0,0 +1,158 @@
+# app/cache.py - кэш ответов календаря и статистики
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Awaitable, Callable, Hashable, NamedTuple, Optional
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+
+from app.single_flight import SingleFlightTimeout, async_single_flight, single_flight
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    start_date: date
+    end_date: date
+    user_id: Optional[str] = None
+
+
+class ResponseCache:
+    """
+    LRU-кэш готовых JSON-ответов в памяти процесса.
+
+    Каждый ответ помнит пользователя и диапазон дат, из которых он посчитан,
+    поэтому запись за конкретный день сбрасывает только ответы этого
+    пользователя, покрывающие этот день.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.version = 0  # растет при каждой инвалидации
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, payload, start_date: date, end_date: date, version: int, user_id: Optional[str] = None) -> CachedResponse:
+        body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode()
+        entry = CachedResponse(body, f'"{hashlib.sha1(body).hexdigest()}"', start_date, end_date, user_id)
+        with self._lock:
+            # Пока считали ответ, данные могли поменяться - такой ответ не кэшируем
+            if self.max_entries > 0 and version == self.version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate_day(self, day: date, user_id: Optional[str] = None) -> None:
+        """Сбросить все ответы (пользователя user_id), диапазон которых содержит day"""
+        self.invalidate_range(day, day, user_id)
+
+    def invalidate_range(self, start_date: Optional[date], end_date: Optional[date], user_id: Optional[str] = None) -> None:
+        """
+        Сбросить ответы, пересекающиеся с [start_date, end_date] (None - без границы).
+        Без user_id - ответы всех пользователей.
+        """
+        start_date = start_date or date.min
+        end_date = end_date or date.max
+        with self._lock:
+            self.version += 1
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry.start_date <= end_date and start_date <= entry.end_date
+                and (user_id is None or entry.user_id is None or entry.user_id == user_id)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+response_cache = ResponseCache(int(os.getenv("RESPONSE_CACHE_SIZE", "256")))
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _etag_response(request: Request, entry: CachedResponse) -> Response:
+    # no-cache: браузер хранит ответ, но каждый раз сверяет ETag с сервером
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def _timeout_error(exc: SingleFlightTimeout) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(exc))
+
+
+def cached_json_response(
+    request: Request, key: Hashable, start_date: date, end_date: date,
+    compute: Callable[[], dict], timeout: Optional[float] = None, user_id: Optional[str] = None
+) -> Response:
+    """
+    Отдать JSON из кэша (или посчитать и положить в кэш) с ETag.
+
+    key должен включать user_id: ответы разных пользователей не смешиваются,
+    а запись пользователя сбрасывает только его ответы.
+
+    Одинаковые одновременные промахи считаются один раз (single-flight):
+    остальные ждут результат не дольше timeout секунд, потом 504.
+    Если клиент прислал совпадающий If-None-Match - 304 без тела.
+
+    compute читает основную базу (get_user_db), не реплику: версия кэша
+    растет при записи на основной, и отставший ответ реплики лег бы в кэш
+    под новой версией до следующей записи.
+    """
+    entry = response_cache.get(key)
+    if entry is None:
+        # Версия в ключе: после записи запрос не присоединится к старому вычислению
+        version = response_cache.version
+        try:
+            entry = single_flight.do(
+                (key, version), lambda: response_cache.put(key, compute(), start_date, end_date, version, user_id), timeout
+            )
+        except SingleFlightTimeout as exc:
+            raise _timeout_error(exc)
+    return _etag_response(request, entry)
+
+
+async def cached_json_response_async(
+    request: Request, key: Hashable, start_date: date, end_date: date,
+    compute: Callable[[], Awaitable[dict]], timeout: Optional[float] = None, user_id: Optional[str] = None
+) -> Response:
+    """То же, что cached_json_response, для async-эндпоинтов"""
+    entry = response_cache.get(key)
+    if entry is None:
+        version = response_cache.version
+
+        async def compute_entry() -> CachedResponse:
+            return response_cache.put(key, await compute(), start_date, end_date, version, user_id)
+
+        try:
+            entry = await async_single_flight.do((key, version), compute_entry, timeout)
+        except SingleFlightTimeout as exc:
+            raise _timeout_error(exc)
+    return _etag_response(request, entry)
@@ -1,8 +1,13 @@
 from .mood import (
     create_mood_entry,
+    create_mood_entries_bulk,
+    MoodBulkInsert,
     get_mood_entries,
+    get_mood_entries_page,
     get_mood_entry_by_id, 
     update_mood_entry,
     delete_mood_entry,
+    delete_mood_entries,
+    retag_mood_entries,
     get_mood_statistics
 )
\ No newline at end of file
@@ -0,0 +1,182 @@
+# app/crud/analytics.py - аналитика временных рядов настроения на NumPy
+#
+# Данные читаются колонками двумя группирующими запросами (дневные агрегаты
+# из mood_daily_rollup и профиль по часам из mood_entries) плюс массивы
+# архивных сегментов, дальше все считается векторно по массивам - без
+# циклов по ORM-объектам.
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from typing import List, Optional, Sequence, Tuple
+from datetime import date
+import numpy as np
+
+from app.models.mood import DEFAULT_USER_ID, MoodEntry, MoodDailyRollup
+from app.admission import over_row_budget
+from app.archive import archive_store
+
+MOVING_AVERAGE_WINDOWS = (7, 30, 90)
+GOOD_MOOD_SCORE = 4  # день с такой средней оценкой и выше считается хорошим
+ANALYTICS_MAX_DAYS = 366 * 30
+WEEKDAYS_RU = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+
+def load_daily_arrays(db: Session, start_date: date, end_date: date, user_id: str = DEFAULT_USER_ID) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Колонки агрегатов за период: (смещение дня от start_date, тип, оценка, число записей)"""
+    rows = db.execute(
+        select(MoodDailyRollup.day, MoodDailyRollup.mood_type, MoodDailyRollup.mood_score, MoodDailyRollup.entries_count)
+        .where(MoodDailyRollup.user_id == user_id, MoodDailyRollup.day.between(start_date, end_date))
+    ).all()
+    rows += [row[:4] for row in archive_store.rollup(user_id, start_date, end_date)]
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.empty(0, dtype=object), empty, empty
+    days, types, scores, counts = zip(*rows)
+    origin = start_date.toordinal()
+    offsets = np.fromiter((day.toordinal() - origin for day in days), dtype=np.int64, count=len(days))
+    return offsets, np.array(types, dtype=object), np.array(scores, dtype=np.int64), np.array(counts, dtype=np.int64)
+
+
+def load_hourly_arrays(db: Session, start_date: date, end_date: date, user_id: str = DEFAULT_USER_ID) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Колонки (час created_at, число записей, сумма оценок) - один GROUP BY по часу (и 24 часа архива)"""
+    hour = func.extract("hour", MoodEntry.created_at)
+    rows = db.execute(
+        select(hour, func.count(MoodEntry.id), func.sum(MoodEntry.mood_score))
+        .where(MoodEntry.user_id == user_id, MoodEntry.date.between(start_date, end_date), MoodEntry.created_at.is_not(None))
+        .group_by(hour)
+    ).all()
+    archived_counts, archived_sums = archive_store.hour_totals(user_id, start_date, end_date)
+    if archived_counts.any():
+        rows += zip(range(24), archived_counts.tolist(), archived_sums.tolist())
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    hours, counts, sums = (np.array(column, dtype=np.int64) for column in zip(*rows))
+    return hours, counts, sums
+
+
+def _to_list(values: np.ndarray, digits: int = 2) -> List[Optional[float]]:
+    """Массив в JSON-список: NaN (нет данных) -> None"""
+    rounded = np.round(values, digits)
+    return [None if value != value else value for value in rounded.tolist()]
+
+
+def _averages(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def moving_averages(daily_sums: np.ndarray, daily_counts: np.ndarray, windows: Sequence[int] = MOVING_AVERAGE_WINDOWS) -> dict:
+    """Скользящие средние оценки (по записям, а не по дням) через кумулятивные суммы"""
+    sums = np.concatenate(([0], np.cumsum(daily_sums)))
+    counts = np.concatenate(([0], np.cumsum(daily_counts)))
+    result = {}
+    for window in windows:
+        lagged = np.maximum(np.arange(1, len(sums)) - window, 0)
+        result[f"ma_{window}"] = _averages(sums[1:] - sums[lagged], counts[1:] - counts[lagged])
+    return result
+
+
+def streaks(mask: np.ndarray) -> Tuple[int, int]:
+    """Самая длинная и текущая (до последнего дня) серия True подряд"""
+    if not mask.any():
+        return 0, 0
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    current = int(lengths[-1]) if ends[-1] == len(mask) else 0
+    return int(lengths.max()), current
+
+
+def trend(daily_averages: np.ndarray, daily_counts: np.ndarray) -> Optional[dict]:
+    """Наклон линейного тренда средней оценки (МНК с весом по числу записей дня)"""
+    has_data = daily_counts > 0
+    if np.count_nonzero(has_data) < 2:
+        return None
+    x = np.flatnonzero(has_data)
+    slope, intercept = np.polyfit(x, daily_averages[has_data], 1, w=np.sqrt(daily_counts[has_data]))
+    return {
+        "slope_per_day": round(float(slope), 5),
+        "slope_per_month": round(float(slope) * 30, 3),
+        "direction": "up" if slope * 30 > 0.05 else "down" if slope * 30 < -0.05 else "flat"
+    }
+
+
+def get_mood_analytics(db: Session, start_date: date, end_date: date, user_id: str = DEFAULT_USER_ID, row_budget: Optional[int] = None) -> dict:
+    """
+    Аналитика за период [start_date, end_date]
+
+    Возвращает:
+    {
+        "start_date": "2015-01-01", "end_date": "2024-12-31", "days": 3653,
+        "total_entries": 12000, "average_score": 3.4,
+        "series": {"daily_average": [...], "ma_7": [...], "ma_30": [...], "ma_90": [...]},
+        "weekday_profile": [{"weekday": 0, "name": "Пн", "average_score": 3.1, "entries_count": 1700}, ...],
+        "hour_profile": [{"hour": 0, "average_score": null, "entries_count": 0}, ...],
+        "mood_types": {"happy": {"entries_count": 3000, "average_score": 4.5}, ...},
+        "streaks": {"longest": 40, "current": 3, "longest_good": 9, "current_good": 0},
+        "trend": {"slope_per_day": 0.0001, "slope_per_month": 0.003, "direction": "flat"}
+    }
+    Ряды series идут по дням от start_date, null - день без записей.
+    Профиль по часам читает сами записи: если их больше row_budget,
+    hour_profile = null и degraded = ["hour_profile"].
+    """
+    days = (end_date - start_date).days + 1
+    offsets, types, scores, counts = load_daily_arrays(db, start_date, end_date, user_id)
+
+    # Дневные ряды: bincount по смещению дня вместо цикла по календарю
+    daily_counts = np.bincount(offsets, weights=counts, minlength=days)
+    daily_sums = np.bincount(offsets, weights=counts * scores, minlength=days)
+    daily_averages = _averages(daily_sums, daily_counts)
+
+    # Профиль по дням недели
+    weekdays = (np.arange(days) + start_date.weekday()) % 7
+    weekday_counts = np.bincount(weekdays, weights=daily_counts, minlength=7)
+    weekday_averages = _averages(np.bincount(weekdays, weights=daily_sums, minlength=7), weekday_counts)
+
+    # Профиль по часам (единственная часть, которая сканирует mood_entries)
+    total_entries = int(daily_counts.sum())
+    hour_profile = None
+    if not over_row_budget(total_entries, row_budget, "hour_profile"):
+        hours, hour_counts, hour_sums = load_hourly_arrays(db, start_date, end_date, user_id)
+        hour_counts = np.bincount(hours, weights=hour_counts, minlength=24)
+        hour_averages = _averages(np.bincount(hours, weights=hour_sums, minlength=24), hour_counts)
+        hour_profile = [
+            {"hour": hour, "average_score": average, "entries_count": int(count)}
+            for hour, (average, count) in enumerate(zip(_to_list(hour_averages), hour_counts))
+        ]
+
+    # Типы настроения
+    type_names, type_index = np.unique(types.astype(str), return_inverse=True)
+    type_counts = np.bincount(type_index, weights=counts, minlength=len(type_names))
+    type_averages = _averages(np.bincount(type_index, weights=counts * scores, minlength=len(type_names)), type_counts)
+
+    longest, current = streaks(daily_counts > 0)
+    longest_good, current_good = streaks(np.nan_to_num(daily_averages) >= GOOD_MOOD_SCORE)
+
+    analytics = {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "days": days,
+        "total_entries": total_entries,
+        "average_score": round(float(daily_sums.sum() / total_entries), 2) if total_entries else 0,
+        "series": {
+            "daily_average": _to_list(daily_averages),
+            **{name: _to_list(values) for name, values in moving_averages(daily_sums, daily_counts).items()}
+        },
+        "weekday_profile": [
+            {"weekday": weekday, "name": WEEKDAYS_RU[weekday], "average_score": average, "entries_count": int(count)}
+            for weekday, (average, count) in enumerate(zip(_to_list(weekday_averages), weekday_counts))
+        ],
+        "hour_profile": hour_profile,
+        "mood_types": {
+            name: {"entries_count": int(count), "average_score": average}
+            for name, count, average in zip(type_names.tolist(), type_counts, _to_list(type_averages))
+        },
+        "streaks": {"longest": longest, "current": current, "longest_good": longest_good, "current_good": current_good},
+        "trend": trend(daily_averages, daily_counts)
+    }
+    if hour_profile is None: analytics["degraded"] = ["hour_profile"]
+    return analytics
+
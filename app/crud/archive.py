@@ -0,0 +1,98 @@
+# app/crud/archive.py - перенос закрытых месяцев из mood_entries в архив
+#
+# Формат сегментов и чтение - app/archive.py. Месяц переносится целиком:
+# DELETE ... RETURNING забирает его записи (конкурентная правка не потеряется
+# между чтением и удалением), сегмент пишется поверх прежнего (с прежними
+# записями месяца), агрегаты месяца уходят из mood_daily_rollup, и только
+# после этого транзакция коммитится.
+#
+# Сбой между заменой сегмента и коммитом оставит записи и в архиве, и в
+# таблице; следующий запуск перенесет их снова, а при перезаписи сегмента
+# записи с одинаковым id не дублируются. Запись с тем же id, но другим
+# created_at - это переиспользованный id, а не повтор: archive_month
+# отказывается (ArchiveIdCollision), а не перезаписывает архивную запись.
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.archive import ArchivedEntry, archive_store, month_start, next_month, read_segment_entries, write_segment
+from app.crud.rollup import refresh_daily_rollup
+from app.models.mood import MoodEntry
+
+
+class ArchiveIdCollision(Exception):
+    """id переносимой записи уже занят другой записью в архиве"""
+
+
+def _collisions(user_id: str, month: date, moved: List, existing: Dict[int, ArchivedEntry]) -> List[int]:
+    """id перенесенных записей, которые в архиве принадлежат другим записям"""
+    ids = np.array([row.id for row in moved], dtype=np.int64)
+    clashes = {row.id for row in moved if row.id in existing and existing[row.id].created_at != row.created_at}
+    for segment in archive_store.segments(user_id):
+        if segment.month == month: continue
+        clashes.update(ids[np.isin(ids, segment.columns["id"])].tolist())
+    return sorted(clashes)
+
+
+def months_to_archive(db: Session, before: date) -> List[Tuple[str, date]]:
+    """(user_id, первый день месяца) с записями раньше before"""
+    days = db.execute(
+        select(MoodEntry.user_id, MoodEntry.date).where(MoodEntry.date < before).group_by(MoodEntry.user_id, MoodEntry.date)
+    ).all()
+    return sorted({(user_id, month_start(day)) for user_id, day in days})
+
+
+def archive_month(db: Session, user_id: str, month: date) -> int:
+    """
+    Перенести записи месяца пользователя в его сегмент; возвращает число перенесенных записей
+
+    Если id какой-то записи уже занят в архиве другой записью -
+    ArchiveIdCollision, транзакция откатывается, сегмент не меняется.
+    """
+    month_end = next_month(month)
+    moved = db.execute(
+        delete(MoodEntry).where(
+            MoodEntry.user_id == user_id, MoodEntry.date >= month, MoodEntry.date < month_end
+        ).returning(
+            MoodEntry.id, MoodEntry.date, MoodEntry.created_at, MoodEntry.mood_type, MoodEntry.mood_score, MoodEntry.notes, MoodEntry.version
+        )
+    ).all()
+    if not moved:
+        db.rollback()
+        return 0
+
+    directory = archive_store.user_directory(user_id)
+    path = os.path.join(directory, f"{month.strftime('%Y-%m')}.seg")
+    entries = {entry.id: entry for entry in (read_segment_entries(path) if os.path.exists(path) else [])}
+    clashes = _collisions(user_id, month, moved, entries)
+    if clashes:
+        db.rollback()
+        raise ArchiveIdCollision(f"{user_id} {month:%Y-%m}: ids {clashes[:10]} already belong to other archived entries")
+    entries.update((row.id, ArchivedEntry(*row)) for row in moved)
+
+    refresh_daily_rollup(db, month, month_end - timedelta(days=1), user_id)
+    try:
+        write_segment(directory, month, list(entries.values()))
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+    return len(moved)
+
+
+def archive_closed_months(db: Session, before: date) -> Tuple[int, int]:
+    """
+    Перенести в архив все месяцы раньше before (первое число месяца)
+
+    Каждый месяц - отдельная транзакция. Возвращает (месяцев, записей).
+    """
+    months = moved = 0
+    for user_id, month in months_to_archive(db, month_start(before)):
+        count = archive_month(db, user_id, month)
+        months += bool(count)
+        moved += count
+    return months, moved
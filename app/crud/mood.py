@@ -1,96 +1,461 @@
+import base64
+import binascii
+import heapq
+import itertools
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List, Optional
-from datetime import datetime, date
-from app.models.mood import MoodEntry
-from app.schemas.mood import MoodCreate, MoodUpdate
+from sqlalchemy import Row, delete, desc, func, insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Iterator, List, Optional, Tuple
+from datetime import datetime, date, timedelta
+from collections import Counter
+from app.models.mood import DEFAULT_USER_ID, MoodEntry, MoodDailyRollup
+from app.schemas.mood import MoodCreate, MoodBulkItem, MoodUpdate, MoodResponse
+from app.crud.rollup import apply_rollup_changes, apply_rollup_delta, apply_rollup_deltas, get_daily_rollup, get_daily_totals
+from app.crud.sync import add_tombstones, add_tombstones_from_select, next_change_version
+from app.cache import response_cache
+from app.events import publish_mood_change, publish_reload
+from app.admission import over_row_budget
+from app.archive import ArchivedEntry, ArchivedReadOnly, archive_store, order_key
 
-def create_mood_entry(db: Session, mood: MoodCreate) -> MoodEntry:
+def create_mood_entry(db: Session, mood: MoodCreate, user_id: str = DEFAULT_USER_ID) -> MoodEntry:
     db_mood = MoodEntry(
+        user_id=user_id,
+        version=next_change_version(db, user_id),
         mood_type=mood.mood_type,
         mood_score=mood.mood_score,
         notes=mood.notes,
         date=datetime.now().date()
     )
     db.add(db_mood)
+    apply_rollup_delta(db, db_mood.date, db_mood.mood_type, db_mood.mood_score, +1, user_id)
     db.commit()
+    response_cache.invalidate_day(db_mood.date, user_id)
     db.refresh(db_mood)
+    publish_mood_change(db, "created", [db_mood.date], user_id, [event_entry(db_mood)])
     return db_mood
 
-def get_mood_entries(db: Session, skip: int = 0, limit: int = 100, date_filter: Optional[date] = None, mood_type_filter: Optional[str] = None) -> List[MoodEntry]:
-    query = db.query(MoodEntry)
+def event_entry(entry: MoodEntry) -> dict:
+    """Запись для события SSE (как в ответе API)"""
+    return MoodResponse.model_validate(entry).model_dump()
+
+BULK_CHUNK_SIZE = 500
+
+class MoodBulkInsert:
+    """
+    Массовая вставка записей одной транзакцией, чанками по мере поступления
+
+    add() копит пары (индекс во входных данных, запись), flush() вставляет
+    накопленное многострочным INSERT; если чанк отвергнут базой, он
+    повторяется построчно, чтобы пропустить только плохие строки. Версия
+    изменений (и блокировка записи SQLite) берется на первом чанке.
+    finish() коммитит и возвращает число вставленных записей и ошибки по
+    индексам, abort() откатывает уже вставленное.
+    """
+
+    def __init__(self, db: Session, chunk_size: Optional[int] = None, user_id: str = DEFAULT_USER_ID):
+        self.db = db
+        self.chunk_size = chunk_size or BULK_CHUNK_SIZE
+        self.user_id = user_id
+        self.now = datetime.now()
+        self.version = None
+        self.pending: List[Tuple[int, MoodBulkItem]] = []
+        self.rollup_deltas = Counter()
+        self.errors: List[dict] = []
+        self.inserted = 0
+
+    @property
+    def full(self) -> bool:
+        return len(self.pending) >= self.chunk_size
+
+    def add(self, index: int, item: MoodBulkItem) -> None:
+        self.pending.append((index, item))
+
+    def flush(self) -> None:
+        """Вставить накопленный чанк (в открытой транзакции)"""
+        chunk, self.pending = self.pending, []
+        if not chunk: return
+        if self.version is None: self.version = next_change_version(self.db, self.user_id)
+        rows = [
+            {
+                "user_id": self.user_id,
+                "mood_type": item.mood_type,
+                "mood_score": item.mood_score,
+                "notes": item.notes,
+                "date": item.date,
+                "created_at": item.created_at or self.now,
+                "version": self.version
+            }
+            for _, item in chunk
+        ]
+        try:
+            with self.db.begin_nested():
+                self.db.execute(insert(MoodEntry).values(rows))
+            accepted = rows
+        except SQLAlchemyError:
+            accepted = []
+            for (index, _), row in zip(chunk, rows):
+                try:
+                    with self.db.begin_nested():
+                        self.db.execute(insert(MoodEntry).values(row))
+                    accepted.append(row)
+                except SQLAlchemyError as exc:
+                    self.errors.append({"index": index, "errors": [str(getattr(exc, "orig", None) or exc)]})
+
+        for row in accepted:
+            self.rollup_deltas[(self.user_id, row["date"], row["mood_type"], row["mood_score"])] += 1
+        self.inserted += len(accepted)
+
+    def finish(self) -> Tuple[int, List[dict]]:
+        self.flush()
+        apply_rollup_deltas(self.db, self.rollup_deltas)
+        self.db.commit()
+
+        days = {day for _, day, _, _ in self.rollup_deltas}
+        for day in days:
+            response_cache.invalidate_day(day, self.user_id)
+        if days: publish_reload(self.user_id, min(days), max(days))
+        return self.inserted, self.errors
+
+    def abort(self) -> None:
+        self.pending = []
+        self.db.rollback()
+
+def create_mood_entries_bulk(db: Session, items: List[Tuple[int, MoodBulkItem]], chunk_size: int = BULK_CHUNK_SIZE, user_id: str = DEFAULT_USER_ID) -> Tuple[int, List[dict]]:
+    """Массовая вставка готового списка пар (индекс, запись) одной транзакцией (см. MoodBulkInsert)"""
+    bulk = MoodBulkInsert(db, chunk_size, user_id)
+    try:
+        for index, item in items:
+            bulk.add(index, item)
+            if bulk.full: bulk.flush()
+        return bulk.finish()
+    except BaseException:
+        bulk.abort()
+        raise
+
+def encode_cursor(entry: MoodEntry) -> str:
+    """Непрозрачный курсор по ключу сортировки списка (created_at, id); created_at = NULL - пустая строка"""
+    created_at = entry.created_at.isoformat() if entry.created_at else ""
+    raw = f"{created_at}|{entry.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Разобрать курсор; ValueError, если он поврежден"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, mood_id = raw.rsplit("|", 1)
+        return (datetime.fromisoformat(created_at) if created_at else None), int(mood_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+def _archived_model(entry: ArchivedEntry, user_id: str) -> MoodEntry:
+    """Архивная запись как несохраняемый MoodEntry (для ответов API)"""
+    return MoodEntry(
+        id=entry.id, user_id=user_id, version=entry.version, date=entry.date, created_at=entry.created_at,
+        mood_type=entry.mood_type, mood_score=entry.mood_score, notes=entry.notes
+    )
+
+def get_mood_entries(db: Session, skip: int = 0, limit: int = 100, date_filter: Optional[date] = None, mood_type_filter: Optional[str] = None, cursor: Optional[str] = None, user_id: str = DEFAULT_USER_ID) -> List[MoodEntry]:
+    """
+    Записи по убыванию (created_at, id): skip/limit или keyset по курсору
+
+    Архивные записи вливаются в ту же сортировку: из базы и из архива
+    берется по skip + limit первых, страница вырезается из слияния.
+    """
+    query = db.query(MoodEntry).filter(MoodEntry.user_id == user_id)
     if date_filter: query = query.filter(MoodEntry.date == date_filter)
     if mood_type_filter: query = query.filter(MoodEntry.mood_type == mood_type_filter)
-    query = query.order_by(desc(MoodEntry.created_at))
-    return query.offset(skip).limit(limit).all()
-
-def get_mood_entry_by_id(db: Session, mood_id: int) -> Optional[MoodEntry]:
-    return db.query(MoodEntry).filter(MoodEntry.id == mood_id).first()
-
-def update_mood_entry(db: Session, mood_id: int, mood_update: MoodUpdate) -> Optional[MoodEntry]:
-    db_mood = get_mood_entry_by_id(db, mood_id)
-    if not db_mood: return None
-    update_data = mood_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        if value is not None: setattr(db_mood, field, value)
+    query = query.order_by(desc(MoodEntry.created_at), desc(MoodEntry.id))
+    before = None
+    if cursor:
+        before = decode_cursor(cursor)
+        skip = 0
+    archived = archive_store.newest(user_id, date_filter, mood_type_filter, before, skip + limit)
+    if not archived: return _entries_after(query, before, skip, limit)
+    merged = heapq.merge(
+        _entries_after(query, before, 0, skip + limit), [_archived_model(entry, user_id) for entry in archived],
+        key=lambda entry: (entry.created_at or datetime.min, entry.id), reverse=True
+    )
+    return list(itertools.islice(merged, skip, skip + limit))
+
+def _entries_after(query, before: Optional[Tuple[Optional[datetime], int]], skip: int, limit: int) -> List[MoodEntry]:
+    """
+    Строки query (по убыванию created_at, id) строго после ключа before
+
+    Записи без created_at идут последними (NULL меньше любого значения):
+    сравнение кортежей с NULL не работает, поэтому они дочитываются
+    отдельным запросом, когда строки с временем кончились.
+    """
+    if before is None: return query.offset(skip).limit(limit).all()
+    created_at, mood_id = before
+    if created_at is None:
+        return query.filter(MoodEntry.created_at.is_(None), MoodEntry.id < mood_id).limit(limit).all()
+    # Keyset: продолжаем строго после последней записи прошлой страницы
+    rows = query.filter(tuple_(MoodEntry.created_at, MoodEntry.id) < tuple_(created_at, mood_id)).limit(limit).all()
+    if len(rows) < limit:
+        rows += query.filter(MoodEntry.created_at.is_(None)).limit(limit - len(rows)).all()
+    return rows
+
+def get_mood_entries_page(db: Session, skip: int = 0, limit: int = 100, date_filter: Optional[date] = None, mood_type_filter: Optional[str] = None, cursor: Optional[str] = None, user_id: str = DEFAULT_USER_ID) -> Tuple[List[MoodEntry], Optional[str]]:
+    """Страница записей и курсор следующей страницы (None, если это последняя)"""
+    entries = get_mood_entries(db, skip=skip, limit=limit + 1, date_filter=date_filter, mood_type_filter=mood_type_filter, cursor=cursor, user_id=user_id)
+    if len(entries) > limit:
+        entries = entries[:limit]
+        return entries, encode_cursor(entries[-1])
+    return entries, None
+
+EXPORT_BATCH_SIZE = 1000
+
+def iter_mood_entries(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None, mood_type_filter: Optional[str] = None, batch_size: int = EXPORT_BATCH_SIZE, user_id: str = DEFAULT_USER_ID) -> Iterator[Row]:
+    """
+    Потоково перебрать записи (в порядке id) для экспорта
+
+    Строки читаются серверным курсором пачками по batch_size (yield_per),
+    поэтому память не зависит от размера таблицы. Архивные записи
+    вливаются в поток по id.
+    """
+    stmt = select(
+        MoodEntry.id, MoodEntry.date, MoodEntry.created_at,
+        MoodEntry.mood_type, MoodEntry.mood_score, MoodEntry.notes
+    ).where(MoodEntry.user_id == user_id)
+    if start_date: stmt = stmt.where(MoodEntry.date >= start_date)
+    if end_date: stmt = stmt.where(MoodEntry.date <= end_date)
+    if mood_type_filter: stmt = stmt.where(MoodEntry.mood_type == mood_type_filter)
+    stmt = stmt.order_by(MoodEntry.id).execution_options(yield_per=batch_size)
+    archived = archive_store.entries(user_id, start_date, end_date, mood_type_filter, order="id")
+    yield from heapq.merge(archived, db.execute(stmt), key=order_key("id"))
+
+def get_mood_entry_by_id(db: Session, mood_id: int, user_id: str = DEFAULT_USER_ID) -> Optional[MoodEntry]:
+    """Запись по id - из базы или из архива"""
+    entry = db.query(MoodEntry).filter(MoodEntry.id == mood_id, MoodEntry.user_id == user_id).first()
+    if entry is not None: return entry
+    archived = archive_store.find(user_id, mood_id)
+    return _archived_model(archived, user_id) if archived else None
+
+def _check_not_archived(user_id: str, mood_id: int) -> None:
+    """Записи нет в базе: если она в архиве - ArchivedReadOnly вместо 404"""
+    if archive_store.find(user_id, mood_id):
+        raise ArchivedReadOnly(f"Entry {mood_id} is archived and read-only")
+
+def _check_filter_not_archived(user_id: str, start_date: Optional[date], end_date: Optional[date], mood_type: Optional[str]) -> None:
+    if next(iter(archive_store.entries(user_id, start_date, end_date, mood_type)), None):
+        raise ArchivedReadOnly("Filter matches archived entries, which are read-only; narrow it to unarchived months")
+
+def _update_returning_old(db: Session, where, values: dict, *returning) -> List[tuple]:
+    """
+    UPDATE mood_entries по фильтру where(stmt); строки - колонки returning
+    и прежние mood_type, mood_score (для приращений агрегатов)
+
+    PostgreSQL: один UPDATE ... FROM (SELECT ... FOR UPDATE) - старые значения
+    берутся из заблокированных строк. Остальные: SELECT перед UPDATE - на
+    SQLite транзакция уже держит блокировку записи (next_change_version),
+    и строки между ними не изменятся.
+    """
+    old_values = where(select(MoodEntry.id, MoodEntry.mood_type, MoodEntry.mood_score)).with_for_update()
+    options = {"synchronize_session": False}
+    if db.get_bind().dialect.name == "postgresql":
+        old = old_values.subquery("old")
+        stmt = update(MoodEntry).where(MoodEntry.id == old.c.id).values(**values)
+        return [tuple(row) for row in db.execute(stmt.returning(*returning, old.c.mood_type, old.c.mood_score), execution_options=options)]
+    old = {row.id: row for row in db.execute(old_values)}
+    if not old: return []
+    rows = db.execute(where(update(MoodEntry)).values(**values).returning(MoodEntry.id, *returning), execution_options=options)
+    return [(*row[1:], old[row[0]].mood_type, old[row[0]].mood_score) for row in rows]
+
+def update_mood_entry(db: Session, mood_id: int, mood_update: MoodUpdate, user_id: str = DEFAULT_USER_ID) -> Optional[MoodEntry]:
+    """
+    Обновить запись UPDATE ... RETURNING (без refresh после)
+
+    Вместе с новой записью читаются ее прежние тип и оценка: при их смене
+    агрегат дня получает -1 по старому ключу и +1 по новому (дата записи не
+    меняется). Архивная запись - ArchivedReadOnly.
+    """
+    update_data = {field: value for field, value in mood_update.model_dump(exclude_unset=True).items() if value is not None}
+    if not update_data: return get_mood_entry_by_id(db, mood_id, user_id)
+    version = next_change_version(db, user_id)
+    rows = _update_returning_old(
+        db, lambda stmt: stmt.where(MoodEntry.id == mood_id, MoodEntry.user_id == user_id),
+        {**update_data, "version": version}, MoodEntry
+    )
+    if not rows:
+        db.rollback()
+        _check_not_archived(user_id, mood_id)
+        return None
+    db_mood, old_type, old_score = rows[0]
+    if (old_type, old_score) != (db_mood.mood_type, db_mood.mood_score):
+        apply_rollup_changes(db, {
+            (user_id, db_mood.date, old_type, old_score): -1,
+            (user_id, db_mood.date, db_mood.mood_type, db_mood.mood_score): +1
+        })
+    # Отвязываем объект: после commit он не будет перечитываться из базы
+    db.expunge(db_mood)
     db.commit()
-    db.refresh(db_mood)
+    # Заметки тоже встроены в кэшируемые ответы (календарь с записями, день)
+    response_cache.invalidate_day(db_mood.date, user_id)
+    publish_mood_change(db, "updated", [db_mood.date], user_id, [event_entry(db_mood)])
     return db_mood
 
-def delete_mood_entry(db: Session, mood_id: int) -> bool:
-    db_mood = get_mood_entry_by_id(db, mood_id)
-    if not db_mood: return False
-    db.delete(db_mood)
+def delete_mood_entry(db: Session, mood_id: int, user_id: str = DEFAULT_USER_ID) -> bool:
+    """Удалить запись одним DELETE ... RETURNING; старые значения идут в агрегаты, id - в надгробие (архивная - ArchivedReadOnly)"""
+    version = next_change_version(db, user_id)
+    deleted = db.execute(
+        delete(MoodEntry).where(MoodEntry.id == mood_id, MoodEntry.user_id == user_id).returning(MoodEntry.date, MoodEntry.mood_type, MoodEntry.mood_score)
+    ).first()
+    if not deleted:
+        db.rollback()
+        _check_not_archived(user_id, mood_id)
+        return False
+    apply_rollup_delta(db, deleted.date, deleted.mood_type, deleted.mood_score, -1, user_id)
+    add_tombstones(db, [mood_id], version, user_id)
     db.commit()
+    response_cache.invalidate_day(deleted.date, user_id)
+    publish_mood_change(db, "deleted", [deleted.date], user_id, [
+        {"id": mood_id, "date": deleted.date, "mood_type": deleted.mood_type, "mood_score": deleted.mood_score, "version": version}
+    ])
     return True
 
-def get_mood_statistics(db: Session, start_date: date, end_date: date) -> dict:
+def _bulk_filter(stmt, user_id: str, start_date: Optional[date], end_date: Optional[date], mood_type: Optional[str]):
+    stmt = stmt.where(MoodEntry.user_id == user_id)
+    if start_date: stmt = stmt.where(MoodEntry.date >= start_date)
+    if end_date: stmt = stmt.where(MoodEntry.date <= end_date)
+    if mood_type: stmt = stmt.where(MoodEntry.mood_type == mood_type)
+    return stmt
+
+def delete_mood_entries(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None, mood_type: Optional[str] = None, user_id: str = DEFAULT_USER_ID) -> int:
+    """
+    Удалить все записи по фильтру одним DELETE
+
+    Агрегаты удаляются тем же фильтром: строка агрегата - это (день, тип,
+    оценка), так что фильтр по дате/типу покрывает ее целиком. Надгробия
+    пишутся тем же фильтром через INSERT ... SELECT перед удалением.
+    Фильтр, задевающий архивные записи, - ArchivedReadOnly (ничего не удаляется).
+    """
+    _check_filter_not_archived(user_id, start_date, end_date, mood_type)
+    version = next_change_version(db, user_id)
+    add_tombstones_from_select(db, _bulk_filter(select(MoodEntry.id), user_id, start_date, end_date, mood_type), version, user_id)
+    result = db.execute(_bulk_filter(delete(MoodEntry), user_id, start_date, end_date, mood_type))
+    if not result.rowcount:
+        db.rollback()
+        return 0
+    rollup = delete(MoodDailyRollup).where(MoodDailyRollup.user_id == user_id)
+    if start_date: rollup = rollup.where(MoodDailyRollup.day >= start_date)
+    if end_date: rollup = rollup.where(MoodDailyRollup.day <= end_date)
+    if mood_type: rollup = rollup.where(MoodDailyRollup.mood_type == mood_type)
+    db.execute(rollup)
+    db.commit()
+    response_cache.invalidate_range(start_date, end_date, user_id)
+    publish_reload(user_id, start_date, end_date)
+    return result.rowcount
+
+def retag_mood_entries(db: Session, new_mood_type: str, start_date: Optional[date] = None, end_date: Optional[date] = None, mood_type: Optional[str] = None, user_id: str = DEFAULT_USER_ID) -> int:
+    """
+    Сменить тип настроения всем записям по фильтру одним UPDATE
+
+    RETURNING отдает день, оценку и прежний тип каждой записи - агрегаты
+    получают -1 по старым ключам и +1 по новым. Фильтр, задевающий архивные
+    записи, - ArchivedReadOnly (ничего не меняется).
+    """
+    _check_filter_not_archived(user_id, start_date, end_date, mood_type)
+    version = next_change_version(db, user_id)
+    rows = _update_returning_old(
+        db, lambda stmt: _bulk_filter(stmt, user_id, start_date, end_date, mood_type),
+        {"mood_type": new_mood_type, "version": version}, MoodEntry.date, MoodEntry.mood_score
+    )
+    if not rows:
+        db.rollback()
+        return 0
+    deltas = Counter()
+    for day, mood_score, old_type, _ in rows:
+        deltas[(user_id, day, old_type, mood_score)] -= 1
+        deltas[(user_id, day, new_mood_type, mood_score)] += 1
+    apply_rollup_changes(db, {key: delta for key, delta in deltas.items() if delta})
+    days = [row[0] for row in rows]
+    first_day, last_day = min(days), max(days)
+    db.commit()
+    response_cache.invalidate_range(first_day, last_day, user_id)
+    publish_reload(user_id, first_day, last_day)
+    return len(days)
+
+def get_mood_statistics(db: Session, start_date: date, end_date: date, include_entries: bool = False, skip: int = 0, limit: int = 100, user_id: str = DEFAULT_USER_ID, row_budget: Optional[int] = None) -> dict:
     """
     Получить статистику настроений за период
+
+    Агрегаты берутся из дневной таблицы mood_daily_rollup одним GROUP BY,
+    поэтому стоимость не зависит от числа записей за период. Сами записи
+    (entries_data) отдаются только по запросу и постранично через skip/limit.
+    Если страница потребовала бы прочитать больше row_budget строк (skip
+    тоже читается), entries_data нет, а degraded = ["entries_data"].
+    Архивные месяцы (app/archive.py) складываются с таблицей.
     """
-    entries = db.query(MoodEntry).filter(
-        MoodEntry.date.between(start_date, end_date)
-    ).all()
-    
-    if not entries:
-        return {
-            "average_score": 0, 
-            "total_entries": 0, 
-            "mood_types": {},
-            "entries_data": []  # Добавляем для фронтенда
-        }
-    
-    total_score = sum(entry.mood_score for entry in entries)
-    average_score = total_score / len(entries)
-    
+    rows = (
+        db.query(
+            MoodDailyRollup.mood_type,
+            MoodDailyRollup.mood_score,
+            func.sum(MoodDailyRollup.entries_count),
+            func.sum(MoodDailyRollup.score_sum)
+        )
+        .filter(MoodDailyRollup.user_id == user_id, MoodDailyRollup.day.between(start_date, end_date))
+        .group_by(MoodDailyRollup.mood_type, MoodDailyRollup.mood_score)
+        .all()
+    )
+    archived = archive_store.rollup(user_id, start_date, end_date)
+    rows += [(row.mood_type, row.mood_score, row.entries_count, row.score_sum) for row in archived]
+
+    total_entries = 0
+    total_score = 0
     mood_types = {}
-    for entry in entries:
-        mood_types[entry.mood_type] = mood_types.get(entry.mood_type, 0) + 1
-    
-    # Подготовка данных для фронтенда
-    entries_data = [
-        {
-            "id": entry.id,
-            "mood_type": entry.mood_type,
-            "mood_score": entry.mood_score,
-            "date": entry.date.isoformat() if entry.date else None
-        }
-        for entry in entries
-    ]
-    
-    return {
-        "average_score": round(average_score, 2),
-        "total_entries": len(entries),
+    mood_scores = {}
+    for mood_type, mood_score, entries_count, score_sum in rows:
+        total_entries += entries_count
+        total_score += score_sum
+        mood_types[mood_type] = mood_types.get(mood_type, 0) + entries_count
+        mood_scores[mood_score] = mood_scores.get(mood_score, 0) + entries_count
+
+    statistics = {
+        "average_score": round(total_score / total_entries, 2) if total_entries else 0,
+        "total_entries": total_entries,
         "mood_types": mood_types,
-        "entries_data": entries_data  # Отправляем на фронтенд
+        "mood_scores": mood_scores  # Распределение по оценкам для фронтенда
     }
 
+    if include_entries and over_row_budget(min(skip + limit, total_entries), row_budget, "entries_data"):
+        statistics["degraded"] = ["entries_data"]
+    elif include_entries:
+        rows = (
+            db.query(MoodEntry.id, MoodEntry.mood_type, MoodEntry.mood_score, MoodEntry.date)
+            .filter(MoodEntry.user_id == user_id, MoodEntry.date.between(start_date, end_date))
+            .order_by(MoodEntry.date, MoodEntry.id)
+        )
+        if archived:
+            # Архив и таблица сливаются по (date, id), страница - из слияния
+            merged = heapq.merge(
+                archive_store.entries(user_id, start_date, end_date), rows.limit(skip + limit),
+                key=lambda row: (row.date, row.id)
+            )
+            rows = itertools.islice(merged, skip, skip + limit)
+        else:
+            rows = rows.offset(skip).limit(limit)
+        statistics["entries_data"] = [
+            {
+                "id": row.id,
+                "mood_type": row.mood_type,
+                "mood_score": row.mood_score,
+                "date": row.date.isoformat() if row.date else None
+            }
+            for row in rows
+        ]
+
+    return statistics
+
 
 # Добавим в конец файла (после get_mood_statistics)
-def get_mood_calendar_data(db: Session, year: int = None, month: int = None) -> dict:
+def get_mood_calendar_data(db: Session, year: int = None, month: int = None, include_entries: bool = True, user_id: str = DEFAULT_USER_ID, row_budget: Optional[int] = None) -> dict:
     """
     Получить данные для календарной визуализации
     
+    Агрегаты дня читаются из mood_daily_rollup (не больше ~31 дня × типы),
+    сами записи подгружаются только при include_entries=True и если их за
+    месяц не больше row_budget (иначе entries пустые, degraded = ["entries"]).
+    
     Возвращает:
     {
         "calendar": {
@@ -98,7 +463,8 @@ def get_mood_calendar_data(db: Session, year: int = None, month: int = None) ->
                 "average_score": 4.2,  # СРЕДНЯЯ оценка за день
                 "mood_types": ["happy", "calm"],  # Все типы настроений за день
                 "entries_count": 3,  # Количество записей за день
-                "entries": [  # Все записи за день
+                "scores": {5: 1, 4: 1, 3: 1},  # Распределение оценок за день
+                "entries": [  # Все записи за день (если include_entries)
                     {"score": 5, "type": "happy", "notes": "..."},
                     {"score": 4, "type": "calm", "notes": "..."},
                     {"score": 3, "type": "neutral", "notes": "..."}
@@ -113,7 +479,7 @@ def get_mood_calendar_data(db: Session, year: int = None, month: int = None) ->
         "month_name": "Декабрь"
     }
     """
-    from datetime import datetime, date
+    from datetime import datetime, date, timedelta
     from collections import defaultdict
     
     # Если год и месяц не указаны, используем текущие
@@ -122,29 +488,33 @@ def get_mood_calendar_data(db: Session, year: int = None, month: int = None) ->
     target_month = month or now.month
     
     # Определяем начало и конец месяца
-    start_date = date(target_year, target_month, 1)
+    start_date, end_date = get_month_bounds(target_year, target_month)
     
-    if target_month == 12:
-        end_date = date(target_year + 1, 1, 1)
-    else:
-        end_date = date(target_year, target_month + 1, 1)
+    # Дневные агрегаты за месяц
+    daily_rollup = defaultdict(list)
+    for row in get_daily_rollup(db, start_date, end_date - timedelta(days=1), user_id):
+        daily_rollup[row.day.isoformat()].append(row)
     
-    # Получаем все записи за месяц
-    entries = db.query(MoodEntry).filter(
-        MoodEntry.date >= start_date,
-        MoodEntry.date < end_date
-    ).order_by(MoodEntry.created_at).all()
-    
-    # Группируем записи по дням
+    # Записи за месяц - только нужные колонки и только по запросу
     daily_entries = defaultdict(list)
-    for entry in entries:
-        day_str = entry.date.isoformat()
-        daily_entries[day_str].append({
-            "score": entry.mood_score,
-            "type": entry.mood_type,
-            "notes": entry.notes,
-            "created_at": entry.created_at
-        })
+    month_entries = sum(row.entries_count for rows in daily_rollup.values() for row in rows)
+    degraded = include_entries and over_row_budget(month_entries, row_budget, "calendar_entries")
+    if include_entries and not degraded:
+        entries = db.query(
+            MoodEntry.date, MoodEntry.mood_score, MoodEntry.mood_type, MoodEntry.notes, MoodEntry.created_at
+        ).filter(
+            MoodEntry.user_id == user_id,
+            MoodEntry.date >= start_date,
+            MoodEntry.date < end_date
+        ).order_by(MoodEntry.created_at)
+        archived = archive_store.entries(user_id, start_date, end_date - timedelta(days=1), order="created_at")
+        for entry in heapq.merge(archived, entries, key=order_key("created_at")):
+            daily_entries[entry.date.isoformat()].append({
+                "score": entry.mood_score,
+                "type": entry.mood_type,
+                "notes": entry.notes,
+                "created_at": entry.created_at
+            })
     
     # Создаем полный календарь на месяц
     calendar_data = {}
@@ -153,16 +523,19 @@ def get_mood_calendar_data(db: Session, year: int = None, month: int = None) ->
     while current_date < end_date:
         day_str = current_date.isoformat()
         
-        if day_str in daily_entries:
-            entries_list = daily_entries[day_str]
-            entries_count = len(entries_list)
+        if day_str in daily_rollup:
+            rollup_rows = daily_rollup[day_str]
+            entries_count = sum(row.entries_count for row in rollup_rows)
             
             # Рассчитываем среднюю оценку
-            total_score = sum(entry["score"] for entry in entries_list)
+            total_score = sum(row.score_sum for row in rollup_rows)
             average_score = round(total_score / entries_count, 1)
             
-            # Получаем все уникальные типы настроений
-            mood_types = list(set(entry["type"] for entry in entries_list))
+            # Все уникальные типы настроений и распределение оценок
+            mood_types = list(dict.fromkeys(row.mood_type for row in rollup_rows))
+            scores = {}
+            for row in rollup_rows:
+                scores[row.mood_score] = scores.get(row.mood_score, 0) + row.entries_count
             
             # Получаем цвет по средней оценке (округляем до целого)
             rounded_score = round(average_score)
@@ -172,7 +545,8 @@ def get_mood_calendar_data(db: Session, year: int = None, month: int = None) ->
                 "average_score": average_score,
                 "mood_types": mood_types,
                 "entries_count": entries_count,
-                "entries": entries_list,
+                "scores": scores,
+                "entries": daily_entries[day_str],
                 "color": color,
                 "has_data": True
             }
@@ -182,6 +556,7 @@ def get_mood_calendar_data(db: Session, year: int = None, month: int = None) ->
                 "average_score": 0,
                 "mood_types": [],
                 "entries_count": 0,
+                "scores": {},
                 "entries": [],
                 "color": "#e2e8f0",
                 "has_data": False
@@ -189,7 +564,7 @@ def get_mood_calendar_data(db: Session, year: int = None, month: int = None) ->
         
         current_date = date.fromordinal(current_date.toordinal() + 1)
     
-    return {
+    result = {
         "calendar": calendar_data,
         "month": target_month,
         "year": target_year,
@@ -198,6 +573,131 @@ def get_mood_calendar_data(db: Session, year: int = None, month: int = None) ->
         "end_date": end_date.isoformat(),
         "total_days": len(calendar_data)
     }
+    if degraded: result["degraded"] = ["entries"]
+    return result
+
+
+HEATMAP_MAX_DAYS = 366 * 5
+
+def get_mood_heatmap(db: Session, start_date: date, end_date: date, user_id: str = DEFAULT_USER_ID) -> dict:
+    """
+    Тепловая карта за произвольный период (до HEATMAP_MAX_DAYS дней)
+
+    Один GROUP BY по mood_daily_rollup, пустые дни заполняются по смещению
+    от start_date - без цикла по календарю. Ответ колоночный:
+    {
+        "start_date": "2024-01-01", "end_date": "2024-12-31", "days": 366,
+        "scores": [4.2, 0, ...],   # средняя оценка дня (0 - нет данных)
+        "counts": [3, 0, ...],     # число записей
+        "colors": [4, 0, ...],     # индекс в palette
+        "palette": ["#e2e8f0", "#ef4444", ...]
+    }
+    """
+    days = (end_date - start_date).days + 1
+    scores = [0] * days
+    counts = [0] * days
+    colors = [0] * days
+
+    for row in get_daily_totals(db, start_date, end_date, user_id):
+        offset = (row.day - start_date).days
+        average_score = round(row.score_sum / row.entries_count, 1)
+        scores[offset] = average_score
+        counts[offset] = row.entries_count
+        colors[offset] = round(average_score)
+
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "days": days,
+        "scores": scores,
+        "counts": counts,
+        "colors": colors,
+        # индекс 0 - нет данных, 1..5 - округленная средняя оценка
+        "palette": [get_mood_color(score) for score in range(6)]
+    }
+
+
+def get_mood_calendar_compact(db: Session, year: int = None, month: int = None, user_id: str = DEFAULT_USER_ID) -> dict:
+    """
+    Компактный календарь: только дни с данными, колонками, без записей
+
+    {
+        "year": 2023, "month": 12, "month_name": "Декабрь", "total_days": 31,
+        "days": [0, 4, ...],          # смещение от 1-го числа (0 - первое)
+        "averages": [4.2, 3.0, ...],  # средняя оценка дня
+        "counts": [3, 1, ...],        # число записей
+        "colors": [4, 3, ...],        # индекс в palette
+        "palette": ["#e2e8f0", "#ef4444", ...]
+    }
+    Подробности дня - get_mood_day_details.
+    """
+    now = datetime.now()
+    target_year = year or now.year
+    target_month = month or now.month
+    start_date, end_date = get_month_bounds(target_year, target_month)
+
+    days, averages, counts, colors = [], [], [], []
+    for row in get_daily_totals(db, start_date, end_date - timedelta(days=1), user_id):
+        average_score = round(row.score_sum / row.entries_count, 1)
+        days.append((row.day - start_date).days)
+        averages.append(average_score)
+        counts.append(row.entries_count)
+        colors.append(round(average_score))
+
+    return {
+        "year": target_year,
+        "month": target_month,
+        "month_name": get_month_name_ru(target_month),
+        "total_days": (end_date - start_date).days,
+        "days": days,
+        "averages": averages,
+        "counts": counts,
+        "colors": colors,
+        "palette": [get_mood_color(score) for score in range(6)]
+    }
+
+
+def get_mood_day_details(db: Session, day: date, user_id: str = DEFAULT_USER_ID, row_budget: Optional[int] = None) -> dict:
+    """Подробности одного дня календаря: агрегаты и все записи (если их не больше row_budget)"""
+    rollup_rows = get_daily_rollup(db, day, day, user_id)
+    entries_count = sum(row.entries_count for row in rollup_rows)
+    scores = Counter()
+    for row in rollup_rows:
+        scores[row.mood_score] += row.entries_count
+    average_score = round(sum(row.score_sum for row in rollup_rows) / entries_count, 1) if entries_count else 0
+
+    degraded = over_row_budget(entries_count, row_budget, "day_entries")
+    entries = [] if degraded else heapq.merge(
+        archive_store.entries(user_id, day, day, order="created_at"),
+        db.query(
+            MoodEntry.id, MoodEntry.mood_score, MoodEntry.mood_type, MoodEntry.notes, MoodEntry.created_at
+        ).filter(MoodEntry.user_id == user_id, MoodEntry.date == day).order_by(MoodEntry.created_at),
+        key=order_key("created_at")
+    )
+
+    details = {
+        "date": day.isoformat(),
+        "has_data": entries_count > 0,
+        "average_score": average_score,
+        "entries_count": entries_count,
+        "mood_types": list(dict.fromkeys(row.mood_type for row in rollup_rows)),
+        "scores": dict(sorted(scores.items())),
+        "color": get_mood_color(round(average_score)),
+        "entries": [
+            {"id": entry.id, "score": entry.mood_score, "type": entry.mood_type, "notes": entry.notes, "created_at": entry.created_at}
+            for entry in entries
+        ]
+    }
+    if degraded: details["degraded"] = ["entries"]
+    return details
+
+
+def get_month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """Первый день месяца и первый день следующего месяца"""
+    start_date = date(year, month, 1)
+    if month == 12:
+        return start_date, date(year + 1, 1, 1)
+    return start_date, date(year, month + 1, 1)
 
 
 def get_mood_color(score: int) -> str:
@@ -0,0 +1,43 @@
+# app/crud/mood_async.py - асинхронные версии CRUD-функций
+#
+# Логика (агрегаты, инвалидация кэша) живет в app/crud/mood.py. Здесь она
+# выполняется через AsyncSession.run_sync: синхронный код работает поверх
+# асинхронного драйвера (aiosqlite / asyncpg), и ожидание БД не занимает
+# поток из пула - корутина просто отдает управление event loop.
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from datetime import date
+from app.models.mood import DEFAULT_USER_ID, MoodEntry
+from app.schemas.mood import MoodCreate, MoodUpdate
+from app.crud import mood as crud_mood
+
+
+async def create_mood_entry(db: AsyncSession, mood: MoodCreate, user_id: str = DEFAULT_USER_ID) -> MoodEntry:
+    return await db.run_sync(crud_mood.create_mood_entry, mood, user_id=user_id)
+
+async def get_mood_entries_page(db: AsyncSession, skip: int = 0, limit: int = 100, date_filter: Optional[date] = None, mood_type_filter: Optional[str] = None, cursor: Optional[str] = None, user_id: str = DEFAULT_USER_ID) -> Tuple[List[MoodEntry], Optional[str]]:
+    return await db.run_sync(
+        crud_mood.get_mood_entries_page,
+        skip=skip, limit=limit, date_filter=date_filter, mood_type_filter=mood_type_filter, cursor=cursor, user_id=user_id
+    )
+
+async def get_mood_entry_by_id(db: AsyncSession, mood_id: int, user_id: str = DEFAULT_USER_ID) -> Optional[MoodEntry]:
+    return await db.run_sync(crud_mood.get_mood_entry_by_id, mood_id, user_id=user_id)
+
+async def update_mood_entry(db: AsyncSession, mood_id: int, mood_update: MoodUpdate, user_id: str = DEFAULT_USER_ID) -> Optional[MoodEntry]:
+    return await db.run_sync(crud_mood.update_mood_entry, mood_id, mood_update, user_id=user_id)
+
+async def delete_mood_entry(db: AsyncSession, mood_id: int, user_id: str = DEFAULT_USER_ID) -> bool:
+    return await db.run_sync(crud_mood.delete_mood_entry, mood_id, user_id=user_id)
+
+async def get_mood_statistics(db: AsyncSession, start_date: date, end_date: date, include_entries: bool = False, skip: int = 0, limit: int = 100, user_id: str = DEFAULT_USER_ID, row_budget: Optional[int] = None) -> dict:
+    return await db.run_sync(
+        crud_mood.get_mood_statistics, start_date, end_date,
+        include_entries=include_entries, skip=skip, limit=limit, user_id=user_id, row_budget=row_budget
+    )
+
+async def get_mood_calendar_data(db: AsyncSession, year: int = None, month: int = None, include_entries: bool = True, user_id: str = DEFAULT_USER_ID, row_budget: Optional[int] = None) -> dict:
+    return await db.run_sync(crud_mood.get_mood_calendar_data, year, month, include_entries=include_entries, user_id=user_id, row_budget=row_budget)
+
+async def get_mood_calendar_compact(db: AsyncSession, year: int = None, month: int = None, user_id: str = DEFAULT_USER_ID) -> dict:
+    return await db.run_sync(crud_mood.get_mood_calendar_compact, year, month, user_id=user_id)
@@ -0,0 +1,217 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import Row, delete, func, insert, select, update
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from datetime import date
+from app.models.mood import DEFAULT_USER_ID, MoodEntry, MoodDailyRollup
+from app.archive import archive_store
+
+_ROLLUP_KEY = ("user_id", "day", "mood_type", "mood_score")
+
+
+def _dialect_insert(db: Session):
+    """insert() с поддержкой ON CONFLICT для SQLite/PostgreSQL, иначе None"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def apply_rollup_delta(db: Session, day: date, mood_type: str, mood_score: int, delta: int, user_id: str = DEFAULT_USER_ID) -> None:
+    """
+    Изменить дневной агрегат на delta записей (±1 при создании/удалении).
+
+    Выполняется в текущей транзакции сессии: коммит делает вызывающий код
+    вместе с изменением самой записи.
+    """
+    key = (
+        (MoodDailyRollup.user_id == user_id)
+        & (MoodDailyRollup.day == day)
+        & (MoodDailyRollup.mood_type == mood_type)
+        & (MoodDailyRollup.mood_score == mood_score)
+    )
+
+    if delta < 0:
+        db.execute(
+            update(MoodDailyRollup).where(key).values(
+                entries_count=MoodDailyRollup.entries_count + delta,
+                score_sum=MoodDailyRollup.score_sum + delta * mood_score
+            )
+        )
+        db.execute(delete(MoodDailyRollup).where(key, MoodDailyRollup.entries_count <= 0))
+        return
+
+    values = {
+        "user_id": user_id,
+        "day": day,
+        "mood_type": mood_type,
+        "mood_score": mood_score,
+        "entries_count": delta,
+        "score_sum": delta * mood_score
+    }
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(MoodDailyRollup).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_ROLLUP_KEY),
+            set_={
+                "entries_count": MoodDailyRollup.entries_count + stmt.excluded.entries_count,
+                "score_sum": MoodDailyRollup.score_sum + stmt.excluded.score_sum
+            }
+        )
+        db.execute(stmt)
+        return
+
+    # Остальные СУБД: UPDATE, а если строки еще нет - INSERT
+    result = db.execute(
+        update(MoodDailyRollup).where(key).values(
+            entries_count=MoodDailyRollup.entries_count + delta,
+            score_sum=MoodDailyRollup.score_sum + delta * mood_score
+        )
+    )
+    if result.rowcount == 0:
+        db.execute(insert(MoodDailyRollup).values(**values))
+
+
+def apply_rollup_deltas(db: Session, deltas: Dict[Tuple[str, date, str, int], int]) -> None:
+    """
+    Применить пачку положительных приращений {(пользователь, день, тип, оценка): число записей}.
+
+    На SQLite/PostgreSQL это один executemany-upsert вместо запроса на каждый ключ.
+    """
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is None or not deltas:
+        for (user_id, day, mood_type, mood_score), delta in deltas.items():
+            apply_rollup_delta(db, day, mood_type, mood_score, delta, user_id)
+        return
+
+    stmt = dialect_insert(MoodDailyRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(_ROLLUP_KEY),
+        set_={
+            "entries_count": MoodDailyRollup.entries_count + stmt.excluded.entries_count,
+            "score_sum": MoodDailyRollup.score_sum + stmt.excluded.score_sum
+        }
+    )
+    db.execute(stmt, [
+        {
+            "user_id": user_id,
+            "day": day,
+            "mood_type": mood_type,
+            "mood_score": mood_score,
+            "entries_count": delta,
+            "score_sum": delta * mood_score
+        }
+        for (user_id, day, mood_type, mood_score), delta in deltas.items()
+    ])
+
+
+def apply_rollup_changes(db: Session, deltas: Dict[Tuple[str, date, str, int], int]) -> None:
+    """
+    Применить приращения любого знака (смена типа/оценки: -1 старому ключу, +1 новому)
+
+    Сначала уменьшения по одному ключу (с удалением опустевших строк), затем
+    увеличения одним upsert. В отличие от refresh_daily_rollup строки агрегатов
+    не пересоздаются, так что параллельная вставка в тот же день не теряется.
+    """
+    for (user_id, day, mood_type, mood_score), delta in deltas.items():
+        if delta < 0:
+            apply_rollup_delta(db, day, mood_type, mood_score, delta, user_id)
+    apply_rollup_deltas(db, {key: delta for key, delta in deltas.items() if delta > 0})
+
+
+def refresh_daily_rollup(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None, user_id: Optional[str] = None) -> int:
+    """
+    Пересчитать агрегаты периода из mood_entries (DELETE + INSERT ... SELECT).
+
+    Выполняется в текущей транзакции, без коммита. Без дат - вся история,
+    без user_id - все пользователи. Возвращает число строк агрегатов.
+    """
+    clear = delete(MoodDailyRollup)
+    source = select(
+        MoodEntry.user_id,
+        MoodEntry.date,
+        MoodEntry.mood_type,
+        MoodEntry.mood_score,
+        func.count(MoodEntry.id),
+        func.sum(MoodEntry.mood_score)
+    ).where(MoodEntry.date.is_not(None))
+
+    if user_id:
+        clear = clear.where(MoodDailyRollup.user_id == user_id)
+        source = source.where(MoodEntry.user_id == user_id)
+    if start_date:
+        clear = clear.where(MoodDailyRollup.day >= start_date)
+        source = source.where(MoodEntry.date >= start_date)
+    if end_date:
+        clear = clear.where(MoodDailyRollup.day <= end_date)
+        source = source.where(MoodEntry.date <= end_date)
+
+    source = source.group_by(MoodEntry.user_id, MoodEntry.date, MoodEntry.mood_type, MoodEntry.mood_score)
+
+    db.execute(clear)
+    result = db.execute(
+        insert(MoodDailyRollup).from_select(
+            ["user_id", "day", "mood_type", "mood_score", "entries_count", "score_sum"], source
+        )
+    )
+    return result.rowcount
+
+
+def rebuild_daily_rollup(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+    """
+    Пересчитать агрегаты из mood_entries (бэкфилл / восстановление).
+
+    Без дат пересчитывается вся история. Возвращает число строк агрегатов.
+    """
+    rows = refresh_daily_rollup(db, start_date, end_date)
+    db.commit()
+    return rows
+
+
+def get_daily_rollup(db: Session, start_date: date, end_date: date, user_id: str = DEFAULT_USER_ID) -> List[MoodDailyRollup]:
+    """
+    Строки агрегатов пользователя за период [start_date, end_date] по возрастанию дня
+
+    Вместе с агрегатами архивных месяцев (app/archive.py); у дня, в который
+    дописали записи после архивации, может быть две строки с одним ключом.
+    """
+    rows = db.query(MoodDailyRollup).filter(
+        MoodDailyRollup.user_id == user_id,
+        MoodDailyRollup.day.between(start_date, end_date)
+    ).order_by(MoodDailyRollup.day, MoodDailyRollup.mood_type, MoodDailyRollup.mood_score).all()
+    archived = archive_store.rollup(user_id, start_date, end_date)
+    if not archived: return rows
+    return sorted(rows + archived, key=lambda row: (row.day, row.mood_type, row.mood_score))
+
+
+class DailyTotal(NamedTuple):
+    day: date
+    entries_count: int
+    score_sum: int
+
+
+def get_daily_totals(db: Session, start_date: date, end_date: date, user_id: str = DEFAULT_USER_ID) -> List[Row]:
+    """Итоги по дням за период одним GROUP BY: (day, entries_count, score_sum) по возрастанию дня (с архивом)"""
+    rows = db.execute(
+        select(
+            MoodDailyRollup.day,
+            func.sum(MoodDailyRollup.entries_count).label("entries_count"),
+            func.sum(MoodDailyRollup.score_sum).label("score_sum")
+        ).where(
+            MoodDailyRollup.user_id == user_id,
+            MoodDailyRollup.day.between(start_date, end_date)
+        ).group_by(MoodDailyRollup.day).order_by(MoodDailyRollup.day)
+    ).all()
+    archived = archive_store.rollup(user_id, start_date, end_date)
+    if not archived: return rows
+
+    totals: Dict[date, List[int]] = {}
+    for row in [*rows, *archived]:
+        total = totals.setdefault(row.day, [0, 0])
+        total[0] += row.entries_count
+        total[1] += row.score_sum
+    return [DailyTotal(day, *totals[day]) for day in sorted(totals)]
@@ -0,0 +1,169 @@
+# app/crud/search.py - полнотекстовый поиск по заметкам
+#
+# SQLite: внешняя FTS5-таблица mood_entries_fts поверх mood_entries,
+# синхронизируется триггерами на INSERT/UPDATE/DELETE.
+# PostgreSQL: генерируемая колонка notes_tsv с GIN-индексом.
+# Остальные СУБД: LIKE по каждому слову (без индекса и ранжирования).
+# Заметки архивных месяцев (app/archive.py) в индексе нет: их сегменты
+# просматриваются отдельно, и совпадения идут после живых с rank 0.
+import re
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, column, func, inspect, literal, literal_column, select, table, text
+from sqlalchemy.engine import Engine
+from typing import List, Optional, Tuple
+from datetime import date, datetime
+
+from app.archive import archive_store
+from app.crud.mood import _archived_model
+from app.models.mood import DEFAULT_USER_ID, MoodEntry
+
+FTS_TABLE = "mood_entries_fts"
+TSV_COLUMN = "notes_tsv"
+# 'simple' без стемминга: заметки пишутся на любом языке
+TS_CONFIG = "simple"
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "notes, content='mood_entries', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS mood_entries_fts_ai AFTER INSERT ON mood_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes); END",
+    f"CREATE TRIGGER IF NOT EXISTS mood_entries_fts_ad AFTER DELETE ON mood_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes); END",
+    f"CREATE TRIGGER IF NOT EXISTS mood_entries_fts_au AFTER UPDATE OF notes ON mood_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes); "
+    f"INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes); END",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS mood_entries_fts_ai",
+    "DROP TRIGGER IF EXISTS mood_entries_fts_ad",
+    "DROP TRIGGER IF EXISTS mood_entries_fts_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRES_DDL = [
+    f"ALTER TABLE mood_entries ADD COLUMN IF NOT EXISTS {TSV_COLUMN} tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}', coalesce(notes, ''))) STORED",
+    f"CREATE INDEX IF NOT EXISTS ix_mood_entries_{TSV_COLUMN} ON mood_entries USING GIN ({TSV_COLUMN})",
+]
+POSTGRES_DROP = [
+    f"DROP INDEX IF EXISTS ix_mood_entries_{TSV_COLUMN}",
+    f"ALTER TABLE mood_entries DROP COLUMN IF EXISTS {TSV_COLUMN}",
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_ddl(dialect: str, drop: bool = False) -> List[str]:
+    """DDL поискового индекса для СУБД (пустой список - индекса нет)"""
+    if dialect == "sqlite":
+        return SQLITE_DROP if drop else SQLITE_DDL
+    if dialect == "postgresql":
+        return POSTGRES_DROP if drop else POSTGRES_DDL
+    return []
+
+
+def ensure_search_index(engine: Engine) -> bool:
+    """
+    Создать поисковый индекс, если его нет. True - индекс создан сейчас
+    (для SQLite его нужно заполнить: rebuild_search_index).
+    """
+    statements = search_ddl(engine.dialect.name)
+    if not statements:
+        return False
+    inspector = inspect(engine)
+    if engine.dialect.name == "sqlite":
+        missing = not inspector.has_table(FTS_TABLE)
+    else:
+        missing = TSV_COLUMN not in {column["name"] for column in inspector.get_columns("mood_entries")}
+    if not missing:
+        return False
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    return True
+
+
+def rebuild_search_index(db: Session) -> None:
+    """Пересобрать индекс из mood_entries (колонка PostgreSQL пересчитывается сама)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        db.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        db.execute(text(f"REINDEX INDEX ix_mood_entries_{TSV_COLUMN}"))
+    db.commit()
+
+
+def search_tokens(query: str) -> List[str]:
+    """Слова запроса без операторов и кавычек - пользовательский ввод не интерпретируется"""
+    return _TOKEN_RE.findall(query.lower())
+
+
+def search_mood_entries(
+    db: Session,
+    query: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 50,
+    user_id: str = DEFAULT_USER_ID
+) -> List[Tuple[MoodEntry, float]]:
+    """
+    Записи пользователя, заметки которых содержат все слова запроса (по
+    префиксу), по убыванию релевантности: пары (запись, rank - чем больше,
+    тем лучше). FTS5 находит совпадения всех пользователей общей базы,
+    чужие отсекаются соединением с mood_entries; в режиме шардов индекс свой.
+    Архивные совпадения (rank 0, новые первыми) идут после всех живых.
+    """
+    tokens = search_tokens(query)
+    if not tokens: return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        # Каждое слово в кавычках и с * - префиксный поиск без синтаксиса FTS5
+        match = " ".join(f'"{token}"*' for token in tokens)
+        fts = table(FTS_TABLE, column("rowid"), column("rank"), column(FTS_TABLE))
+        # rank у FTS5 - bm25: чем меньше, тем релевантнее
+        stmt = select(MoodEntry, -fts.c.rank).join(
+            fts, fts.c.rowid == MoodEntry.id
+        ).where(fts.c[FTS_TABLE].op("MATCH")(match)).order_by(fts.c.rank)
+    elif dialect == "postgresql":
+        tsquery = func.to_tsquery(TS_CONFIG, " & ".join(f"{token}:*" for token in tokens))
+        tsv = literal_column(f"mood_entries.{TSV_COLUMN}")
+        rank = func.ts_rank(tsv, tsquery)
+        stmt = select(MoodEntry, rank).where(tsv.op("@@")(tsquery)).order_by(rank.desc())
+    else:
+        stmt = select(MoodEntry, literal(0.0)).where(
+            and_(*(func.lower(MoodEntry.notes).contains(token) for token in tokens))
+        ).order_by(MoodEntry.created_at.desc())
+
+    stmt = stmt.where(MoodEntry.user_id == user_id)
+    if start_date: stmt = stmt.where(MoodEntry.date >= start_date)
+    if end_date: stmt = stmt.where(MoodEntry.date <= end_date)
+    if min_score: stmt = stmt.where(MoodEntry.mood_score >= min_score)
+    if max_score: stmt = stmt.where(MoodEntry.mood_score <= max_score)
+
+    found = [(entry, float(score)) for entry, score in db.execute(stmt.offset(skip).limit(limit))]
+    if len(found) == limit or not archive_store.segments(user_id, start_date, end_date): return found
+    # Страница дошла до конца живых совпадений - продолжаем архивными
+    live_total = skip + len(found) if found else db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+    archived = _archived_matches(tokens, start_date, end_date, min_score, max_score, user_id)
+    archive_skip = max(0, skip - live_total)
+    return found + [(entry, 0.0) for entry in archived[archive_skip:archive_skip + limit - len(found)]]
+
+
+def _archived_matches(
+    tokens: List[str], start_date: Optional[date], end_date: Optional[date],
+    min_score: Optional[int], max_score: Optional[int], user_id: str
+) -> List[MoodEntry]:
+    """Архивные записи, в заметках которых есть все слова (по префиксу), новые первыми"""
+    matches = []
+    for entry in archive_store.entries(user_id, start_date, end_date):
+        if not entry.notes: continue
+        if min_score and entry.mood_score < min_score: continue
+        if max_score and entry.mood_score > max_score: continue
+        words = search_tokens(entry.notes)
+        if all(any(word.startswith(token) for word in words) for token in tokens):
+            matches.append(_archived_model(entry, user_id))
+    matches.sort(key=lambda entry: (entry.created_at or datetime.min, entry.id), reverse=True)
+    return matches
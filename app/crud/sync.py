@@ -0,0 +1,173 @@
+# app/crud/sync.py - версии изменений и надгробия для дельта-синхронизации
+#
+# Каждая пишущая операция берет следующую версию пользователя
+# (next_change_version) в своей транзакции и ставит ее измененным строкам;
+# удаленные записи оставляют надгробия (mood_tombstones) с той же версией.
+# Клиент хранит курсор (since, after_id) и забирает только то, что
+# изменилось после него: GET /moods/changes.
+#
+# Версию нужно брать в транзакции первой: строка счетчика остается
+# заблокированной до коммита, поэтому версии фиксируются строго по
+# возрастанию и клиент не пропустит транзакцию с меньшей версией,
+# закоммиченную позже.
+#
+# Перенос месяца в архив (app/crud/archive.py) - не удаление: надгробий
+# он не пишет, архивные записи сохраняют свои версии и отдаются
+# get_changes вместе с живыми (полная выгрузка since=0 видит все записи).
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, literal, select, tuple_, update
+from typing import List, Optional, Tuple
+from datetime import datetime
+
+from app.archive import archive_store
+from app.models.mood import DEFAULT_USER_ID, MoodEntry, MoodSyncState, MoodTombstone
+from app.crud.rollup import _dialect_insert
+
+CHANGES_MAX_LIMIT = 1000
+
+
+class ChangesGone(Exception):
+    """Курсор старше сжатых надгробий: клиенту нужна полная ресинхронизация"""
+
+
+def next_change_version(db: Session, user_id: str = DEFAULT_USER_ID) -> int:
+    """Увеличить счетчик версий пользователя (в текущей транзакции) и вернуть новое значение"""
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(MoodSyncState).values(user_id=user_id, version=1, compacted_version=0)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"version": MoodSyncState.version + 1}
+        ).returning(MoodSyncState.version)
+        return db.execute(stmt).scalar_one()
+
+    result = db.execute(
+        update(MoodSyncState).where(MoodSyncState.user_id == user_id).values(version=MoodSyncState.version + 1)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(MoodSyncState).values(user_id=user_id, version=1, compacted_version=0))
+    return get_sync_state(db, user_id)[0]
+
+
+def get_sync_state(db: Session, user_id: str = DEFAULT_USER_ID) -> Tuple[int, int]:
+    """(текущая версия, граница сжатия надгробий) пользователя"""
+    row = db.execute(
+        select(MoodSyncState.version, MoodSyncState.compacted_version).where(MoodSyncState.user_id == user_id)
+    ).first()
+    return (row.version, row.compacted_version) if row else (0, 0)
+
+
+def add_tombstones(db: Session, entry_ids: List[int], version: int, user_id: str = DEFAULT_USER_ID) -> None:
+    """Надгробия для удаленных записей (в текущей транзакции)"""
+    if not entry_ids: return
+    now = datetime.now()
+    db.execute(insert(MoodTombstone), [
+        {"user_id": user_id, "version": version, "entry_id": entry_id, "deleted_at": now}
+        for entry_id in entry_ids
+    ])
+
+
+def add_tombstones_from_select(db: Session, entries, version: int, user_id: str = DEFAULT_USER_ID) -> None:
+    """
+    Надгробия для записей по фильтру одним INSERT ... SELECT (до их DELETE)
+
+    entries - select(MoodEntry.id) с условиями удаления.
+    """
+    source = entries.with_only_columns(
+        literal(user_id), literal(version), MoodEntry.id, literal(datetime.now())
+    )
+    db.execute(insert(MoodTombstone).from_select(["user_id", "version", "entry_id", "deleted_at"], source))
+
+
+def _after(version_column, id_column, since: int, after_id: Optional[int]):
+    if after_id is None:
+        return version_column > since
+    return tuple_(version_column, id_column) > tuple_(since, after_id)
+
+
+def get_changes(db: Session, since: int = 0, after_id: Optional[int] = None, limit: int = 500, user_id: str = DEFAULT_USER_ID) -> dict:
+    """
+    Изменения пользователя после курсора (since, after_id)
+
+    Измененные/созданные записи и надгробия упорядочены по (version, id);
+    клиент применяет их в этом порядке. since=0 - полная выгрузка (вместе с
+    записями версии 0). Курсор следующего запроса - since/after_id ответа;
+    has_more=false значит, что клиент догнал текущую версию.
+    Если надгробия после since уже сжаты - ChangesGone. Архивные записи
+    вливаются в ту же последовательность со своими версиями.
+    """
+    from app.crud.mood import _archived_model
+
+    # Версию читаем до строк: все версии <= current уже закоммичены
+    current, compacted = get_sync_state(db, user_id)
+    if 0 < since < compacted:
+        raise ChangesGone(f"Changes before version {compacted} were compacted")
+
+    entries = select(MoodEntry).where(MoodEntry.user_id == user_id, MoodEntry.version <= current)
+    if since or after_id is not None:
+        entries = entries.where(_after(MoodEntry.version, MoodEntry.id, since, after_id))
+    changed = db.scalars(entries.order_by(MoodEntry.version, MoodEntry.id).limit(limit + 1)).all()
+
+    deleted = db.execute(
+        select(MoodTombstone.entry_id, MoodTombstone.version, MoodTombstone.deleted_at).where(
+            MoodTombstone.user_id == user_id,
+            MoodTombstone.version <= current,
+            _after(MoodTombstone.version, MoodTombstone.entry_id, since, after_id)
+        ).order_by(MoodTombstone.version, MoodTombstone.entry_id).limit(limit + 1)
+    ).all()
+
+    archived = archive_store.changed_after(user_id, since, after_id, current, limit + 1)
+
+    # Слияние упорядоченных выборок в одну страницу
+    page = sorted(
+        [((entry.version, entry.id), entry) for entry in changed]
+        + [((entry.version, entry.id), _archived_model(entry, user_id)) for entry in archived]
+        + [((row.version, row.entry_id), row) for row in deleted],
+        key=lambda item: item[0]
+    )
+    has_more = len(page) > limit
+    page = page[:limit]
+    if has_more:
+        since, after_id = page[-1][0]
+    else:
+        since, after_id = current, None
+
+    return {
+        "version": current,
+        "since": since,
+        "after_id": after_id,
+        "has_more": has_more,
+        "changes": [item for _, item in page if isinstance(item, MoodEntry)],
+        "deleted": [
+            {"id": item.entry_id, "version": item.version, "deleted_at": item.deleted_at}
+            for _, item in page if not isinstance(item, MoodEntry)
+        ]
+    }
+
+
+def compact_tombstones(db: Session, older_than: datetime) -> int:
+    """
+    Удалить надгробия старше older_than и сдвинуть границу сжатия
+
+    Клиенты с курсором ниже границы получат 410 и выполнят полную
+    синхронизацию. Выполняется в текущей транзакции. Возвращает число
+    удаленных надгробий.
+    """
+    horizons = db.execute(
+        select(MoodTombstone.user_id, func.max(MoodTombstone.version))
+        .where(MoodTombstone.deleted_at < older_than)
+        .group_by(MoodTombstone.user_id)
+    ).all()
+
+    removed = 0
+    for user_id, horizon in horizons:
+        # По версии, а не по времени: граница должна быть сплошной
+        removed += db.execute(
+            delete(MoodTombstone).where(MoodTombstone.user_id == user_id, MoodTombstone.version <= horizon)
+        ).rowcount
+        db.execute(
+            update(MoodSyncState).where(
+                MoodSyncState.user_id == user_id, MoodSyncState.compacted_version < horizon
+            ).values(compacted_version=horizon)
+        )
+    return removed
@@ -1,26 +1,134 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool  # для SQLite в production
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
 # Получаем URL БД из переменных окружения
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./mood_flow.db")
 
-# Настройка движка в зависимости от типа БД
-if DATABASE_URL.startswith("sqlite"):
-    # Для SQLite (локальная разработка)
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool  # важно для SQLite в production
-    )
-elif DATABASE_URL.startswith("postgres"):
-    # Для PostgreSQL (production на Render)
-    engine = create_engine(DATABASE_URL)
-else:
-    # Для других БД
-    engine = create_engine(DATABASE_URL)
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+# Режим SQLite: "wal" - пул соединений + WAL и прагмы ниже (по умолчанию),
+# "legacy" - одно общее соединение (StaticPool), как раньше
+SQLITE_MODE = os.getenv("SQLITE_MODE", "wal").lower()
+
+# Прагмы, которые выставляются на каждом новом соединении SQLite
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),       # читатели не ждут писателя
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),      # fsync на чекпоинте, не на каждом коммите
+    "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),      # ждать блокировку, а не падать
+    "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),  # чтение страниц через mmap
+    "cache_size": _env_int("SQLITE_CACHE_SIZE", -64 * 1024),       # < 0 - размер в КиБ (64 МиБ)
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+def normalize_database_url(url: str) -> str:
+    """Render выдает postgres://, а SQLAlchemy 2.x понимает только postgresql://"""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.split("?")[0].rstrip("/") in ("sqlite:", "sqlite:/", "sqlite+aiosqlite:") or ":memory:" in url
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
+def _pool_options(default_pre_ping: bool, default_recycle: int) -> dict:
+    """Настройки пула из окружения (DB_POOL_*)"""
+    return {
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", default_recycle),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", default_pre_ping),
+    }
+
+def _set_read_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if "sqlite" in type(dbapi_connection).__module__.lower():
+            cursor.execute("PRAGMA query_only=ON")
+        else:
+            cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+    finally:
+        cursor.close()
+
+def sqlite_dbapi_connection(dbapi_connection):
+    """sqlite3.Connection под соединением пула (у aiosqlite - под адаптером SQLAlchemy)"""
+    inner = getattr(getattr(dbapi_connection, "_connection", None), "_conn", None)
+    return inner or dbapi_connection
+
+def _clear_progress_handler(dbapi_connection, connection_record):
+    # Таймаут запроса (app.admission) не должен достаться следующему владельцу соединения
+    if dbapi_connection is None: return  # соединение инвалидировано
+    sqlite_dbapi_connection(dbapi_connection).set_progress_handler(None, 0)
+
+def make_engine(url: str, async_: bool = False, read_only: bool = False):
+    """
+    Создать движок SQLAlchemy под тип БД (синхронный или async_).
+
+    SQLite-файл: пул соединений (по одному на поток) и прагмы из SQLITE_PRAGMAS.
+    SQLite в памяти и SQLITE_MODE=legacy: одно общее соединение.
+    PostgreSQL и прочие: пул с pre-ping и recycle из переменных DB_POOL_*.
+    read_only: соединения только на чтение (для реплики).
+    """
+    new_engine = _make_engine(url, async_)
+    sync_engine = new_engine.sync_engine if async_ else new_engine
+    if read_only:
+        event.listen(sync_engine, "connect", _set_read_only)
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "checkin", _clear_progress_handler)
+    return new_engine
+
+def _make_engine(url: str, async_: bool):
+    url = normalize_database_url(url)
+    if async_:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        url = get_async_database_url(url)
+        factory = create_async_engine
+    else:
+        factory = create_engine
+
+    if url.startswith("sqlite"):
+        if _is_memory_sqlite(url) or SQLITE_MODE == "legacy":
+            kwargs = {"poolclass": StaticPool}
+            if not async_:
+                kwargs["connect_args"] = {"check_same_thread": False}
+            return factory(url, **kwargs)
+
+        kwargs = _pool_options(default_pre_ping=False, default_recycle=-1)
+        if not async_:
+            kwargs["poolclass"] = QueuePool
+            kwargs["connect_args"] = {"check_same_thread": False}
+        new_engine = factory(url, **kwargs)
+        event.listen(new_engine.sync_engine if async_ else new_engine, "connect", _set_sqlite_pragmas)
+        return new_engine
+
+    # PostgreSQL (production на Render) и другие БД
+    return factory(url, **_pool_options(default_pre_ping=True, default_recycle=1800))
+
+def get_async_database_url(url: str) -> str:
+    """URL синхронного драйвера -> URL асинхронного"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url[len("postgres://"):]
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+engine = make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -32,8 +140,87 @@ def get_db():
     finally:
         db.close()
 
+# Реплика для чтения (необязательно): GET-эндпоинты читают с нее,
+# все записи идут в DATABASE_URL. Локально - второй SQLite-файл или
+# второй экземпляр PostgreSQL.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+replica_engine = make_engine(DATABASE_REPLICA_URL, read_only=True) if DATABASE_REPLICA_URL else None
+
+class RoutingSession(Session):
+    """
+    Сессия для чтения: запросы идут на реплику, пока сессия ничего не пишет.
+
+    Первая запись (flush или INSERT/UPDATE/DELETE) переключает сессию на
+    основную базу до ее закрытия - следующие чтения видят свои же записи.
+    """
+    primary = None
+    replica = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is None or self.info.get("use_primary"):
+            return self.primary
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.info["use_primary"] = True
+            return self.primary
+        return self.replica
+
+class ReadSession(RoutingSession):
+    primary = engine
+    replica = replica_engine
+
+ReadSessionLocal = sessionmaker(class_=ReadSession, autocommit=False, autoflush=False)
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Режим работы API с БД: "sync" (по умолчанию) или "async" -
+# async def эндпоинты на AsyncSession (aiosqlite / asyncpg)
+DB_MODE = os.getenv("DB_MODE", "sync").lower()
+
+async_engine = None
+async_replica_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = make_engine(DATABASE_URL, async_=True)
+    if DATABASE_REPLICA_URL:
+        async_replica_engine = make_engine(DATABASE_REPLICA_URL, async_=True, read_only=True)
+
+    # expire_on_commit=False: после коммита объекты читаются без ленивых запросов
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    # Маршрутизация AsyncSession делается синхронной сессией внутри нее
+    class AsyncReadSession(RoutingSession):
+        primary = async_engine.sync_engine
+        replica = async_replica_engine.sync_engine if async_replica_engine else None
+
+    AsyncReadSessionLocal = async_sessionmaker(sync_session_class=AsyncReadSession, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
 # Функция для создания таблиц при запуске (если их нет)
+#
+# Только для разработки: create_all создает недостающие таблицы и индексы,
+# но не меняет существующие. Изменения схемы - только в миграциях Alembic
+# (alembic upgrade head).
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    import app.models  # noqa: F401 - регистрирует модели в Base.metadata
+    from app.crud.search import ensure_search_index
 
-    
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    # Полнотекстовый индекс заметок: FTS-таблица и триггеры (их нет в metadata)
+    ensure_search_index(engine)
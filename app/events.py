@@ -0,0 +1,135 @@
+# app/events.py - рассылка изменений открытым клиентам (Server-Sent Events)
+#
+# После коммита записи CRUD публикует событие с новыми итогами дня
+# (число записей, средняя, цвет) - вкладки пользователя правят календарь,
+# список и статистику на месте, без повторных fetch.
+#
+# Хаб живет в процессе: клиенты, подключенные к другому воркеру, событий
+# этого воркера не получат. У каждого подписчика своя очередь на
+# EVENTS_QUEUE_SIZE событий; если клиент не успевает их забирать, он
+# отключается с событием resync (перечитать данные и переподключиться),
+# а публикующий код никогда не ждет медленного клиента.
+import asyncio
+import json
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.database import _env_bool, _env_int
+from app.metrics import REGISTRY
+
+EVENTS = _env_bool("EVENTS", True)
+EVENTS_QUEUE_SIZE = _env_int("EVENTS_QUEUE_SIZE", 100)
+EVENTS_HEARTBEAT_S = _env_int("EVENTS_HEARTBEAT_S", 15)
+
+SUBSCRIBERS = REGISTRY.gauge("mood_flow_events_subscribers", "Открытые SSE-подключения")
+PUBLISHED = REGISTRY.counter("mood_flow_events_published_total", "Опубликованные события", ("event",))
+DROPPED = REGISTRY.counter("mood_flow_events_dropped_subscribers_total", "Подписчики, отключенные из-за переполнения очереди")
+
+# Последнее событие отключенного медленного подписчика
+RESYNC = ("resync", {})
+
+
+class Subscriber:
+    """Очередь событий одного SSE-подключения (в event loop этого подключения)"""
+
+    def __init__(self, user_id: str, loop: asyncio.AbstractEventLoop, maxsize: int = EVENTS_QUEUE_SIZE):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def _put(self, event: tuple) -> None:
+        # Выполняется в event loop подписчика
+        if self.dropped: return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент отстал: очередь заменяется одним resync, дальше - отключение
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            DROPPED.inc()
+
+
+class EventHub:
+    """Подписчики по пользователям; publish можно вызывать из любого потока"""
+
+    def __init__(self, enabled: bool = EVENTS):
+        self.enabled = enabled
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> Subscriber:
+        subscriber = Subscriber(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            SUBSCRIBERS.inc()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id, set())
+            if subscriber in subscribers:
+                subscribers.discard(subscriber)
+                SUBSCRIBERS.dec()
+            if not subscribers:
+                self._subscribers.pop(subscriber.user_id, None)
+
+    def has_subscribers(self, user_id: str) -> bool:
+        return self.enabled and bool(self._subscribers.get(user_id))
+
+    def publish(self, user_id: str, event: str, data: dict) -> None:
+        """Разослать событие всем подключениям пользователя (без ожидания)"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers: return
+        PUBLISHED.inc(event=event)
+        message = (event, jsonable_encoder(data))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._put, message)
+            except RuntimeError:
+                pass  # event loop подписчика уже закрыт
+
+
+event_hub = EventHub()
+
+
+def publish_mood_change(db: Session, change: str, days: Iterable[date], user_id: str, entries: List[dict]) -> None:
+    """
+    Событие mood после коммита: измененные записи и новые итоги их дней
+
+    {"change": "created", "entries": [{"id": 7, ..., "version": 12}],
+     "days": [{"date": "2024-03-01", "count": 3, "average": 4.2, "color": 4}]}
+
+    У deleted в entries только id, дата, тип, оценка и версия удаления.
+    color - индекс палитры, как в компактном календаре (0 - нет записей).
+    Без подписчиков у пользователя итоги дней даже не читаются.
+    """
+    if not event_hub.has_subscribers(user_id): return
+    from app.crud.rollup import get_daily_totals
+
+    days = sorted(set(days))
+    totals = {row.day: row for row in get_daily_totals(db, days[0], days[-1], user_id)} if days else {}
+    day_data = []
+    for day in days:
+        row = totals.get(day)
+        average = round(row.score_sum / row.entries_count, 1) if row else 0
+        day_data.append({"date": day, "count": row.entries_count if row else 0, "average": average, "color": round(average)})
+    event_hub.publish(user_id, "mood", {"change": change, "entries": entries, "days": day_data})
+
+
+def publish_reload(user_id: str, start_date: Optional[date], end_date: Optional[date]) -> None:
+    """Событие reload после массовой операции: клиент перечитывает видимые данные периода"""
+    if not event_hub.has_subscribers(user_id): return
+    event_hub.publish(user_id, "reload", {"start_date": start_date, "end_date": end_date})
+
+
+def format_event(event: str, data: dict) -> str:
+    """Кадр SSE: event + data одной строкой JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
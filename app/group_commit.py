@@ -0,0 +1,166 @@
+# app/group_commit.py - групповой коммит для POST /moods/ (GROUP_COMMIT=true)
+#
+# Запросы на создание записи не коммитят каждый сам по себе, а ставятся в
+# очередь. Фоновый поток собирает их в пачку (до GROUP_COMMIT_MAX_BATCH
+# записей или GROUP_COMMIT_WINDOW_MS после первой) и пишет одной
+# транзакцией: один INSERT ... RETURNING id, один upsert агрегатов, один
+# fsync. Каждый запрос получает через Future свою запись с id и временем.
+# В режиме шардов (SHARDING=true) пачка делится по пользователям: у каждого
+# своя транзакция в своем файле.
+import logging
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.cache import response_cache
+from app.crud.rollup import apply_rollup_deltas
+from app.crud.mood import event_entry
+from app.crud.sync import next_change_version
+from app.database import _env_bool, _env_int
+from app.events import publish_mood_change
+from app.metrics import REGISTRY
+from app.models.mood import MoodEntry
+from app.schemas.mood import MoodCreate
+from app.tenancy import SHARDING, session_for
+
+logger = logging.getLogger(__name__)
+
+GROUP_COMMIT = _env_bool("GROUP_COMMIT", False)
+GROUP_COMMIT_WINDOW_MS = _env_int("GROUP_COMMIT_WINDOW_MS", 5)
+GROUP_COMMIT_MAX_BATCH = _env_int("GROUP_COMMIT_MAX_BATCH", 200)
+
+BATCH_SIZE = REGISTRY.histogram(
+    "mood_flow_group_commit_batch_size", "Записей в одной транзакции группового коммита",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+BATCH_DURATION = REGISTRY.histogram("mood_flow_group_commit_flush_seconds", "Время записи одной пачки")
+QUEUE_WAIT = REGISTRY.histogram("mood_flow_group_commit_wait_seconds", "Ожидание от постановки в очередь до коммита")
+
+
+class GroupCommitter:
+    """Очередь создаваемых записей и поток, коммитящий их пачками"""
+
+    def __init__(self, window_ms: int = GROUP_COMMIT_WINDOW_MS, max_batch: int = GROUP_COMMIT_MAX_BATCH, session_factory: Callable = session_for):
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.session_factory = session_factory  # user_id -> Session
+        self._queue: "queue.Queue[Optional[Tuple[MoodCreate, str, Future, float]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, mood: MoodCreate, user_id: str) -> "Future[MoodEntry]":
+        """Поставить запись пользователя в очередь; Future вернет созданный MoodEntry"""
+        self._ensure_started()
+        future: "Future[MoodEntry]" = Future()
+        self._queue.put((mood, user_id, future, time.perf_counter()))
+        return future
+
+    def stop(self) -> None:
+        """Дописать очередь и остановить поток"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if not SHARDING:
+                self._flush(batch)
+                continue
+            by_user = defaultdict(list)
+            for item in batch:
+                by_user[item[1]].append(item)
+            for user_batch in by_user.values():
+                self._flush(user_batch)
+
+    def _flush(self, batch: List[Tuple[MoodCreate, str, Future, float]]) -> None:
+        started = time.perf_counter()
+        now = datetime.now()
+        # Без шардов сессия общая для всех пользователей пачки
+        db = self.session_factory(batch[0][1])
+        try:
+            # Одна версия изменений на пользователя пачки
+            versions = {user_id: next_change_version(db, user_id) for user_id in dict.fromkeys(item[1] for item in batch)}
+            rows = [
+                {
+                    "user_id": user_id,
+                    "mood_type": mood.mood_type,
+                    "mood_score": mood.mood_score,
+                    "notes": mood.notes,
+                    "date": now.date(),
+                    "created_at": now,
+                    "version": versions[user_id]
+                }
+                for mood, user_id, _, _ in batch
+            ]
+            # Один INSERT на пачку; id возвращаются в порядке строк
+            result = db.execute(
+                insert(MoodEntry).returning(MoodEntry.id, sort_by_parameter_order=True), rows
+            )
+            ids = result.scalars().all()
+            apply_rollup_deltas(db, Counter((row["user_id"], row["date"], row["mood_type"], row["mood_score"]) for row in rows))
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Групповой коммит из %d записей не удался", len(batch))
+            for _, _, future, _ in batch:
+                future.set_exception(exc)
+            return
+        finally:
+            db.close()
+
+        for user_id in {row["user_id"] for row in rows}:
+            response_cache.invalidate_day(now.date(), user_id)
+        finished = time.perf_counter()
+        BATCH_SIZE.observe(len(batch))
+        BATCH_DURATION.observe(finished - started)
+        created = defaultdict(list)
+        for (_, _, future, queued_at), mood_id, row in zip(batch, ids, rows):
+            QUEUE_WAIT.observe(finished - queued_at)
+            entry = MoodEntry(id=mood_id, **row)
+            created[row["user_id"]].append(entry)
+            future.set_result(entry)
+
+        # Одно событие SSE на пользователя пачки (сессия без подписчиков не подключается)
+        for user_id, entries in created.items():
+            db = self.session_factory(user_id)
+            try:
+                publish_mood_change(db, "created", [now.date()], user_id, [event_entry(entry) for entry in entries])
+            except Exception:
+                logger.exception("Не удалось опубликовать событие группового коммита")
+            finally:
+                db.close()
+
+
+group_committer = GroupCommitter()
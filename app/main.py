@@ -1,17 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from app.api.moods import router
-from app.database import create_tables
+from app import database
+from app.database import DB_MODE, create_tables
+from app.group_commit import group_committer
+from app.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from app.static_assets import PrecompressedStaticFiles, static_directory
+from app.tenancy import shard_pool
 import os
 
-# Автоматически создаем таблицы при запуске в production
-# На Render SQLite будет использовать /tmp для хранения БД
+# Автоматически создаем недостающие таблицы (пустая база для разработки);
+# схему существующих баз меняют только миграции - на Render alembic upgrade
+# head выполняется перед запуском (render.yaml)
 if os.getenv("RENDER") or not os.getenv("DATABASE_URL", "").startswith("postgres"):
     create_tables()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Дописываем очередь группового коммита
+    group_committer.stop()
+    # Закрываем пулы соединений (соединения aiosqlite держат свои потоки)
+    for async_engine in (database.async_engine, database.async_replica_engine):
+        if async_engine is not None:
+            await async_engine.dispose()
+    database.engine.dispose()
+    if database.replica_engine is not None:
+        database.replica_engine.dispose()
+    if shard_pool is not None:
+        for async_engine in shard_pool.dispose():
+            await async_engine.dispose()
+
 app = FastAPI(
     title="Mood Flow",
+    lifespan=lifespan,
     description="Трекер настроений с календарем и статистикой",
     version="1.0.0",
     docs_url="/docs",
@@ -22,8 +47,9 @@ app = FastAPI(
     }
 )
 
-# Раздача статических файлов
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Раздача статических файлов: после manage.py build-static - из app/static/dist
+# (хэшированные имена, immutable, готовые .br/.gz)
+app.mount("/static", PrecompressedStaticFiles(directory=static_directory()), name="static")
 
 # CORS настройки
 origins = [
@@ -38,11 +64,31 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"],
+    allow_headers=["*"],  # в том числе X-User-Id
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
 
+# Сжатие ответов API крупнее GZIP_MINIMUM_SIZE байт (статика уже сжата заранее)
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", "1000")), compresslevel=6)
+
+# Метрики: задержки, размеры ответов и SQL на запрос (см. /metrics)
+app.add_middleware(MetricsMiddleware)
+
 # Подключаем роутер
-app.include_router(router)
+# В режиме DB_MODE=async основные эндпоинты работают на AsyncSession;
+# синхронные маршруты без async-версии (bulk, export) остаются как есть
+# (они подключаются первыми, чтобы /moods/export не ушел в /moods/{mood_id})
+if DB_MODE == "async":
+    from app.api.moods_async import router as async_router
+    shadowed = {(route.path, method) for route in async_router.routes for method in route.methods}
+    router.routes = [
+        route for route in router.routes
+        if not any((route.path, method) in shadowed for method in route.methods)
+    ]
+    app.include_router(router)
+    app.include_router(async_router)
+else:
+    app.include_router(router)
 
 @app.get("/")
 def read_root():
@@ -58,6 +104,11 @@ def read_root():
         }
     }
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "Mood Flow API"}
@@ -1,3 +1,3 @@
-from .mood import MoodEntry, Base
+from .mood import MoodEntry, MoodDailyRollup, MoodTombstone, MoodSyncState, Base
 
-__all__ = ["MoodEntry", "Base"]
\ No newline at end of file
+__all__ = ["MoodEntry", "MoodDailyRollup", "MoodTombstone", "MoodSyncState", "Base"]
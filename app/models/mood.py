@@ -1,19 +1,87 @@
 # app/models/mood.py - АБСОЛЮТНО ПРАВИЛЬНАЯ ВЕРСИЯ
-from sqlalchemy import Column, Integer, String, Date, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, Date, DateTime, Index
 from datetime import datetime
 
 # КРИТИЧЕСКИ ВАЖНО: импортируем Base из database.py
 from app.database import Base
 
+# Владелец записей, если запрос пришел без X-User-Id (и у записей,
+# созданных до разделения по пользователям)
+DEFAULT_USER_ID = "default"
+
 class MoodEntry(Base):
     __tablename__ = "mood_entries"
     
     id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String(64), nullable=False, default=DEFAULT_USER_ID, server_default=DEFAULT_USER_ID)
     mood_type = Column(String, nullable=False)
     mood_score = Column(Integer, nullable=False)
     notes = Column(String(500), nullable=True)
     date = Column(Date, default=datetime.now().date)
     created_at = Column(DateTime, default=datetime.now)
+    # Версия изменения (app/crud/sync.py): растет с каждой записью пользователя;
+    # 0 - записи, не менявшиеся с появления версий
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    
+    # Индексы под горячие запросы app/crud/mood.py: все запросы идут в
+    # пределах одного пользователя, поэтому user_id - первая колонка;
+    # дальше фильтр по дате/типу + сортировка по created_at, диапазоны по date
+    __table_args__ = (
+        Index("ix_mood_entries_user_date_created_at", "user_id", "date", "created_at"),
+        Index("ix_mood_entries_user_mood_type_created_at", "user_id", "mood_type", "created_at"),
+        Index("ix_mood_entries_user_created_at", "user_id", "created_at"),
+        # GET /moods/changes: изменения после версии, keyset по (version, id)
+        Index("ix_mood_entries_user_version", "user_id", "version", "id"),
+        # id не переиспользуются после удаления последней записи: иначе новая
+        # запись получила бы id записи из архива (app/crud/archive.py)
+        {"sqlite_autoincrement": True},
+    )
+    
+    def __repr__(self):
+        return f"<MoodEntry(id={self.id}, type={self.mood_type}, score={self.mood_score})>"
+
+
+class MoodDailyRollup(Base):
+    """Дневные агрегаты настроений: одна строка на (пользователь, день, тип, оценку)"""
+    __tablename__ = "mood_daily_rollup"
+    
+    user_id = Column(String(64), primary_key=True, default=DEFAULT_USER_ID)
+    day = Column(Date, primary_key=True)
+    mood_type = Column(String, primary_key=True)
+    mood_score = Column(Integer, primary_key=True)
+    entries_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<MoodDailyRollup(user={self.user_id}, day={self.day}, type={self.mood_type}, score={self.mood_score}, count={self.entries_count})>"
+
+
+class MoodTombstone(Base):
+    """
+    Надгробие удаленной записи: клиенты синхронизации узнают об удалении.
+
+    Ключ (user_id, version, entry_id) - он же индекс выборки изменений.
+    Старые надгробия удаляет manage.py compact-tombstones.
+    """
+    __tablename__ = "mood_tombstones"
+    
+    user_id = Column(String(64), primary_key=True, default=DEFAULT_USER_ID)
+    version = Column(BigInteger, primary_key=True)
+    entry_id = Column(Integer, primary_key=True)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<MoodTombstone(user={self.user_id}, entry_id={self.entry_id}, version={self.version})>"
+
+
+class MoodSyncState(Base):
+    """Счетчик версий пользователя и граница сжатия надгробий"""
+    __tablename__ = "mood_sync_state"
+    
+    user_id = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    # Надгробия с версией <= compacted_version удалены
+    compacted_version = Column(BigInteger, nullable=False, default=0)
     
     def __repr__(self):
-        return f"<MoodEntry(id={self.id}, type={self.mood_type}, score={self.mood_score})>"
\ No newline at end of file
+        return f"<MoodSyncState(user={self.user_id}, version={self.version}, compacted={self.compacted_version})>"
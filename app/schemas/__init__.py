@@ -1,4 +1,4 @@
 # app/schemas/__init__.py
-from .mood import MoodBase, MoodCreate, MoodUpdate, MoodResponse
+from .mood import MoodBase, MoodCreate, MoodBulkItem, MoodUpdate, MoodResponse, MoodSearchResult, MoodBulkFilter, MoodBulkRetag, MoodBulkMutationResult, MoodBulkError, MoodBulkResult
 
-__all__ = ["MoodBase", "MoodCreate", "MoodUpdate", "MoodResponse"]
\ No newline at end of file
+__all__ = ["MoodBase", "MoodCreate", "MoodBulkItem", "MoodUpdate", "MoodResponse", "MoodSearchResult", "MoodBulkFilter", "MoodBulkRetag", "MoodBulkMutationResult", "MoodBulkError", "MoodBulkResult"]
\ No newline at end of file
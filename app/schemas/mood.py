@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime, date as DateType
+from typing import Any, List, Optional
 
 class MoodBase(BaseModel):
     mood_type: str = Field(..., min_length=1, max_length=50, description="Тип настроения")
@@ -10,6 +10,11 @@ class MoodBase(BaseModel):
 class MoodCreate(MoodBase):
     pass
 
+class MoodBulkItem(MoodCreate):
+    """Запись для массового импорта: дата задается явно"""
+    date: DateType = Field(..., description="Дата записи (YYYY-MM-DD)")
+    created_at: Optional[datetime] = Field(None, description="Время создания; по умолчанию - сейчас")
+
 class MoodUpdate(BaseModel):
     mood_type: Optional[str] = Field(None, min_length=1, max_length=50)
     mood_score: Optional[int] = Field(None, ge=1, le=5)
@@ -17,8 +22,53 @@ class MoodUpdate(BaseModel):
 
 class MoodResponse(MoodBase):
     id: int
+    user_id: str = Field(..., description="Владелец записи (заголовок X-User-Id)")
     date: datetime
-    created_at: datetime
+    created_at: Optional[datetime]
+    version: int = Field(..., description="Версия последнего изменения (GET /moods/changes)")
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class MoodSearchResult(MoodResponse):
+    rank: float = Field(..., description="Релевантность (больше - лучше)")
+
+class MoodBulkFilter(BaseModel):
+    """Фильтр массовых операций: нужен хотя бы один критерий"""
+    start_date: Optional[DateType] = Field(None, description="С даты (включительно)")
+    end_date: Optional[DateType] = Field(None, description="По дату (включительно)")
+    mood_type: Optional[str] = Field(None, min_length=1, max_length=50, description="Только записи этого типа")
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if not (self.start_date or self.end_date or self.mood_type):
+            raise ValueError("Укажите start_date, end_date или mood_type")
+        return self
+
+class MoodBulkRetag(MoodBulkFilter):
+    new_mood_type: str = Field(..., min_length=1, max_length=50, description="Новый тип настроения")
+
+class MoodBulkMutationResult(BaseModel):
+    affected: int
+
+class MoodBulkError(BaseModel):
+    index: int = Field(..., description="Номер записи во входном массиве/потоке")
+    errors: List[Any]
+
+class MoodBulkResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[MoodBulkError]
+class MoodTombstoneResponse(BaseModel):
+    id: int = Field(..., description="id удаленной записи")
+    version: int
+    deleted_at: datetime
+
+class MoodChanges(BaseModel):
+    """Изменения после курсора; следующий запрос - с since/after_id из ответа"""
+    version: int = Field(..., description="Текущая версия изменений пользователя")
+    since: int
+    after_id: Optional[int] = None
+    has_more: bool
+    changes: List[MoodResponse]
+    deleted: List[MoodTombstoneResponse]
@@ -0,0 +1,156 @@
+# app/single_flight.py - объединение одинаковых одновременных запросов
+#
+# Пока по ключу идет вычисление (лидер), остальные запросы с тем же ключом
+# не считают заново, а ждут его результат (или его исключение). После
+# завершения ключ освобождается: это не кэш, следующий запрос посчитает снова.
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from app.database import _env_bool, _env_int
+from app.metrics import REGISTRY
+
+T = TypeVar("T")
+
+SINGLE_FLIGHT = _env_bool("SINGLE_FLIGHT", True)
+SINGLE_FLIGHT_TIMEOUT_S = _env_int("SINGLE_FLIGHT_TIMEOUT_S", 30)
+
+
+def _parse_timeouts(value: str) -> Dict[str, float]:
+    """"analytics=60,calendar=10" -> {"analytics": 60.0, "calendar": 10.0}"""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {name.strip(): float(seconds) for name, seconds in pairs}
+
+
+# Свои таймауты для отдельных эндпоинтов (первый элемент ключа)
+SINGLE_FLIGHT_TIMEOUTS = _parse_timeouts(os.getenv("SINGLE_FLIGHT_TIMEOUTS", ""))
+
+REQUESTS = REGISTRY.counter(
+    "mood_flow_single_flight_requests_total",
+    "Запросы через single-flight: computed - посчитал сам, coalesced - получил чужой результат",
+    ("endpoint", "result")
+)
+IN_FLIGHT = REGISTRY.gauge("mood_flow_single_flight_in_flight", "Ключи, по которым сейчас идет вычисление", ("endpoint",))
+
+
+class SingleFlightTimeout(TimeoutError):
+    """Вычисление по ключу не завершилось за отведенное время"""
+
+
+def _endpoint(key: Hashable) -> str:
+    """Имя эндпоинта для метрик: первый элемент (вложенного) ключа-кортежа"""
+    while isinstance(key, tuple) and key:
+        key = key[0]
+    return str(key)
+
+
+class SingleFlight:
+    """Single-flight для синхронного кода (эндпоинты в пуле потоков)"""
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT, timeout: float = SINGLE_FLIGHT_TIMEOUT_S, timeouts: Optional[Dict[str, float]] = None):
+        self.enabled = enabled
+        self.timeout = timeout
+        self.timeouts = SINGLE_FLIGHT_TIMEOUTS if timeouts is None else timeouts
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def timeout_for(self, endpoint: str, timeout: Optional[float] = None) -> float:
+        """Явный таймаут, иначе таймаут эндпоинта из SINGLE_FLIGHT_TIMEOUTS, иначе общий"""
+        return timeout or self.timeouts.get(endpoint, self.timeout)
+
+    def do(self, key: Hashable, compute: Callable[[], T], timeout: Optional[float] = None) -> T:
+        """
+        Результат compute() для ключа. Если по ключу уже идет вычисление - ждать
+        его не дольше timeout секунд (SingleFlightTimeout); исключение лидера
+        пробрасывается всем ожидающим.
+        """
+        endpoint = _endpoint(key)
+        if not self.enabled:
+            REQUESTS.inc(endpoint=endpoint, result="computed")
+            return compute()
+
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            timeout = self.timeout_for(endpoint, timeout)
+            try:
+                result = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                REQUESTS.inc(endpoint=endpoint, result="timeout")
+                raise SingleFlightTimeout(f"{endpoint}: вычисление не завершилось за {timeout} с") from None
+            except Exception:
+                REQUESTS.inc(endpoint=endpoint, result="error")
+                raise
+            REQUESTS.inc(endpoint=endpoint, result="coalesced")
+            return result
+
+        REQUESTS.inc(endpoint=endpoint, result="computed")
+        IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            result = compute()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+            IN_FLIGHT.dec(endpoint=endpoint)
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    Single-flight для async-эндпоинтов (один event loop).
+
+    Вычисление идет отдельной задачей: отмена запроса-лидера (клиент ушел)
+    не отменяет его для остальных.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._calls: Dict[Hashable, "asyncio.Task"] = {}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """То же, что SingleFlight.do, для корутин"""
+        endpoint = _endpoint(key)
+        if not self.enabled:
+            REQUESTS.inc(endpoint=endpoint, result="computed")
+            return await compute()
+
+        task = self._calls.get(key)
+        if task is None:
+            REQUESTS.inc(endpoint=endpoint, result="computed")
+            IN_FLIGHT.inc(endpoint=endpoint)
+            task = self._calls[key] = asyncio.ensure_future(compute())
+
+            def release(done: "asyncio.Task"):
+                self._calls.pop(key, None)
+                IN_FLIGHT.dec(endpoint=endpoint)
+                if not done.cancelled():
+                    done.exception()  # ошибка уже отдана ожидающим, не логировать как потерянную
+            task.add_done_callback(release)
+            return await asyncio.shield(task)
+
+        timeout = self.timeout_for(endpoint, timeout)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            REQUESTS.inc(endpoint=endpoint, result="timeout")
+            raise SingleFlightTimeout(f"{endpoint}: вычисление не завершилось за {timeout} с") from None
+        except Exception:
+            REQUESTS.inc(endpoint=endpoint, result="error")
+            raise
+        REQUESTS.inc(endpoint=endpoint, result="coalesced")
+        return result
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
@@ -60,6 +60,12 @@ let currentBoardDate = {
     month: new Date().getMonth() + 1
 };
 
+// Показанные сейчас данные: события с сервера правят их на месте
+let currentMoods = [];
+let currentCalendarData = null;
+let currentStats = null;
+let currentStatsRange = null;
+
 // Объект для перевода типов настроения на русский
 const moodTypeLabels = {
     'happy': 'Радостное',
@@ -98,6 +104,9 @@ function initApp() {
     
     // Устанавливаем обработчики событий
     setupEventListeners();
+    
+    // Подписываемся на изменения с сервера
+    connectMoodEvents();
 }
 
 // Настройка обработчиков событий
@@ -175,6 +184,7 @@ async function loadMoods(filters = currentFilters) {
         const moods = await response.json();
         
         showLoading(false);
+        currentMoods = moods;
         
         if (moods.length === 0) {
             showEmptyState(true);
@@ -322,11 +332,13 @@ async function handleFormSubmit(e) {
         });
         charCount.textContent = '0';
         
-        // Загружаем обновленный список и календарь
+        // Список и календарь обновит событие с сервера; без потока событий - перезагружаем
         setTimeout(() => {
             hideMessage();
-            loadMoods();
-            loadMoodCalendar(); // Обновляем календарь
+            if (!moodEventsConnected) {
+                loadMoods();
+                loadMoodCalendar(); // Обновляем календарь
+            }
         }, 1500);
         
     } catch (error) {
@@ -365,6 +377,8 @@ async function loadStatistics() {
         }
         
         const stats = await response.json();
+        currentStats = stats;
+        currentStatsRange = { start: startDate, end: endDate };
         renderStatistics(stats);
         hideMessage();
         
@@ -377,13 +391,7 @@ async function loadStatistics() {
 // Отображение статистики
 function renderStatistics(stats) {
     // Создаем распределение по оценкам
-    const scoreDistribution = {};
-    if (stats.entries_data) {
-        stats.entries_data.forEach(entry => {
-            const score = entry.mood_score;
-            scoreDistribution[score] = (scoreDistribution[score] || 0) + 1;
-        });
-    }
+    const scoreDistribution = stats.mood_scores || {};
     
     // Создаем HTML для распределения по оценкам
     let scoreDistributionHTML = '';
@@ -498,6 +506,23 @@ function setupBoardEventListeners() {
     });
 }
 
+// Подробности дней календаря, загруженные по клику (дата -> ответ API)
+const dayDetailsCache = new Map();
+
+// Загрузка подробностей одного дня
+async function loadDayDetails(dateStr) {
+    if (dayDetailsCache.has(dateStr)) {
+        return dayDetailsCache.get(dateStr);
+    }
+    const response = await fetch(`${API_BASE_URL}/moods/calendar/day/${dateStr}`);
+    if (!response.ok) {
+        throw new Error(`Ошибка HTTP: ${response.status}`);
+    }
+    const details = await response.json();
+    dayDetailsCache.set(dateStr, details);
+    return details;
+}
+
 // Загрузка календаря
 async function loadMoodCalendar() {
     showCalendarLoading(true);
@@ -507,6 +532,10 @@ async function loadMoodCalendar() {
         const url = new URL(`${API_BASE_URL}/moods/calendar/`);
         url.searchParams.append('year', currentBoardDate.year);
         url.searchParams.append('month', currentBoardDate.month);
+        // Для доски хватает дневных агрегатов: только дни с данными, колонками.
+        // Подробности дня подгружаются по клику (loadDayDetails)
+        url.searchParams.append('compact', 'true');
+        dayDetailsCache.clear();
         
         console.log('Запрос к:', url.toString());
         
@@ -539,6 +568,8 @@ async function loadMoodCalendar() {
 
 // Отображение компактного календаря
 function renderMoodCalendar(calendarData) {
+    currentCalendarData = calendarData;
+    
     // Обновляем заголовок
     currentMonthElement.textContent = `${calendarData.month_name} ${calendarData.year}`;
     
@@ -576,9 +607,20 @@ function renderMoodCalendar(calendarData) {
     const daysInMonth = calendarData.total_days;
     const today = new Date();
     
+    // Компактный ответ: параллельные массивы по дням с данными
+    const daysWithData = {};
+    calendarData.days.forEach((offset, i) => {
+        daysWithData[offset + 1] = {
+            has_data: true,
+            average_score: calendarData.averages[i],
+            entries_count: calendarData.counts[i],
+            color: calendarData.palette[calendarData.colors[i]]
+        };
+    });
+    
     for (let day = 1; day <= daysInMonth; day++) {
         const dateStr = `${calendarData.year}-${String(calendarData.month).padStart(2, '0')}-${String(day).padStart(2, '0')}`;
-        const dayData = calendarData.calendar[dateStr] || {
+        const dayData = daysWithData[day] || {
             score: 0,
             mood_type: null,
             color: '#e2e8f0',
@@ -612,7 +654,7 @@ function createCompactDayCell(dayNumber, dayData, dateStr, today) {
         average_score: dayData.average_score || 0,
         entries_count: dayData.entries_count || 0,
         mood_types: dayData.mood_types || [],
-        entries: dayData.entries || []
+        scores: dayData.scores || {}
     });
     
     // Выделяем сегодняшний день
@@ -645,10 +687,20 @@ function createCompactDayCell(dayNumber, dayData, dateStr, today) {
     dayCell.addEventListener('mouseenter', handleDayCellHover);
     dayCell.addEventListener('mouseleave', handleDayCellLeave);
     
-    // Клик для фильтрации
-    dayCell.addEventListener('click', () => {
+    // Клик для фильтрации; оценки и типы дня догружаются для тултипа
+    dayCell.addEventListener('click', async () => {
         const data = JSON.parse(dayCell.dataset.dayInfo);
         if (data.has_data) {
+            try {
+                const details = await loadDayDetails(dateStr);
+                dayCell.dataset.dayInfo = JSON.stringify({
+                    ...data,
+                    mood_types: details.mood_types,
+                    scores: details.scores
+                });
+            } catch (error) {
+                console.error('Ошибка при загрузке дня:', error);
+            }
             filterByDate(dateStr);
         } else {
             showMessage(`Выбрана дата: ${formatDisplayDate(dateStr)}. Заполните форму.`, 'info');
@@ -740,11 +792,8 @@ function showDayTooltip(event, dayCell) {
             `;
             
             // Распределение оценок
-            if (dayInfo.entries && dayInfo.entries.length > 0) {
-                const scoreCounts = {};
-                dayInfo.entries.forEach(entry => {
-                    scoreCounts[entry.score] = (scoreCounts[entry.score] || 0) + 1;
-                });
+            if (dayInfo.scores && Object.keys(dayInfo.scores).length > 0) {
+                const scoreCounts = dayInfo.scores;
                 
                 tooltipHTML += `<div style="margin-bottom: 8px; font-size: 0.9em;">Оценки: `;
                 
@@ -1023,6 +1072,178 @@ function filterByDate(dateStr) {
     }, 300);
 }
 
+// ===========================================
+// ИЗМЕНЕНИЯ С СЕРВЕРА (Server-Sent Events)
+// ===========================================
+
+let moodEvents = null;
+let moodEventsConnected = false;
+let moodEventsLost = false;
+
+// Подписка на /moods/events: все вкладки и устройства получают изменения
+// без повторных запросов списка, календаря и статистики
+function connectMoodEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    moodEvents = new EventSource(`${API_BASE_URL}/moods/events`);
+    
+    moodEvents.addEventListener('open', () => {
+        // События за время разрыва потеряны - перечитываем показанное
+        if (moodEventsLost) {
+            reloadVisibleData();
+        }
+        moodEventsConnected = true;
+        moodEventsLost = false;
+    });
+    
+    // EventSource переподключается сам
+    moodEvents.addEventListener('error', () => {
+        moodEventsLost = moodEventsLost || moodEventsConnected;
+        moodEventsConnected = false;
+    });
+    
+    moodEvents.addEventListener('mood', (event) => applyMoodEvent(JSON.parse(event.data)));
+    
+    // Массовая операция: проще перечитать
+    moodEvents.addEventListener('reload', () => reloadVisibleData());
+    
+    // Сервер отключает отстающего клиента: перечитываем и подключаемся заново
+    moodEvents.addEventListener('resync', () => {
+        moodEvents.close();
+        moodEventsConnected = false;
+        reloadVisibleData();
+        setTimeout(connectMoodEvents, 1000);
+    });
+}
+
+function reloadVisibleData() {
+    dayDetailsCache.clear();
+    loadMoods();
+    loadMoodCalendar();
+    if (currentStats) {
+        loadStatistics();
+    }
+}
+
+// Применение события mood: записи, итоги дней, статистика
+function applyMoodEvent(event) {
+    let statsStale = false;
+    
+    event.entries.forEach(entry => {
+        const previous = currentMoods.find(mood => mood.id === entry.id);
+        if (event.change === 'updated') {
+            // Для статистики нужна старая версия записи
+            if (previous) {
+                patchStatistics(previous, -1);
+                patchStatistics(entry, 1);
+            } else {
+                statsStale = true;
+            }
+        } else {
+            patchStatistics(entry, event.change === 'created' ? 1 : -1);
+        }
+        patchMoodList(event.change, entry);
+    });
+    
+    event.days.forEach(day => {
+        dayDetailsCache.delete(day.date);
+        patchCalendarDay(day);
+    });
+    
+    if (currentCalendarData) {
+        renderMoodCalendar(currentCalendarData);
+    }
+    if (currentMoods.length === 0) {
+        showEmptyState(true);
+    } else {
+        showEmptyState(false);
+        renderMoods(currentMoods);
+    }
+    if (statsStale && currentStats) {
+        loadStatistics();
+    } else if (currentStats) {
+        renderStatistics(currentStats);
+    }
+}
+
+function patchMoodList(change, entry) {
+    const index = currentMoods.findIndex(mood => mood.id === entry.id);
+    if (change === 'deleted') {
+        if (index >= 0) {
+            currentMoods.splice(index, 1);
+        }
+    } else if (index >= 0) {
+        currentMoods[index] = entry;
+    } else if (change === 'created' && matchesFilters(entry)) {
+        currentMoods.unshift(entry);
+    }
+}
+
+function matchesFilters(entry) {
+    if (currentFilters.date_filter && entry.date.slice(0, 10) !== currentFilters.date_filter) {
+        return false;
+    }
+    return !currentFilters.mood_type || entry.mood_type === currentFilters.mood_type;
+}
+
+// Новые итоги дня в компактном календаре (параллельные массивы)
+function patchCalendarDay(day) {
+    if (!currentCalendarData) {
+        return;
+    }
+    const [year, month, dayNumber] = day.date.split('-').map(Number);
+    if (year !== currentCalendarData.year || month !== currentCalendarData.month) {
+        return;
+    }
+    
+    const offset = dayNumber - 1;
+    const data = currentCalendarData;
+    let index = data.days.indexOf(offset);
+    if (day.count === 0) {
+        if (index >= 0) {
+            [data.days, data.averages, data.counts, data.colors].forEach(column => column.splice(index, 1));
+        }
+        return;
+    }
+    if (index < 0) {
+        index = data.days.filter(existing => existing < offset).length;
+        [data.days, data.averages, data.counts, data.colors].forEach(column => column.splice(index, 0, 0));
+        data.days[index] = offset;
+    }
+    data.averages[index] = day.average;
+    data.counts[index] = day.count;
+    data.colors[index] = day.color;
+}
+
+// Запись добавлена (delta = 1) или убрана (-1) из загруженной статистики
+function patchStatistics(entry, delta) {
+    if (!currentStats || !currentStatsRange) {
+        return;
+    }
+    const day = entry.date.slice(0, 10);
+    if (day < currentStatsRange.start || day > currentStatsRange.end) {
+        return;
+    }
+    
+    const stats = currentStats;
+    const bump = (counts, key) => {
+        counts[key] = (counts[key] || 0) + delta;
+        if (counts[key] <= 0) {
+            delete counts[key];
+        }
+    };
+    stats.mood_scores = stats.mood_scores || {};
+    stats.mood_types = stats.mood_types || {};
+    bump(stats.mood_scores, entry.mood_score);
+    bump(stats.mood_types, entry.mood_type);
+    stats.total_entries = Math.max(0, (stats.total_entries || 0) + delta);
+    
+    // Сумма оценок точно восстанавливается из распределения
+    const scoreSum = Object.entries(stats.mood_scores).reduce((sum, [score, count]) => sum + score * count, 0);
+    stats.average_score = stats.total_entries ? Math.round(scoreSum / stats.total_entries * 100) / 100 : 0;
+}
+
 // ===========================================
 // ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 // ===========================================
@@ -1140,6 +1361,7 @@ async function loadMoods(filters = currentFilters) {
         const moods = await safeFetch(url);
         
         showLoading(false);
+        currentMoods = moods;
         
         if (moods.length === 0) {
             showEmptyState(true);
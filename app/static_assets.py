@@ -0,0 +1,128 @@
+# app/static_assets.py - сборка и раздача статики
+#
+# python manage.py build-static кладет в app/static/dist:
+#   style.<hash>.css, script.<hash>.js   - имена с хэшем содержимого
+#   *.gz (и *.br, если установлен brotli) - заранее сжатые копии
+#   index.html                            - со ссылками на хэшированные файлы
+#   manifest.json                         - исходное имя -> хэшированное
+# Если сборка есть, app/main.py раздает /static из dist.
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него только .gz
+    brotli = None
+
+STATIC_DIR = os.path.join("app", "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = "manifest.json"
+HASHED_EXTENSIONS = (".css", ".js")
+COMPRESSED_EXTENSIONS = (".css", ".js", ".html", ".json", ".svg")
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[a-z0-9]+$")
+
+
+def _compress(path: str, data: bytes) -> None:
+    if len(data) < MIN_COMPRESS_SIZE:
+        return
+    # mtime=0 - одинаковый .gz на одинаковом входе
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_static(source: str = STATIC_DIR, dest: str = DIST_DIR) -> Dict[str, str]:
+    """Собрать dist: хэшированные имена, сжатые копии, index.html и манифест"""
+    if os.path.isdir(dest):
+        shutil.rmtree(dest)
+    os.makedirs(dest)
+
+    manifest = {}
+    for name in sorted(os.listdir(source)):
+        path = os.path.join(source, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        targets = [name]
+        if name.endswith(HASHED_EXTENSIONS):
+            stem, ext = os.path.splitext(name)
+            manifest[name] = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            targets.append(manifest[name])
+        # Исходное имя тоже остается (старые ссылки), но без immutable
+        for target in targets:
+            if name == "index.html":
+                continue
+            target_path = os.path.join(dest, target)
+            with open(target_path, "wb") as f:
+                f.write(data)
+            if name.endswith(COMPRESSED_EXTENSIONS):
+                _compress(target_path, data)
+
+    index_path = os.path.join(source, "index.html")
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            html = f.read()
+        for original, hashed in manifest.items():
+            html = html.replace(f"/static/{original}", f"/static/{hashed}")
+        data = html.encode("utf-8")
+        with open(os.path.join(dest, "index.html"), "wb") as f:
+            f.write(data)
+        _compress(os.path.join(dest, "index.html"), data)
+
+    with open(os.path.join(dest, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def static_directory() -> str:
+    """dist, если статика собрана, иначе исходная папка"""
+    return DIST_DIR if os.path.exists(os.path.join(DIST_DIR, MANIFEST)) else STATIC_DIR
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles, который отдает готовые .br/.gz по Accept-Encoding
+    и помечает хэшированные файлы как immutable (остальные - no-cache + ETag).
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code not in (200, 304):
+            return response
+
+        immutable = bool(_HASHED_NAME.search(path))
+        if isinstance(response, FileResponse) and response.status_code == 200:
+            response = self._compressed_response(response, scope) or response
+        response.headers["Cache-Control"] = IMMUTABLE if immutable else "no-cache"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    def _compressed_response(self, response: FileResponse, scope) -> Optional[FileResponse]:
+        accepted = Headers(scope=scope).get("accept-encoding", "")
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            candidate = response.path + suffix
+            if encoding in accepted and os.path.isfile(candidate):
+                compressed = FileResponse(
+                    candidate, stat_result=os.stat(candidate), media_type=response.media_type,
+                    headers={"Content-Encoding": encoding}
+                )
+                # Слабый ETag исходного файла (как у nginx): If-None-Match
+                # с ним совпадет в StaticFiles и вернется 304
+                compressed.headers["ETag"] = "W/" + response.headers["etag"]
+                return compressed
+        return None
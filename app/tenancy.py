@@ -0,0 +1,198 @@
+# app/tenancy.py - пользователи и (необязательно) отдельная SQLite-база на пользователя
+#
+# Пользователь определяется заголовком X-User-Id (его ставит прокси с
+# аутентификацией перед приложением; без заголовка - DEFAULT_USER_ID).
+# Все запросы CRUD фильтруются по user_id.
+#
+# SHARDING=true: каждый пользователь живет в своем файле SHARD_DIR/<user_id>.db.
+# Движки открываются по требованию и держатся в LRU не больше SHARD_MAX_OPEN
+# штук; тяжелые запросы и записи одного пользователя не касаются чужих
+# файлов и чужих блокировок. DATABASE_URL и реплика в этом режиме для
+# записей не используются.
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterator, List, Optional
+
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import database
+from app.database import _env_bool, _env_int, make_engine
+from app.metrics import REGISTRY
+from app.models.mood import DEFAULT_USER_ID
+
+USER_ID_HEADER = "X-User-Id"
+# user_id идет в имя файла шарда: только безопасные символы
+_USER_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+SHARDING = _env_bool("SHARDING", False)
+SHARD_DIR = os.getenv("SHARD_DIR", "./shards")
+SHARD_MAX_OPEN = _env_int("SHARD_MAX_OPEN", 64)
+
+SHARD_OPEN = REGISTRY.gauge("mood_flow_shards_open", "Открытые движки шардов")
+SHARD_EVICTIONS = REGISTRY.counter("mood_flow_shard_evictions_total", "Движки шардов, закрытые по лимиту SHARD_MAX_OPEN")
+
+
+def validate_user_id(user_id: str) -> str:
+    if not _USER_ID_RE.match(user_id) or ".." in user_id:
+        raise ValueError(f"Invalid user id: {user_id!r}")
+    return user_id
+
+
+def get_user_id(x_user_id: Optional[str] = Header(None, alias=USER_ID_HEADER)) -> str:
+    """Пользователь запроса из X-User-Id (без заголовка - DEFAULT_USER_ID)"""
+    if not x_user_id: return DEFAULT_USER_ID
+    try:
+        return validate_user_id(x_user_id.strip())
+    except ValueError:
+        raise HTTPException(400, detail=f"Invalid {USER_ID_HEADER}")
+
+
+class ShardPool:
+    """LRU открытых движков по пользователям; при переполнении старший закрывается"""
+
+    def __init__(self, directory: str = SHARD_DIR, max_open: int = SHARD_MAX_OPEN):
+        self.directory = directory
+        self.max_open = max(1, max_open)
+        self._engines: "OrderedDict[tuple, Engine]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+
+    def path(self, user_id: str) -> str:
+        return os.path.join(self.directory, f"{validate_user_id(user_id)}.db")
+
+    def engine(self, user_id: str, async_: bool = False):
+        """Движок шарда пользователя (синхронный или async_); схема создается при первом открытии"""
+        key = (user_id, async_)
+        engine = self._cached(key)
+        if engine is not None:
+            return engine
+
+        # Открытие (и создание схемы нового файла) небыстрое: идет под
+        # отдельной блокировкой, чтобы не задерживать обращения к открытым
+        # шардам и не создавать схему одного файла дважды
+        with self._open_lock:
+            engine = self._cached(key)
+            if engine is not None:
+                return engine
+            url = f"sqlite:///{self.path(user_id)}"
+            os.makedirs(self.directory, exist_ok=True)
+            _create_schema(make_engine(url))  # синхронным движком и для async-режима
+            engine = make_engine(url, async_=async_)
+
+            evicted = []
+            with self._lock:
+                self._engines[key] = engine
+                while len(self._engines) > self.max_open:
+                    evicted.append(self._engines.popitem(last=False)[1])
+                SHARD_OPEN.set(len(self._engines))
+        for old in evicted:
+            # Занятые сейчас соединения отвязываются от движка и закроются сами
+            _dispose(old)
+        SHARD_EVICTIONS.inc(len(evicted))
+        return engine
+
+    def _cached(self, key: tuple):
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+            return engine
+
+    def user_ids(self) -> List[str]:
+        """Пользователи, у которых есть файл шарда"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith(".db"))
+
+    def dispose(self) -> List:
+        """Закрыть синхронные движки; async-движки возвращаются для await dispose()"""
+        with self._lock:
+            engines, self._engines = list(self._engines.items()), OrderedDict()
+            SHARD_OPEN.set(0)
+        async_engines = []
+        for (_, async_), engine in engines:
+            if async_:
+                async_engines.append(engine)
+            else:
+                engine.dispose()
+        return async_engines
+
+
+def _dispose(engine) -> None:
+    if not hasattr(engine, "sync_engine"):
+        engine.dispose()
+        return
+    # AsyncEngine закрывается корутиной в текущем event loop
+    try:
+        asyncio.get_running_loop().create_task(engine.dispose())
+    except RuntimeError:
+        pass
+
+
+def _create_schema(engine: Engine) -> None:
+    import app.models  # noqa: F401 - регистрирует модели в Base.metadata
+    from app.crud.search import ensure_search_index
+
+    try:
+        database.Base.metadata.create_all(bind=engine)
+        ensure_search_index(engine)
+    finally:
+        engine.dispose()
+
+
+shard_pool = ShardPool() if SHARDING else None
+
+
+def session_for(user_id: str, read: bool = False) -> Session:
+    """Сессия для данных пользователя: его шард или общая база (read - с репликой)"""
+    if shard_pool is not None:
+        return Session(bind=shard_pool.engine(user_id), autoflush=False)
+    return database.ReadSessionLocal() if read else database.SessionLocal()
+
+
+def async_session_for(user_id: str, read: bool = False):
+    """То же, что session_for, для DB_MODE=async"""
+    if shard_pool is not None:
+        from sqlalchemy.ext.asyncio import AsyncSession
+        return AsyncSession(bind=shard_pool.engine(user_id, async_=True), autoflush=False, expire_on_commit=False)
+    return database.AsyncReadSessionLocal() if read else database.AsyncSessionLocal()
+
+
+def get_user_db(user_id: str = Depends(get_user_id)) -> Iterator[Session]:
+    db = session_for(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_user_read_db(user_id: str = Depends(get_user_id)) -> Iterator[Session]:
+    db = session_for(user_id, read=True)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_user_db(user_id: str = Depends(get_user_id)):
+    async with async_session_for(user_id) as db:
+        yield db
+
+
+async def get_async_user_read_db(user_id: str = Depends(get_user_id)):
+    async with async_session_for(user_id, read=True) as db:
+        yield db
+
+
+def user_sessions() -> Iterator[Session]:
+    """Сессии всех баз с данными: шарды или одна общая (для manage.py)"""
+    if shard_pool is None:
+        yield database.SessionLocal()
+        return
+    for user_id in shard_pool.user_ids():
+        yield session_for(user_id)
@@ -0,0 +1,85 @@
+# benchmarks/bulk_ingest.py - скорость импорта: построчный POST-путь против пакетного
+#
+#   python benchmarks/bulk_ingest.py [--rows 5000] [--chunk-size 500]
+#
+# Оба варианта пишут во временную SQLite базу через CRUD-функции, так что
+# измеряется именно путь записи (транзакции, INSERT, агрегаты), без HTTP.
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="mood_flow_bench_"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal, create_tables
+from app.crud import mood as crud_mood
+from app.models.mood import MoodEntry, MoodDailyRollup
+from app.schemas.mood import MoodCreate, MoodBulkItem
+
+MOOD_TYPES = ["happy", "calm", "sad", "angry", "excited", "tired"]
+
+
+def make_items(rows):
+    rng = random.Random(42)
+    start = date.today() - timedelta(days=365 * 3)
+    return [
+        MoodBulkItem(
+            mood_type=rng.choice(MOOD_TYPES),
+            mood_score=rng.randint(1, 5),
+            notes=f"Импорт #{i}",
+            date=start + timedelta(days=rng.randrange(365 * 3)),
+        )
+        for i in range(rows)
+    ]
+
+
+def reset(db):
+    db.query(MoodEntry).delete()
+    db.query(MoodDailyRollup).delete()
+    db.commit()
+
+
+def bench_single(db, items):
+    started = time.perf_counter()
+    for item in items:
+        crud_mood.create_mood_entry(db, MoodCreate(mood_type=item.mood_type, mood_score=item.mood_score, notes=item.notes))
+    return time.perf_counter() - started
+
+
+def bench_bulk(db, items, chunk_size):
+    started = time.perf_counter()
+    inserted, errors = crud_mood.create_mood_entries_bulk(db, list(enumerate(items)), chunk_size=chunk_size)
+    assert inserted == len(items) and not errors
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость импорта: построчно против пакетного")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=crud_mood.BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    create_tables()
+    items = make_items(args.rows)
+    db = SessionLocal()
+    try:
+        reset(db)
+        single = bench_single(db, items)
+        reset(db)
+        bulk = bench_bulk(db, items, args.chunk_size)
+    finally:
+        db.close()
+
+    print(f"📦 Записей: {args.rows}, база: {DB_PATH}")
+    print(f"   Построчно (create_mood_entry):      {args.rows / single:10.0f} строк/с ({single:.2f} с)")
+    print(f"   Пакетно (create_mood_entries_bulk): {args.rows / bulk:10.0f} строк/с ({bulk:.2f} с)")
+    print(f"   Ускорение: ×{single / bulk:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# benchmarks/harness.py - воспроизводимый нагрузочный бенчмарк всех маршрутов /moods
+#
+#   python benchmarks/harness.py --rows 10k                      # прогон, JSON в stdout
+#   python benchmarks/harness.py --rows 1m --output run.json     # сохранить результат
+#   python benchmarks/harness.py --rows 1m --baseline run.json   # сравнить с эталоном
+#
+# База заполняется детерминированно (--seed) записями за --years лет и
+# кэшируется в --data-dir, так что повторные прогоны на 1M/10M строк не
+# тратят время на генерацию. Запросы идут в приложение in-process через
+# httpx.ASGITransport с --concurrency одновременными клиентами.
+# Код возврата 1, если в режиме сравнения найдены регрессии.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOOD_TYPES = ["happy", "calm", "sad", "angry", "excited", "tired", "anxious", "grateful"]
+NOTES = ["Работа", "Спорт", "Семья", "Погода", "Сон", "Встреча с друзьями", None, None]
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+
+def parse_rows(value):
+    return SIZES.get(value.lower()) or int(value)
+
+
+def seed_database(path, rows, years, seed):
+    """Заполнить mood_entries (и агрегаты) детерминированными данными"""
+    from sqlalchemy import insert
+    from app.database import SessionLocal, create_tables, engine
+    from app.models.mood import MoodEntry
+    from app.crud.rollup import rebuild_daily_rollup
+
+    create_tables()
+    rng = random.Random(seed)
+    end = date.today()
+    days = 365 * years
+    start = end - timedelta(days=days - 1)
+    chunk = 50_000
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        for offset in range(0, rows, chunk):
+            batch = []
+            for _ in range(min(chunk, rows - offset)):
+                day = start + timedelta(days=rng.randrange(days))
+                batch.append({
+                    "mood_type": rng.choice(MOOD_TYPES),
+                    "mood_score": rng.randint(1, 5),
+                    "notes": rng.choice(NOTES),
+                    "date": day,
+                    "created_at": datetime(day.year, day.month, day.day, rng.randrange(24), rng.randrange(60), rng.randrange(60)),
+                })
+            conn.execute(insert(MoodEntry), batch)
+            print(f"  … {offset + len(batch):,} / {rows:,}", file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        rebuild_daily_rollup(db)
+    finally:
+        db.close()
+    print(f"🌱 База {path} заполнена за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+
+class Scenarios:
+    """
+    Генераторы запросов по шаблону маршрута: (method, url, params, body/json).
+
+    Новый маршрут в app/api/moods.py должен получить сценарий здесь -
+    иначе прогон предупредит, что маршрут не покрыт.
+    """
+
+    def __init__(self, rng, years, max_id):
+        self.rng = rng
+        self.today = date.today()
+        self.first_day = self.today - timedelta(days=365 * years - 1)
+        self.max_id = max_id
+        self.cursor = None
+
+    def random_day(self):
+        return self.first_day + timedelta(days=self.rng.randrange((self.today - self.first_day).days + 1))
+
+    def random_id(self):
+        return self.rng.randint(1, self.max_id)
+
+    def build(self):
+        return {
+            ("POST", "/moods/"): lambda: ("POST", "/moods/", None, {"mood_type": self.rng.choice(MOOD_TYPES), "mood_score": self.rng.randint(1, 5)}),
+            ("POST", "/moods/bulk"): lambda: ("POST", "/moods/bulk", None, [
+                {"mood_type": self.rng.choice(MOOD_TYPES), "mood_score": self.rng.randint(1, 5), "date": self.random_day().isoformat()}
+                for _ in range(50)
+            ]),
+            ("GET", "/moods/"): lambda: ("GET", "/moods/", {"limit": 50, "skip": self.rng.randrange(1000)}, None),
+            ("GET", "/moods/export"): lambda: ("GET", "/moods/export", self._range(30), None),
+            ("GET", "/moods/search"): lambda: ("GET", "/moods/search", {"q": self.rng.choice([note for note in NOTES if note])}, None),
+            ("GET", "/moods/changes"): lambda: ("GET", "/moods/changes", {"since": 0, "after_id": self.rng.randrange(self.max_id)}, None),
+            ("GET", "/moods/{mood_id}"): lambda: ("GET", f"/moods/{self.random_id()}", None, None),
+            ("PUT", "/moods/{mood_id}"): lambda: ("PUT", f"/moods/{self.random_id()}", None, {"mood_score": self.rng.randint(1, 5)}),
+            ("DELETE", "/moods/{mood_id}"): lambda: ("DELETE", f"/moods/{self.random_id()}", None, None),
+            ("GET", "/moods/statistics/"): lambda: ("GET", "/moods/statistics/", self._range(365), None),
+            ("GET", "/moods/calendar/"): lambda: ("GET", "/moods/calendar/", self._month(), None),
+            ("GET", "/moods/calendar/?compact"): lambda: ("GET", "/moods/calendar/", {**self._month(), "compact": "true"}, None),
+            ("GET", "/moods/calendar/day/{day}"): lambda: ("GET", f"/moods/calendar/day/{self.random_day().isoformat()}", None, None),
+            ("GET", "/moods/heatmap/"): lambda: ("GET", "/moods/heatmap/", self._range(365), None),
+            ("GET", "/moods/analytics/"): lambda: ("GET", "/moods/analytics/", self._range(365 * 3), None),
+        }
+
+    def _range(self, days):
+        start = self.random_day()
+        return {"start_date": start.isoformat(), "end_date": (start + timedelta(days=days - 1)).isoformat()}
+
+    def _month(self):
+        day = self.random_day()
+        return {"year": day.year, "month": day.month, "include_entries": "false"}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def drive_route(client, make_request, requests, concurrency):
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(make_request())
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            method, url, params, body = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.request(method, url, params=params, json=body)
+            if response.status_code >= 500:
+                errors += 1
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import func
+    from app.main import app
+    from app.database import SessionLocal
+    from app.models.mood import MoodEntry
+
+    db = SessionLocal()
+    try:
+        max_id = db.query(func.max(MoodEntry.id)).scalar() or 1
+    finally:
+        db.close()
+
+    scenarios = Scenarios(random.Random(args.seed), args.years, max_id).build()
+    app_routes = {
+        (method, route.path)
+        for route in app.routes
+        if getattr(route, "path", "").startswith("/moods")
+        for method in getattr(route, "methods", ())
+    }
+    for missing in sorted(app_routes - scenarios.keys()):
+        print(f"⚠️  Нет сценария для {missing[0]} {missing[1]}", file=sys.stderr)
+
+    # Разрушающие сценарии (PUT/DELETE) идут последними, чтобы не влиять на чтения
+    order = sorted(scenarios.keys() & app_routes, key=lambda key: (key[0] in ("PUT", "DELETE"), key[0] == "DELETE", key))
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for method, path in order:
+            if args.routes and path not in args.routes:
+                continue
+            result = await drive_route(client, scenarios[(method, path)], args.requests, args.concurrency)
+            results[f"{method} {path}"] = result
+            print(f"  {method:6} {path:28} p50 {result['p50_ms']:8.2f} мс  p95 {result['p95_ms']:8.2f} мс  "
+                  f"p99 {result['p99_ms']:8.2f} мс  {result['throughput_rps']:8.1f} rps", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Регрессии: p95 выросла или пропускная способность упала больше чем на threshold"""
+    regressions = []
+    for route, current in results.items():
+        previous = baseline.get("routes", {}).get(route)
+        if not previous:
+            continue
+        if previous["p95_ms"] > 0 and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append({"route": route, "metric": "p95_ms", "baseline": previous["p95_ms"], "current": current["p95_ms"]})
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+            regressions.append({"route": route, "metric": "throughput_rps", "baseline": previous["throughput_rps"], "current": current["throughput_rps"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк маршрутов Mood Flow")
+    parser.add_argument("--rows", type=parse_rows, default=SIZES["10k"], help="Объем данных: 10k, 100k, 1m, 10m или число")
+    parser.add_argument("--years", type=int, default=10, help="На сколько лет распределить записи")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на маршрут")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--routes", nargs="*", help="Только эти шаблоны путей (например /moods/calendar/)")
+    parser.add_argument("--cache", action="store_true", help="Не отключать кэш ответов")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "mood_flow_bench"))
+    parser.add_argument("--output", help="Куда сохранить JSON с результатами")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимое ухудшение (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    db_path = os.path.join(args.data_dir, f"moods_{args.rows}_{args.years}y_seed{args.seed}.db")
+    fresh = not os.path.exists(db_path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    if not args.cache:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)  # app/main.py монтирует app/static относительно корня
+
+    if fresh:
+        seed_database(db_path, args.rows, args.years, args.seed)
+    else:
+        # Записи прошлых прогонов (POST/DELETE) не трогаем: объем меняется на доли процента
+        from app.database import create_tables
+        create_tables()
+
+    results = asyncio.run(run(args))
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": {"rows": args.rows, "years": args.years, "seed": args.seed},
+        "load": {"requests_per_route": args.requests, "concurrency": args.concurrency, "cache": args.cache},
+        # ru_maxrss на Linux в КиБ, на macOS в байтах
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "routes": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(results, json.load(f), args.threshold)
+        exit_code = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
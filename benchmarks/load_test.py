@@ -0,0 +1,145 @@
+# benchmarks/load_test.py - нагрузочный тест sync- и async-режима API (DB_MODE)
+#
+#   python benchmarks/load_test.py [--clients 300] [--duration 15] [--rows 20000] [--modes sync async]
+#
+# Для каждого режима поднимает uvicorn на одной и той же заполненной SQLite
+# базе (кэш ответов выключен, чтобы мерить именно путь к БД) и гоняет по
+# нему --clients одновременных клиентов. Печатает пропускную способность
+# и задержки p50/p95/p99.
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="mood_flow_load_"), "load.db")
+DATABASE_URL = f"sqlite:///{DB_PATH}"
+MOOD_TYPES = ["happy", "calm", "sad", "angry", "excited", "tired"]
+
+
+def seed(rows):
+    os.environ["DATABASE_URL"] = DATABASE_URL
+    sys.path.append(ROOT)
+    from app.database import SessionLocal, create_tables
+    from app.crud.mood import create_mood_entries_bulk
+    from app.schemas.mood import MoodBulkItem
+
+    create_tables()
+    rng = random.Random(7)
+    start = date.today() - timedelta(days=365)
+    items = [
+        (i, MoodBulkItem(
+            mood_type=rng.choice(MOOD_TYPES),
+            mood_score=rng.randint(1, 5),
+            date=start + timedelta(days=rng.randrange(366)),
+        ))
+        for i in range(rows)
+    ]
+    db = SessionLocal()
+    try:
+        create_mood_entries_bulk(db, items)
+    finally:
+        db.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port):
+    env = dict(os.environ, DATABASE_URL=DATABASE_URL, DB_MODE=mode, RESPONSE_CACHE_SIZE="0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"uvicorn ({mode}) не поднялся")
+
+
+def request_mix(rng, today):
+    """Смесь запросов: список, запись по id, статистика за месяц, календарь"""
+    roll = rng.random()
+    if roll < 0.4:
+        return "/moods/", {"limit": 20}
+    if roll < 0.7:
+        return f"/moods/{rng.randint(1, 1000)}", None
+    if roll < 0.9:
+        return "/moods/statistics/", {"start_date": (today - timedelta(days=30)).isoformat(), "end_date": today.isoformat()}
+    return "/moods/calendar/", {"include_entries": "false"}
+
+
+async def run_clients(port, clients, duration):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def worker(seed_value):
+            nonlocal errors
+            rng = random.Random(seed_value)
+            today = date.today()
+            while time.perf_counter() < stop_at:
+                path, params = request_mix(rng, today)
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, params=params)
+                    if response.status_code >= 500: errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values[0] if values else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест sync/async режимов")
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=["sync", "async"])
+    args = parser.parse_args()
+
+    seed(args.rows)
+    print(f"🗄  База: {DB_PATH} ({args.rows} записей), клиентов: {args.clients}, {args.duration:.0f} с на режим\n")
+
+    for mode in args.modes:
+        port = free_port()
+        server = start_server(mode, port)
+        try:
+            latencies, errors, elapsed = asyncio.run(run_clients(port, args.clients, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{mode:>5}: {len(latencies) / elapsed:8.1f} запр/с | "
+              f"p50 {percentile(latencies, 50) * 1000:7.1f} мс | "
+              f"p95 {percentile(latencies, 95) * 1000:7.1f} мс | "
+              f"p99 {percentile(latencies, 99) * 1000:7.1f} мс | ошибок: {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# conftest.py - общие фикстуры поведенческих тестов
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+
+# До первого импорта app: движки создаются из DATABASE_URL при импорте,
+# и тесты (и скрипты test_API.py, test_database.py) не должны трогать ./mood_flow.db
+TEST_DIR = tempfile.mkdtemp(prefix="mood_flow_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'mood_flow.db')}"
+os.environ["ARCHIVE_DIR"] = os.path.join(TEST_DIR, "archive")
+os.environ.pop("DATABASE_REPLICA_URL", None)
+
+
+def alembic_config() -> Config:
+    return Config(os.path.join(ROOT, "alembic.ini"))
+
+
+def pytest_configure(config):
+    # Схема общей тестовой базы - из миграций, как в production
+    command.upgrade(alembic_config(), "head")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """
+    Чистая SQLite база из миграций, на которую смотрят сессии приложения
+
+    Подменяются фабрики сессий app.database (их используют get_user_db,
+    session_for и manage.py), кэш ответов сбрасывается, архив - во
+    временном каталоге. Возвращает фабрику сессий.
+    """
+    from app import database
+    from app.archive import archive_store
+    from app.cache import response_cache
+
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    command.upgrade(alembic_config(), "head")
+
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    sessions = sessionmaker(bind=engine, autoflush=False)
+    monkeypatch.setattr(database, "SessionLocal", sessions)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessions)
+    monkeypatch.setattr(archive_store, "directory", str(tmp_path / "archive"))
+    archive_store.reset()
+    response_cache.clear()
+    yield sessions
+    archive_store.reset()
+    response_cache.clear()
+    engine.dispose()
+
+
+@pytest.fixture
+def client(app_db):
+    """TestClient без lifespan: схема уже создана миграциями"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    return TestClient(app)
@@ -0,0 +1,122 @@
+# manage.py - служебные команды Mood Flow
+#
+#   python manage.py rebuild-rollup [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+#   python manage.py rebuild-search
+#   python manage.py compact-tombstones [--days N]
+#   python manage.py archive [--keep-months N | --before YYYY-MM]
+#   python manage.py build-static
+import argparse
+import os
+from datetime import date, datetime, timedelta
+
+from app.database import create_tables
+from app.tenancy import user_sessions
+
+
+def rebuild_rollup(args):
+    from app.crud.rollup import rebuild_daily_rollup
+
+    # При SHARDING=true - по очереди в каждом шарде
+    rows = 0
+    for db in user_sessions():
+        try:
+            rows += rebuild_daily_rollup(db, args.start, args.end)
+        finally:
+            db.close()
+    print(f"✅ mood_daily_rollup пересчитана: {rows} строк агрегатов")
+
+
+def rebuild_search(args):
+    from app.crud.search import rebuild_search_index
+
+    for db in user_sessions():
+        try:
+            rebuild_search_index(db)
+        finally:
+            db.close()
+    print("✅ Полнотекстовый индекс заметок пересобран")
+
+
+def compact_tombstones(args):
+    from app.crud.sync import compact_tombstones as compact
+
+    older_than = datetime.now() - timedelta(days=args.days)
+    removed = 0
+    for db in user_sessions():
+        try:
+            removed += compact(db, older_than)
+            db.commit()
+        finally:
+            db.close()
+    print(f"✅ Удалено надгробий старше {args.days} дн.: {removed}")
+
+
+def archive(args):
+    from app.crud.archive import archive_closed_months
+
+    if args.before:
+        before = date.fromisoformat(args.before + "-01")
+    else:
+        # Первое число месяца, который был keep_months месяцев назад
+        today = date.today()
+        months = today.year * 12 + today.month - 1 - args.keep_months
+        before = date(months // 12, months % 12 + 1, 1)
+    months = moved = 0
+    for db in user_sessions():
+        try:
+            archived = archive_closed_months(db, before)
+        finally:
+            db.close()
+        months += archived[0]
+        moved += archived[1]
+    print(f"✅ В архив до {before:%Y-%m} перенесено записей: {moved} (месяцев: {months})")
+
+
+def build_static(args):
+    from app.static_assets import DIST_DIR, brotli, build_static as build
+
+    manifest = build()
+    for original, hashed in manifest.items():
+        print(f"  {original} -> {hashed}")
+    print(f"✅ Статика собрана в {DIST_DIR} ({'gzip + brotli' if brotli else 'gzip'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Служебные команды Mood Flow")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rollup = commands.add_parser("rebuild-rollup", help="Пересчитать дневные агрегаты из mood_entries")
+    rollup.add_argument("--start", type=date.fromisoformat, default=None, help="Начальная дата (YYYY-MM-DD)")
+    rollup.add_argument("--end", type=date.fromisoformat, default=None, help="Конечная дата (YYYY-MM-DD)")
+    rollup.set_defaults(handler=rebuild_rollup)
+
+    search = commands.add_parser("rebuild-search", help="Пересобрать полнотекстовый индекс заметок")
+    search.set_defaults(handler=rebuild_search)
+
+    tombstones = commands.add_parser("compact-tombstones", help="Удалить старые надгробия удаленных записей")
+    tombstones.add_argument(
+        "--days", type=int, default=int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30")),
+        help="Сколько дней хранить надгробия (клиенты, не синхронизировавшиеся дольше, получат 410)"
+    )
+    tombstones.set_defaults(handler=compact_tombstones)
+
+    archive_parser = commands.add_parser("archive", help="Перенести закрытые месяцы из mood_entries в сегменты архива")
+    cutoff = archive_parser.add_mutually_exclusive_group()
+    cutoff.add_argument(
+        "--keep-months", type=int, default=int(os.getenv("ARCHIVE_KEEP_MONTHS", "12")),
+        help="Сколько последних месяцев (кроме текущего) оставить в таблице"
+    )
+    cutoff.add_argument("--before", default=None, help="Архивировать месяцы раньше этого (YYYY-MM)")
+    archive_parser.set_defaults(handler=archive)
+
+    static = commands.add_parser("build-static", help="Собрать статику: хэши в именах и сжатые копии")
+    static.set_defaults(handler=build_static, skip_db=True)
+
+    args = parser.parse_args()
+    if not getattr(args, "skip_db", False):
+        create_tables()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# test_admission.py - допуск тяжелых запросов: очередь, таймауты, бюджет строк
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from app import admission as admission_module
+from app.admission import STATEMENT_TIMEOUT_KEY, AdmissionController, AdmissionGate, AdmissionRejected
+from app.api import moods as api_moods
+from app.cache import response_cache
+from app.crud import mood as crud_mood
+
+
+async def settle():
+    # Дать выполниться переданным через call_soon_threadsafe слотам
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_full_queue_is_rejected_with_429():
+    async def scenario():
+        gate = AdmissionGate("statistics", limit=1, queue_size=1, max_wait=5)
+        await gate.acquire()
+        queued = asyncio.ensure_future(gate.acquire())
+        await settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire()
+        assert (rejected.value.status_code, rejected.value.reason, rejected.value.retry_after) == (429, "queue_full", 1)
+
+        # Освобожденный слот переходит ожидающему, in_flight не меняется
+        gate.release()
+        await queued
+        assert gate.in_flight == 1
+        gate.release()
+        assert gate.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiting_past_max_wait_is_a_503():
+    async def scenario():
+        gate = AdmissionGate("analytics", limit=1, queue_size=4, max_wait=0.05)
+        await gate.acquire()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire()
+        assert (rejected.value.status_code, rejected.value.reason, rejected.value.retry_after) == (503, "wait_timeout", 1)
+        assert gate.in_flight == 1 and not gate._waiters
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_to_a_cancelled_waiter_moves_on():
+    async def scenario():
+        gate = AdmissionGate("export", limit=1, queue_size=4, max_wait=5)
+        await gate.acquire()
+        gone = asyncio.ensure_future(gate.acquire())
+        next_in_line = asyncio.ensure_future(gate.acquire())
+        await settle()
+
+        # Клиент первого ожидающего ушел, а слот ему передали раньше, чем он проснулся
+        gone.cancel()
+        gate.release()
+        await settle()
+
+        assert gone.cancelled()
+        await asyncio.wait_for(next_in_line, 1)
+        assert gate.in_flight == 1
+        gate.release()
+        assert gate.in_flight == 0 and not gate._waiters
+
+    asyncio.run(scenario())
+
+
+def test_waiter_cancelled_before_the_hand_off_leaves_the_queue():
+    async def scenario():
+        gate = AdmissionGate("export", limit=1, queue_size=4, max_wait=5)
+        await gate.acquire()
+        gone = asyncio.ensure_future(gate.acquire())
+        await settle()
+
+        gone.cancel()
+        await settle()
+        assert not gate._waiters
+
+        gate.release()
+        assert gate.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def seed(client, count, day="2026-03-01"):
+    items = [{"mood_type": "calm", "mood_score": 3, "date": day} for _ in range(count)]
+    assert client.post("/moods/bulk", json=items).json()["inserted"] == count
+
+
+def test_endpoint_rejects_when_the_class_is_saturated(client, monkeypatch):
+    controller = AdmissionController(enabled=True, limits={"calendar": 1})
+    controller.gates["calendar"].queue_size = 0
+    monkeypatch.setattr(admission_module, "admission", controller)
+
+    url = "/moods/calendar/day/2026-03-01"
+    assert client.get(url).status_code == 200
+    asyncio.run(controller.gates["calendar"].acquire())  # слот занят другим запросом
+
+    response = client.get("/moods/calendar/day/2026-03-02")
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    controller.gates["calendar"].release()
+    assert client.get("/moods/calendar/day/2026-03-02").status_code == 200
+
+
+def test_statement_timeout_is_a_503(client, monkeypatch):
+    def endless(db, day, user_id, row_budget=None):
+        # Таймаут класса calendar поставлен на ту сессию, которую читает эндпоинт
+        assert db.info[STATEMENT_TIMEOUT_KEY] == admission_module.STATEMENT_TIMEOUTS_MS["calendar"]
+        db.info[STATEMENT_TIMEOUT_KEY] = 50
+        db.execute(text("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT count(*) FROM n"))
+
+    monkeypatch.setattr(crud_mood, "get_mood_day_details", endless)
+
+    response = client.get("/moods/calendar/day/2026-03-01")
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert "time budget" in response.json()["detail"]
+
+
+def test_row_budget_degrades_to_aggregates(client, monkeypatch):
+    seed(client, 3)
+    monkeypatch.setattr(api_moods, "QUERY_ROW_BUDGET", 2)
+
+    statistics = client.get("/moods/statistics/", params={"start_date": "2026-03-01", "end_date": "2026-03-01", "include_entries": "true"}).json()
+    day = client.get("/moods/calendar/day/2026-03-01").json()
+
+    assert statistics["degraded"] == ["entries_data"]
+    assert statistics["total_entries"] == 3
+    assert day["degraded"] == ["entries"] and day["entries"] == []
+
+    monkeypatch.setattr(api_moods, "QUERY_ROW_BUDGET", 3)
+    response_cache.clear()
+    assert "degraded" not in client.get("/moods/calendar/day/2026-03-01").json()
@@ -0,0 +1,183 @@
+# test_archive.py - перенос закрытых месяцев в сегменты: ответы API (включая
+# синхронизацию и поиск) не меняются
+from datetime import date, datetime
+
+import pytest
+
+from app.archive import archive_store
+from app.cache import response_cache
+from app.crud.archive import ArchiveIdCollision, archive_closed_months
+from app.models.mood import MoodEntry
+
+BEFORE = date(2026, 3, 1)
+READS = [
+    "/moods/statistics/?start_date=2026-01-01&end_date=2026-03-31&include_entries=true&limit=1000",
+    "/moods/calendar/?year=2026&month=1",
+    "/moods/calendar/?year=2026&month=2&compact=true",
+    "/moods/calendar/day/2026-02-14",
+    "/moods/heatmap/?year=2026",
+    "/moods/export",
+    "/moods/export?format=csv&mood_type=calm",
+    "/moods/?limit=100",
+    "/moods/?limit=100&date_filter=2026-02-14",
+]
+
+
+def seed(client, rows):
+    items = [
+        {"mood_type": mood_type, "mood_score": score, "notes": notes, "date": day, "created_at": f"{day}T{hour:02d}:00:00"}
+        for day, hour, mood_type, score, notes in rows
+    ]
+    assert client.post("/moods/bulk", json=items).json()["inserted"] == len(items)
+
+
+def snapshot(client):
+    """Ответы чтений (JSON - разобранный: порядок ключей словарей не важен)"""
+    response_cache.clear()
+    responses = {url: client.get(url) for url in READS}
+    return {url: response.json() if response.headers["content-type"] == "application/json" else response.text for url, response in responses.items()}
+
+
+def archive(app_db):
+    with app_db() as db:
+        return archive_closed_months(db, BEFORE)
+
+
+@pytest.fixture
+def history(client):
+    seed(client, [
+        ("2026-01-05", 9, "calm", 3, "январь"),
+        ("2026-01-05", 21, "happy", 5, None),
+        ("2026-02-14", 12, "calm", 4, "февраль"),
+        ("2026-02-14", 12, "sad", 2, "тот же час"),
+        ("2026-02-28", 8, "happy", 4, ""),
+        ("2026-03-02", 10, "calm", 3, "живая"),
+    ])
+    return client
+
+
+def test_reads_are_unchanged_by_archiving(history, app_db):
+    before = snapshot(history)
+
+    assert archive(app_db) == (2, 5)
+
+    assert snapshot(history) == before
+    with app_db() as db:
+        assert db.query(MoodEntry).count() == 1
+
+
+def changes(client, since=0, after_id=None, limit=100):
+    response = client.get("/moods/changes", params={"since": since, "limit": limit, **({"after_id": after_id} if after_id is not None else {})})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_full_resync_includes_archived_entries(history, app_db):
+    full = changes(history)
+    synced = full["version"]
+
+    archive(app_db)
+    history.post("/moods/", json={"mood_type": "calm", "mood_score": 2, "notes": "после архивации"})
+
+    # Архивация - не удаление: надгробий нет, клиент с курсором видит только новое
+    delta = changes(history, since=synced)
+    assert [entry["notes"] for entry in delta["changes"]] == ["после архивации"]
+    assert delta["deleted"] == []
+    # Полная выгрузка (и постранично) - те же записи, что до архивации
+    resync, pages, since, after_id = [], 0, 0, None
+    while True:
+        page = changes(history, since, after_id, limit=2)
+        resync += page["changes"]
+        pages += 1
+        if not page["has_more"]: break
+        since, after_id = page["since"], page["after_id"]
+    assert pages == 4
+    assert [entry for entry in resync if entry["notes"] != "после архивации"] == full["changes"]
+    keys = [(entry["version"], entry["id"]) for entry in resync]
+    assert keys == sorted(keys) and len(set(keys)) == 7
+
+
+def test_search_finds_archived_notes_after_live_ones(history, app_db):
+    history.post("/moods/", json={"mood_type": "calm", "mood_score": 3, "notes": "тот самый день"})
+    archive(app_db)
+
+    results = history.get("/moods/search", params={"q": "тот"}).json()
+
+    assert [(entry["notes"], entry["rank"] == 0) for entry in results] == [("тот самый день", False), ("тот же час", True)]
+    assert history.get("/moods/search", params={"q": "фев"}).json()[0]["notes"] == "февраль"
+    assert history.get("/moods/search", params={"q": "тот", "skip": 1}).json()[0]["notes"] == "тот же час"
+    assert history.get("/moods/search", params={"q": "тот", "max_score": 1}).json() == []
+
+
+def test_rearchiving_a_month_merges_new_entries(history, app_db):
+    archive(app_db)
+    seed(history, [("2026-02-20", 7, "calm", 1, "дописана после архивации")])
+    before = snapshot(history)
+
+    assert archive(app_db) == (1, 1)
+
+    assert snapshot(history) == before
+    exported = history.get("/moods/export").text.splitlines()
+    assert len(exported) == 7
+
+
+def test_archived_entries_are_readable_by_id_and_read_only(history, app_db):
+    entries = {entry["notes"]: entry for entry in history.get("/moods/").json()}
+    archived, live = entries["февраль"], entries["живая"]
+    archive(app_db)
+
+    assert history.get(f"/moods/{archived['id']}").json() == archived
+    assert history.put(f"/moods/{archived['id']}", json={"notes": "правка"}).status_code == 409
+    assert history.delete(f"/moods/{archived['id']}").status_code == 409
+    assert history.post("/moods/bulk/delete", json={"end_date": "2026-02-28"}).status_code == 409
+    assert history.post("/moods/bulk/retag", json={"new_mood_type": "ok", "mood_type": "calm"}).status_code == 409
+    # Операции только по живым месяцам работают как раньше
+    assert history.post("/moods/bulk/retag", json={"new_mood_type": "ok", "start_date": "2026-03-01"}).json() == {"affected": 1}
+    assert history.delete(f"/moods/{live['id']}").status_code == 204
+    assert history.get("/moods/999").status_code == 404
+
+
+def test_paging_crosses_into_the_archive(history, app_db):
+    archive(app_db)
+    seed(history, [("2026-02-14", 12, "calm", 4, "живая с тем же временем")])
+
+    pages, cursor = [], None
+    while True:
+        response = history.get("/moods/", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        pages.append(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor: break
+
+    entries = [entry for page in pages for entry in page]
+    assert len(entries) == len({entry["id"] for entry in entries}) == 7
+    keys = [(entry["created_at"], entry["id"]) for entry in entries]
+    assert keys == sorted(keys, reverse=True)
+    assert [entry["id"] for entry in history.get("/moods/", params={"skip": 2, "limit": 3}).json()] == [entry["id"] for entry in entries[2:5]]
+
+
+def test_new_entries_never_reuse_archived_ids(history, app_db):
+    archived_ids = {entry["id"] for entry in history.get("/moods/").json()}
+    archive(app_db)
+    history.delete(f"/moods/{max(archived_ids)}")
+
+    created = history.post("/moods/", json={"mood_type": "calm", "mood_score": 3}).json()
+
+    assert created["id"] > max(archived_ids)
+
+
+@pytest.mark.parametrize("day", [date(2026, 2, 10), date(2026, 1, 10)])
+def test_reused_id_is_not_archived_over_another_entry(history, app_db, day):
+    archive(app_db)
+    archived = history.get("/moods/?date_filter=2026-02-14").json()[0]
+    # Запись с id архивной (как до AUTOINCREMENT) в том же или другом месяце
+    with app_db() as db:
+        db.add(MoodEntry(id=archived["id"], user_id="default", version=0, date=day, created_at=datetime(2026, 1, 1), mood_type="calm", mood_score=1))
+        db.commit()
+
+    with pytest.raises(ArchiveIdCollision):
+        archive(app_db)
+
+    with app_db() as db:
+        assert db.query(MoodEntry).filter(MoodEntry.id == archived["id"]).count() == 1
+    kept = archive_store.find("default", archived["id"])
+    assert (kept.notes, kept.created_at.isoformat()) == (archived["notes"], archived["created_at"])
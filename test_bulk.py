@@ -0,0 +1,50 @@
+# test_bulk.py - массовый импорт: потоковый NDJSON, ошибки по строкам, лимиты
+import json
+
+from app.api import moods as api_moods
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+def ndjson_lines(count, day="2026-03-01"):
+    return [json.dumps({"mood_type": "calm", "mood_score": 3, "notes": f"#{index}", "date": day}).encode() + b"\n" for index in range(count)]
+
+
+def stream(lines, piece=7):
+    """Тело кусками, не совпадающими с границами строк"""
+    body = b"".join(lines)
+    for start in range(0, len(body), piece):
+        yield body[start:start + piece]
+
+
+def test_ndjson_stream_inserts_valid_lines_and_reports_bad_ones(client):
+    lines = ndjson_lines(3)
+    lines.insert(1, b"{oops\n")
+    lines.insert(3, b'{"mood_type": "calm", "mood_score": 9, "date": "2026-03-01"}\n')
+
+    response = client.post("/moods/bulk", content=stream(lines), headers=NDJSON)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["inserted"] == 3
+    assert [error["index"] for error in response.json()["errors"]] == [1, 3]
+    assert sorted(entry["notes"] for entry in client.get("/moods/").json()) == ["#0", "#1", "#2"]
+
+
+def test_ndjson_over_item_cap_is_rejected_and_rolled_back(client, monkeypatch):
+    monkeypatch.setattr(api_moods, "BULK_MAX_ITEMS", 4)
+    monkeypatch.setattr(api_moods.crud_mood, "BULK_CHUNK_SIZE", 2)
+
+    response = client.post("/moods/bulk", content=stream(ndjson_lines(5)), headers=NDJSON)
+
+    assert response.status_code == 413
+    assert client.get("/moods/").json() == []
+
+
+def test_body_over_byte_cap_is_rejected_while_reading(client, monkeypatch):
+    lines = ndjson_lines(50)
+    monkeypatch.setattr(api_moods, "BULK_MAX_BYTES", len(b"".join(lines)) - 1)
+
+    # Без Content-Length: лимит проверяется по мере чтения потока
+    assert client.post("/moods/bulk", content=stream(lines), headers=NDJSON).status_code == 413
+    assert client.post("/moods/bulk", content=b"".join(lines), headers=NDJSON).status_code == 413
+    assert client.get("/moods/").json() == []
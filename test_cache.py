@@ -0,0 +1,63 @@
+# test_cache.py - кэшированные ответы сбрасываются после изменения записей
+from datetime import date
+
+
+def create_entry(client, notes, headers=None):
+    response = client.post("/moods/", json={"mood_type": "happy", "mood_score": 4, "notes": notes}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_notes_edit_refreshes_day_details(client):
+    entry = create_entry(client, "до")
+    url = f"/moods/calendar/day/{entry['date'][:10]}"
+    first = client.get(url)
+    assert [item["notes"] for item in first.json()["entries"]] == ["до"]
+    assert client.get(url, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    assert client.put(f"/moods/{entry['id']}", json={"notes": "после"}).status_code == 200
+
+    second = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+    assert [item["notes"] for item in second.json()["entries"]] == ["после"]
+
+
+def test_notes_edit_refreshes_only_own_calendar(client):
+    alice, bob = {"X-User-Id": "alice"}, {"X-User-Id": "bob"}
+    entry = create_entry(client, "до", alice)
+    create_entry(client, "чужая", bob)
+    today = date.fromisoformat(entry["date"][:10])
+    url = f"/moods/calendar/?year={today.year}&month={today.month}&include_entries=true"
+    alice_first, bob_first = client.get(url, headers=alice), client.get(url, headers=bob)
+
+    assert client.put(f"/moods/{entry['id']}", json={"notes": "после"}, headers=alice).status_code == 200
+
+    alice_second = client.get(url, headers={**alice, "If-None-Match": alice_first.headers["etag"]})
+    assert alice_second.status_code == 200
+    assert [item["notes"] for item in alice_second.json()["calendar"][today.isoformat()]["entries"]] == ["после"]
+    # Кэш другого пользователя правка не трогает
+    assert client.get(url, headers={**bob, "If-None-Match": bob_first.headers["etag"]}).status_code == 304
+
+
+def test_cached_reads_ignore_a_lagging_replica(client, app_db, monkeypatch, tmp_path):
+    from alembic import command
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app import database
+    from conftest import alembic_config
+
+    # Реплика, до которой запись еще не дошла: пустая база с той же схемой
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    command.upgrade(alembic_config(), "head")
+    replica = create_engine(url)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=replica, autoflush=False))
+
+    entry = create_entry(client, "на основной")
+    url = f"/moods/calendar/day/{entry['date'][:10]}"
+
+    assert [item["notes"] for item in client.get(url).json()["entries"]] == ["на основной"]
+    assert [item["notes"] for item in client.get(url).json()["entries"]] == ["на основной"]
+    replica.dispose()
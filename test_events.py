@@ -0,0 +1,69 @@
+# test_events.py - SSE-хаб: события после записей, отключение медленного клиента
+import asyncio
+
+from app.events import EVENTS_QUEUE_SIZE, RESYNC, EventHub, event_hub, format_event
+
+ALICE = {"X-User-Id": "alice"}
+
+
+async def next_event(subscriber):
+    return await asyncio.wait_for(subscriber.queue.get(), 5)
+
+
+def test_slow_subscriber_is_dropped_with_resync():
+    async def scenario():
+        hub = EventHub(enabled=True)
+        slow, other = hub.subscribe("alice"), hub.subscribe("bob")
+
+        # Публикация не ждет: лишние события вытесняют очередь одним resync
+        for index in range(EVENTS_QUEUE_SIZE + 5):
+            hub.publish("alice", "mood", {"index": index})
+        hub.publish("bob", "mood", {"index": 0})
+        await asyncio.sleep(0)
+
+        assert slow.dropped
+        assert slow.queue.qsize() == 1 and await next_event(slow) == RESYNC
+        hub.publish("alice", "mood", {"index": "after"})
+        await asyncio.sleep(0)
+        assert slow.queue.empty()
+        # Подписчики других пользователей не затронуты
+        assert not other.dropped and await next_event(other) == ("mood", {"index": 0})
+
+        hub.unsubscribe(slow)
+        assert not hub.has_subscribers("alice") and hub.has_subscribers("bob")
+
+    asyncio.run(scenario())
+
+
+def test_writes_reach_subscribers_with_day_totals(client):
+    async def scenario():
+        subscriber = event_hub.subscribe("alice")
+        try:
+            # Запросы - в другом потоке, как у воркеров: publish через call_soon_threadsafe
+            created = (await asyncio.to_thread(client.post, "/moods/", json={"mood_type": "happy", "mood_score": 4}, headers=ALICE)).json()
+            event, data = await next_event(subscriber)
+            assert event == "mood" and data["change"] == "created"
+            assert [entry["id"] for entry in data["entries"]] == [created["id"]]
+            assert data["days"] == [{"date": created["date"][:10], "count": 1, "average": 4.0, "color": 4}]
+
+            await asyncio.to_thread(client.delete, f"/moods/{created['id']}", headers=ALICE)
+            event, data = await next_event(subscriber)
+            assert (event, data["change"], data["days"][0]["count"]) == ("mood", "deleted", 0)
+
+            retag = {"new_mood_type": "calm", "start_date": "2026-03-01", "end_date": "2026-03-01"}
+            await asyncio.to_thread(client.post, "/moods/bulk", json=[{"mood_type": "sad", "mood_score": 2, "date": "2026-03-01"}], headers=ALICE)
+            await asyncio.to_thread(client.post, "/moods/bulk/retag", json=retag, headers=ALICE)
+            events = [(await next_event(subscriber))[0] for _ in range(2)]
+            assert events == ["reload", "reload"]
+            # Записи другого пользователя сюда не попадают
+            await asyncio.to_thread(client.post, "/moods/", json={"mood_type": "calm", "mood_score": 3}, headers={"X-User-Id": "bob"})
+            await asyncio.sleep(0.05)
+            assert subscriber.queue.empty()
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    asyncio.run(scenario())
+
+
+def test_event_frame_is_one_json_line():
+    assert format_event("mood", {"notes": "день"}) == 'event: mood\ndata: {"notes":"день"}\n\n'
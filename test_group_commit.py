@@ -0,0 +1,70 @@
+# test_group_commit.py - групповой коммит POST /moods/: id, пачки, ошибки
+import pytest
+
+from app import group_commit
+from app.api import moods as api_moods
+from app.group_commit import GroupCommitter
+from app.models.mood import MoodEntry
+from app.schemas.mood import MoodCreate
+from test_rollup import assert_matches_rebuild
+
+
+@pytest.fixture
+def committer(app_db):
+    committer = GroupCommitter(window_ms=200, max_batch=3, session_factory=lambda user_id: app_db())
+    yield committer
+    committer.stop()
+
+
+def mood(notes, score=3):
+    return MoodCreate(mood_type="calm", mood_score=score, notes=notes)
+
+
+def test_batches_get_their_own_ids_in_submit_order(committer, app_db):
+    users = ["alice", "bob", "alice", "alice", "bob"]
+    futures = [committer.submit(mood(f"#{index}", index + 1), user_id) for index, user_id in enumerate(users)]
+
+    entries = [future.result(timeout=5) for future in futures]
+
+    assert [entry.notes for entry in entries] == [f"#{index}" for index in range(5)]
+    assert [entry.user_id for entry in entries] == users
+    ids = [entry.id for entry in entries]
+    assert ids == sorted(ids) and len(set(ids)) == 5
+    # max_batch=3: две транзакции, в каждой - одна версия на пользователя
+    assert entries[0].version == entries[2].version
+    assert entries[3].version > entries[2].version
+    assert entries[1].version != entries[4].version
+    with app_db() as db:
+        stored = {row.id: (row.user_id, row.notes, row.version) for row in db.query(MoodEntry)}
+    assert stored == {entry.id: (entry.user_id, entry.notes, entry.version) for entry in entries}
+    assert_matches_rebuild(app_db)
+
+
+def test_failed_batch_fails_every_waiting_request(committer, app_db, monkeypatch):
+    def broken(db, deltas):
+        raise RuntimeError("rollup is down")
+
+    monkeypatch.setattr(group_commit, "apply_rollup_deltas", broken)
+    futures = [committer.submit(mood(f"#{index}"), "alice") for index in range(2)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="rollup is down"):
+            future.result(timeout=5)
+    with app_db() as db:
+        assert db.query(MoodEntry).count() == 0
+
+    # Поток пережил ошибку: следующая пачка коммитится
+    monkeypatch.undo()
+    assert committer.submit(mood("после ошибки"), "alice").result(timeout=5).id is not None
+
+
+def test_endpoint_answers_with_the_committed_entry(client, committer, monkeypatch):
+    monkeypatch.setattr(api_moods, "GROUP_COMMIT", True)
+    monkeypatch.setattr(api_moods, "group_committer", committer)
+
+    response = client.post("/moods/", json={"mood_type": "happy", "mood_score": 5, "notes": "пачкой"}, headers={"X-User-Id": "alice"})
+
+    assert response.status_code == 201, response.text
+    created = response.json()
+    assert created["id"] > 0 and created["user_id"] == "alice"
+    assert client.get(f"/moods/{created['id']}", headers={"X-User-Id": "alice"}).json() == created
@@ -0,0 +1,18 @@
+# test_metrics.py - учет времени SQL
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.metrics import DB_QUERIES
+
+
+def test_failed_statements_leave_no_timing_state():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+        before = DB_QUERIES.value()
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert DB_QUERIES.value() == before + 1
+        assert not any("start" in str(key) for key in conn.info)
@@ -0,0 +1,85 @@
+# test_paging.py - keyset-пагинация GET /moods/ по курсору X-Next-Cursor
+import base64
+
+import pytest
+
+
+def seed(client, created_at_values):
+    items = [
+        {"mood_type": "calm", "mood_score": 3, "notes": f"#{index}", "date": created_at[:10], "created_at": created_at}
+        for index, created_at in enumerate(created_at_values)
+    ]
+    assert client.post("/moods/bulk", json=items).json()["inserted"] == len(items)
+
+
+def all_pages(client, limit, **params):
+    """Пройти все страницы; список страниц"""
+    pages, cursor = [], None
+    while True:
+        response = client.get("/moods/", params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor: return pages
+
+
+def test_pages_cover_all_entries_once_in_order(client):
+    # Много записей с одинаковым created_at: порядок задает id
+    seed(client, ["2026-03-01T10:00:00"] * 7 + ["2026-03-02T09:00:00"] * 3 + ["2026-02-28T23:00:00"] * 2)
+
+    pages = all_pages(client, limit=3)
+
+    entries = [entry for page in pages for entry in page]
+    assert [len(page) for page in pages] == [3, 3, 3, 3]
+    assert len({entry["id"] for entry in entries}) == 12
+    keys = [(entry["created_at"], entry["id"]) for entry in entries]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_new_entries_do_not_shift_later_pages(client):
+    seed(client, ["2026-03-01T10:00:00"] * 6)
+    first = client.get("/moods/", params={"limit": 2})
+    seed(client, ["2026-03-05T10:00:00"] * 2)
+
+    rest = all_pages(client, limit=2, cursor=first.headers["x-next-cursor"])
+
+    ids = [entry["id"] for entry in first.json()] + [entry["id"] for page in rest for entry in page]
+    assert len(ids) == len(set(ids)) == 6
+
+
+def test_filters_apply_across_pages(client):
+    seed(client, ["2026-03-01T10:00:00"] * 5 + ["2026-03-02T10:00:00"] * 4)
+
+    pages = all_pages(client, limit=2, date_filter="2026-03-01")
+
+    assert sum(len(page) for page in pages) == 5
+    assert {entry["date"][:10] for page in pages for entry in page} == {"2026-03-01"}
+
+
+def encode(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", ["!!!", encode(b"2026-03-01T10:00:00"), encode(b"yesterday|5"), encode(b"2026-03-01T10:00:00|x"), encode(b"\xff\xfe")])
+def test_bad_cursor_is_rejected(client, cursor):
+    response = client.get("/moods/", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_entries_without_created_at_are_paged_last(client, app_db):
+    from sqlalchemy import update
+    from app.models.mood import MoodEntry
+
+    seed(client, ["2026-03-01T10:00:00"] * 3 + ["2026-03-01T11:00:00"] * 3)
+    # created_at = NULL (строки до появления колонки): у модели есть default
+    with app_db() as db:
+        db.execute(update(MoodEntry).where(MoodEntry.created_at > "2026-03-01 10:30:00").values(created_at=None))
+        db.commit()
+
+    pages = all_pages(client, limit=2)
+
+    entries = [entry for page in pages for entry in page]
+    assert len(entries) == len({entry["id"] for entry in entries}) == 6
+    assert [entry["created_at"] is None for entry in entries] == [False] * 3 + [True] * 3
+    assert [entry["id"] for entry in entries[3:]] == sorted((entry["id"] for entry in entries[3:]), reverse=True)
@@ -0,0 +1,104 @@
+# test_query_plans.py - проверка, что горячие запросы CRUD идут по индексам
+import os
+import sys
+from datetime import date, datetime
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.crud import analytics as crud_analytics
+from app.crud import mood as crud_mood
+from app.crud import search as crud_search
+from app.crud import sync as crud_sync
+
+CURSOR = crud_mood.encode_cursor(crud_mood.MoodEntry(id=42, created_at=datetime(2024, 3, 1, 12, 0)))
+
+
+@pytest.fixture
+def migrated_db(tmp_path, monkeypatch):
+    """Чистая SQLite база, созданная только миграциями Alembic"""
+    url = f"sqlite:///{tmp_path / 'plans.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    command.upgrade(config, "head")
+
+    engine = create_engine(url)
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    db = sessionmaker(bind=engine)()
+    yield db, engine, statements
+    db.close()
+    engine.dispose()
+
+
+def query_plan(engine, statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def assert_indexed(engine, statements):
+    assert statements, "CRUD-функция не выполнила ни одного SELECT"
+    for statement, parameters in statements:
+        for detail in query_plan(engine, statement, parameters):
+            if not detail.startswith(("SCAN", "SEARCH")) or "SUBQUERY" in detail:
+                continue
+            # FTS5 с MATCH-ограничением (M в idxStr) читает только свой индекс
+            if "VIRTUAL TABLE INDEX" in detail and ":M" in detail:
+                continue
+            assert "USING" in detail and "INDEX" in detail or "INTEGER PRIMARY KEY" in detail, (
+                f"Полное сканирование таблицы: {detail!r}\n{statement}"
+            )
+
+
+@pytest.mark.parametrize("call", [
+    lambda db: crud_mood.get_mood_entries(db),
+    lambda db: crud_mood.get_mood_entries(db, date_filter=date(2024, 3, 1)),
+    lambda db: crud_mood.get_mood_entries(db, mood_type_filter="happy"),
+    lambda db: crud_mood.get_mood_entries(db, date_filter=date(2024, 3, 1), mood_type_filter="happy"),
+    lambda db: crud_mood.get_mood_entries(db, cursor=CURSOR),
+    lambda db: crud_mood.get_mood_entries(db, date_filter=date(2024, 3, 1), cursor=CURSOR),
+    lambda db: crud_mood.get_mood_entry_by_id(db, 1),
+    lambda db: crud_mood.get_mood_statistics(db, date(2024, 1, 1), date(2024, 12, 31), include_entries=True),
+    lambda db: crud_mood.get_mood_calendar_data(db, 2024, 3),
+    lambda db: crud_mood.get_mood_calendar_compact(db, 2024, 3),
+    lambda db: crud_mood.get_mood_day_details(db, date(2024, 3, 1)),
+    lambda db: crud_mood.get_mood_heatmap(db, date(2023, 1, 1), date(2024, 12, 31)),
+    lambda db: crud_analytics.get_mood_analytics(db, date(2015, 1, 1), date(2024, 12, 31)),
+    lambda db: crud_search.search_mood_entries(db, "прогулка парк", date(2024, 1, 1), date(2024, 12, 31), min_score=3),
+    lambda db: crud_sync.get_changes(db, since=7),
+    lambda db: crud_sync.get_changes(db, since=7, after_id=42),
+], ids=[
+    "list", "list_by_date", "list_by_type", "list_by_date_and_type",
+    "list_by_cursor", "list_by_date_and_cursor",
+    "by_id", "statistics", "calendar", "calendar_compact", "calendar_day", "heatmap", "analytics", "search",
+    "changes", "changes_by_cursor",
+])
+def test_crud_queries_use_indexes(migrated_db, call):
+    db, engine, statements = migrated_db
+    call(db)
+    assert_indexed(engine, statements)
+
+
+def test_list_ordering_needs_no_sort(migrated_db):
+    db, engine, statements = migrated_db
+    crud_mood.get_mood_entries(db, date_filter=date(2024, 3, 1))
+    plan = [d for s, p in statements for d in query_plan(engine, s, p)]
+    assert not any("TEMP B-TREE FOR ORDER BY" in d for d in plan), plan
+
+
+def test_changes_ordering_needs_no_sort(migrated_db):
+    db, engine, statements = migrated_db
+    crud_sync.get_changes(db, since=7, after_id=42)
+    plan = [d for s, p in statements for d in query_plan(engine, s, p)]
+    assert not any("TEMP B-TREE FOR ORDER BY" in d for d in plan), plan
@@ -0,0 +1,56 @@
+# test_rollup.py - инкрементальные агрегаты mood_daily_rollup совпадают с пересчетом
+from app.crud.rollup import rebuild_daily_rollup
+from app.models.mood import MoodDailyRollup
+
+ALICE, BOB = {"X-User-Id": "alice"}, {"X-User-Id": "bob"}
+
+
+def rollup_rows(sessions):
+    with sessions() as db:
+        return sorted(
+            (row.user_id, row.day, row.mood_type, row.mood_score, row.entries_count, row.score_sum)
+            for row in db.query(MoodDailyRollup)
+        )
+
+
+def assert_matches_rebuild(sessions):
+    maintained = rollup_rows(sessions)
+    with sessions() as db:
+        rebuild_daily_rollup(db)
+    assert maintained == rollup_rows(sessions)
+
+
+def bulk(client, headers, *rows):
+    items = [{"mood_type": mood_type, "mood_score": score, "date": day} for day, mood_type, score in rows]
+    response = client.post("/moods/bulk", json=items, headers=headers)
+    assert response.json()["inserted"] == len(items), response.text
+
+
+def test_rollup_follows_every_mutation(client, app_db):
+    created = client.post("/moods/", json={"mood_type": "happy", "mood_score": 5}, headers=ALICE).json()
+    client.post("/moods/", json={"mood_type": "happy", "mood_score": 5}, headers=BOB)
+    assert_matches_rebuild(app_db)
+
+    bulk(client, ALICE, ("2026-03-01", "calm", 3), ("2026-03-01", "calm", 3), ("2026-03-02", "sad", 2), ("2026-03-03", "calm", 4))
+    bulk(client, BOB, ("2026-03-01", "calm", 3))
+    assert_matches_rebuild(app_db)
+
+    # Смена оценки, типа и только заметок
+    assert client.put(f"/moods/{created['id']}", json={"mood_score": 2}, headers=ALICE).status_code == 200
+    assert_matches_rebuild(app_db)
+    client.put(f"/moods/{created['id']}", json={"mood_type": "sad", "mood_score": 1}, headers=ALICE)
+    client.put(f"/moods/{created['id']}", json={"notes": "только заметки"}, headers=ALICE)
+    assert_matches_rebuild(app_db)
+
+    retag = {"new_mood_type": "sad", "mood_type": "calm", "start_date": "2026-03-01", "end_date": "2026-03-01"}
+    assert client.post("/moods/bulk/retag", json=retag, headers=ALICE).json() == {"affected": 2}
+    assert_matches_rebuild(app_db)
+
+    removed = client.post("/moods/bulk/delete", json={"start_date": "2026-03-02", "end_date": "2026-03-03"}, headers=ALICE)
+    assert removed.json() == {"affected": 2}
+    assert_matches_rebuild(app_db)
+
+    assert client.delete(f"/moods/{created['id']}", headers=ALICE).status_code in (200, 204)
+    assert_matches_rebuild(app_db)
+    # Операции alice не задели агрегаты bob
+    assert [row[0] for row in rollup_rows(app_db)].count("bob") == 2
@@ -0,0 +1,127 @@
+# test_single_flight.py - объединение одинаковых одновременных вычислений
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.single_flight import AsyncSingleFlight, SingleFlight, SingleFlightTimeout
+
+KEY = ("statistics", "alice", 1)
+
+
+def run_concurrently(flight, compute, callers, timeout=None):
+    """Лидер и callers - 1 ожидающих; лидер завершается, когда все вошли в do"""
+    started, release = threading.Event(), threading.Event()
+
+    def leader_compute():
+        started.set()
+        release.wait(5)
+        return compute()
+
+    with ThreadPoolExecutor(callers) as pool:
+        leader = pool.submit(flight.do, KEY, leader_compute)
+        assert started.wait(5)
+        followers = [pool.submit(flight.do, KEY, compute, timeout) for _ in range(callers - 1)]
+        time.sleep(0.2)  # ожидающие успевают присоединиться
+        release.set()
+        return [leader] + followers
+
+
+def test_concurrent_callers_share_one_computation():
+    flight, calls = SingleFlight(enabled=True), []
+
+    futures = run_concurrently(flight, lambda: calls.append(1) or {"total": len(calls)}, callers=4)
+
+    assert [future.result(5) for future in futures] == [{"total": 1}] * 4
+    assert len(calls) == 1
+    # Ключ освобожден: это не кэш
+    assert flight.do(KEY, lambda: "again") == "again"
+
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight(enabled=True)
+
+    def fail():
+        raise ValueError("database is gone")
+
+    futures = run_concurrently(flight, fail, callers=3)
+
+    for future in futures:
+        with pytest.raises(ValueError, match="database is gone"):
+            future.result(5)
+    assert flight.do(KEY, lambda: "recovered") == "recovered"
+
+
+def test_waiter_times_out_without_cancelling_the_leader():
+    flight = SingleFlight(enabled=True)
+
+    leader, follower = run_concurrently(flight, lambda: "slow", callers=2, timeout=0.05)
+
+    with pytest.raises(SingleFlightTimeout):
+        follower.result(5)
+    assert leader.result(5) == "slow"
+
+
+def test_timeouts_per_endpoint():
+    flight = SingleFlight(enabled=True, timeout=30, timeouts={"analytics": 60})
+
+    assert flight.timeout_for("analytics") == 60
+    assert flight.timeout_for("calendar") == 30
+    assert flight.timeout_for("analytics", 5) == 5
+
+
+def test_async_waiters_share_result_and_survive_leader_cancellation():
+    async def scenario():
+        flight, calls, release = AsyncSingleFlight(enabled=True), [], asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do(KEY, compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do(KEY, compute))
+        late = asyncio.ensure_future(flight.do(KEY, compute, timeout=0.01))
+        await asyncio.sleep(0.05)
+        # Клиент лидера ушел: вычисление продолжается для остальных
+        leader.cancel()
+        release.set()
+
+        assert await follower == "done"
+        with pytest.raises(SingleFlightTimeout):
+            await late
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_slow_computation_is_a_504(client, monkeypatch):
+    from app.cache import response_cache
+    from app.crud import mood as crud_mood
+    from app.single_flight import single_flight
+
+    release = threading.Event()
+    original = crud_mood.get_mood_day_details
+
+    def slow(*args, **kwargs):
+        release.wait(5)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(crud_mood, "get_mood_day_details", slow)
+    monkeypatch.setattr(single_flight, "timeout", 0.1)
+    url = "/moods/calendar/day/2026-03-01"
+
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(client.get, url)
+        time.sleep(0.2)
+        waiter = client.get(url)
+        release.set()
+        assert leader.result(5).status_code == 200
+
+    assert waiter.status_code == 504
+    assert len(response_cache) == 1
@@ -0,0 +1,81 @@
+# test_sync.py - дельта-синхронизация GET /moods/changes: курсор, has_more, 410
+from datetime import datetime, timedelta
+
+from app.crud.sync import compact_tombstones
+
+ALICE, BOB = {"X-User-Id": "alice"}, {"X-User-Id": "bob"}
+
+
+def changes(client, since=0, after_id=None, limit=100, headers=ALICE):
+    params = {"since": since, "limit": limit, **({"after_id": after_id} if after_id is not None else {})}
+    return client.get("/moods/changes", params=params, headers=headers)
+
+
+def sync(client, since=0, limit=100, headers=ALICE):
+    """Пройти страницы до has_more=false; (записи, удаленные id, итоговый since, число страниц)"""
+    entries, deleted, after_id, pages = [], [], None, 0
+    while True:
+        response = changes(client, since, after_id, limit, headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        entries += page["changes"]
+        deleted += [item["id"] for item in page["deleted"]]
+        pages += 1
+        since, after_id = page["since"], page["after_id"]
+        if not page["has_more"]:
+            assert after_id is None and since == page["version"]
+            return entries, deleted, since, pages
+
+
+def bulk(client, count, headers=ALICE):
+    items = [{"mood_type": "calm", "mood_score": 3, "notes": f"#{index}", "date": "2026-03-01"} for index in range(count)]
+    assert client.post("/moods/bulk", json=items, headers=headers).json()["inserted"] == count
+
+
+def test_pages_split_one_version_by_id(client):
+    # Одна массовая вставка - одна версия: страницы делит after_id
+    bulk(client, 5)
+    bulk(client, 1, BOB)
+
+    entries, deleted, since, pages = sync(client, limit=2)
+
+    assert pages == 3 and deleted == []
+    assert len({entry["version"] for entry in entries}) == 1
+    assert [entry["id"] for entry in entries] == sorted(entry["id"] for entry in entries)
+    assert {entry["user_id"] for entry in entries} == {"alice"}
+    assert sync(client, since=since) == ([], [], since, 1)
+
+
+def test_cursor_returns_only_later_changes_and_tombstones(client):
+    bulk(client, 3)
+    entries, _, since, _ = sync(client)
+    first, second, third = entries
+
+    client.put(f"/moods/{first['id']}", json={"notes": "правка"}, headers=ALICE)
+    client.delete(f"/moods/{second['id']}", headers=ALICE)
+    created = client.post("/moods/", json={"mood_type": "happy", "mood_score": 5}, headers=ALICE).json()
+
+    entries, deleted, _, _ = sync(client, since=since, limit=1)
+    assert [(entry["id"], entry["notes"]) for entry in entries] == [(first["id"], "правка"), (created["id"], None)]
+    assert deleted == [second["id"]]
+    # Изменения и надгробия идут по возрастанию версии
+    assert entries[0]["version"] < entries[1]["version"]
+
+
+def test_compacted_cursor_is_gone(client, app_db):
+    bulk(client, 2)
+    entries, _, stale, _ = sync(client)
+    client.delete(f"/moods/{entries[0]['id']}", headers=ALICE)
+    _, _, fresh, _ = sync(client)
+    client.delete(f"/moods/{entries[1]['id']}", headers=ALICE)
+
+    with app_db() as db:
+        assert compact_tombstones(db, datetime.now() + timedelta(seconds=1)) == 2
+        db.commit()
+
+    gone = changes(client, since=stale)
+    assert gone.status_code == 410
+    assert "since=0" in gone.json()["detail"]
+    assert changes(client, since=fresh).status_code == 410
+    # Полная синхронизация после 410: записей и сжатых надгробий нет
+    assert sync(client)[:2] == ([], [])